@@ -0,0 +1,45 @@
+"""
+Admin API endpoints for profiling.
+Lists and downloads stored request profiles and reads the continuous sampler; requires X-Admin-Token.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from app.core.profiling import ADMIN_TOKEN_HEADER, is_admin, profiler
+
+router = APIRouter()
+
+
+def require_admin(token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER)) -> None:
+    """Reject requests without the configured admin token"""
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Stored single-request profiles, keyed by request (trace) id"""
+    return {"profiles": profiler.list_profiles()}
+
+
+@router.get("/profiles/continuous", dependencies=[Depends(require_admin)])
+async def continuous_profile(reset: bool = False):
+    """
+    Hot stacks aggregated by the continuous sampler in folded format.
+    Pipe into flamegraph.pl or load into speedscope; reset=true starts a new window.
+    """
+    if profiler.continuous is None:
+        raise HTTPException(status_code=404, detail="Continuous profiling is not enabled")
+    return PlainTextResponse(profiler.continuous.folded(reset=reset))
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """Download one profile: .folded stacks (sampling) or .prof pstats (cprofile)"""
+    path = profiler.find(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=path.rsplit("/", 1)[-1])
@@ -4,18 +4,26 @@ Handles template matching, Q&A flow, and draft generation.
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 from typing import Optional, List, Dict, Any
 import uuid
 import re
 
 from app.db.database import get_db
 from app.db import models
+from app.db.compression import with_dictionary
 from app.schemas import schemas
 from app.services.template_service import template_service
-from app.services.gemini_service import gemini_service
-from app.services.exa_service import exa_service
+from app.services.gemini_service import get_gemini_service
+from app.services.exa_service import get_exa_service
+from app.services.write_behind import answer_buffer
+from app.services.draft_renderer import draft_renderer
+from app.services.llm_errors import LLMError
 from app.core.config import settings
+from app.core.tracing import traced
 
 router = APIRouter()
 
@@ -26,7 +34,7 @@ conversations: Dict[str, Dict[str, Any]] = {}
 @router.post("/message", response_model=schemas.ChatResponse)
 async def send_message(
     request: schemas.ChatRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Process chat message and handle drafting flow.
@@ -54,31 +62,34 @@ async def send_message(
         return await handle_draft_request(conversation_id, query, db)
     
     elif message.startswith("/vars"):
-        return handle_vars_command(conversation_id, db)
+        return await handle_vars_command(conversation_id, db)
     
     # Handle conversation states
-    elif conv["state"] == "awaiting_template_selection":
+    elif conv["state"] in ("awaiting_template_selection", "template_matched", "web_bootstrap"):
         return await handle_template_selection(conversation_id, message, db)
     
     elif conv["state"] == "answering_questions":
         return await handle_answer(conversation_id, message, db)
     
+    elif conv["state"] == "editing" or (
+        conv["state"] == "draft_generated" and message.lower().startswith("edit")
+    ):
+        return await handle_edit(conversation_id, message, db)
+    
     # Default: treat as draft request
     else:
         return await handle_draft_request(conversation_id, message, db)
 
 
+@traced()
 async def handle_draft_request(
     conversation_id: str,
     query: str,
-    db: Session
+    db: AsyncSession
 ) -> schemas.ChatResponse:
     """Handle initial draft request"""
     
-    # Simple keyword matching first (no AI needed)
-    all_templates = db.query(models.Template).all()
-    
-    if not all_templates:
+    if not await template_service.count_templates(db):
         return schemas.ChatResponse(
             conversation_id=conversation_id,
             message="No templates available. Upload a document first!",
@@ -86,39 +97,28 @@ async def handle_draft_request(
             data=None
         )
     
-    query_lower = query.lower()
-    matched_template = None
-    
-    # Keyword matching
-    for template in all_templates:
-        title_lower = template.title.lower()
-        if any(word in query_lower for word in ['lease', 'rent', 'rental']) and 'lease' in title_lower:
-            matched_template = template
-            break
-        elif any(word in query_lower for word in ['employment', 'job', 'offer']) and any(w in title_lower for w in ['employment', 'offer']):
-            matched_template = template
-            break
-    
-    # If no keyword match, show all templates
-    if not matched_template and all_templates:
-        conv = conversations[conversation_id]
-        conv["state"] = "awaiting_template_selection"
-        conv["user_query"] = query
-        
-        message = "**Available Templates:**\n\n"
-        for i, t in enumerate(all_templates, 1):
-            message += f"{i}. **{t.title}** ({len(t.variables)} variables)\n"
-        message += "\nReply with the number to select a template."
-        
-        return schemas.ChatResponse(
-            conversation_id=conversation_id,
-            message=message,
-            message_type="template_list",
-            data={"templates": [{"id": t.id, "title": t.title} for t in all_templates]}
+    # Rank templates locally with BM25 first (no AI needed)
+    lexical_matches = await template_service.lexical_match(db, query)
+    
+    # No lexical signal at all, show all templates
+    if not lexical_matches:
+        return template_list_response(
+            conversation_id,
+            query,
+            await template_service.get_all_templates(db),
+            "**Available Templates:**\n\n",
+            "\nReply with the number to select a template."
         )
     
-    # If matched, use it
-    if matched_template:
+    top = lexical_matches[0]
+    runner_up_score = lexical_matches[1]["score"] if len(lexical_matches) > 1 else 0.0
+    clear_winner = top["score"] >= settings.LEXICAL_MIN_SCORE and (
+        runner_up_score == 0 or top["score"] / runner_up_score >= settings.LEXICAL_AMBIGUITY_RATIO
+    )
+    
+    # Unambiguous lexical match, use it
+    if clear_winner:
+        matched_template = top["template"]
         conv = conversations[conversation_id]
         conv["state"] = "template_matched"
         conv["template_id"] = matched_template.id
@@ -128,67 +128,78 @@ async def handle_draft_request(
             conversation_id=conversation_id,
             message=f"**{matched_template.title}**\n\nFound {len(matched_template.variables)} variables.\n\nReply 'yes' to proceed!",
             message_type="template_match",
-            data={"template_id": matched_template.id}
+            data={
+                "template_id": matched_template.id,
+                "match_method": "lexical",
+                "score": round(top["score"], 3)
+            }
         )
     
-    # Fallback: try AI matching (may fail)
+    # Ambiguous: let the AI choose among the lexical candidates
+    candidates = [match["template"] for match in lexical_matches]
     try:
-        match_result = await template_service.match_template(db, query)
+        match_result = await template_service.match_template(
+            db,
+            query,
+            candidate_ids=[t.id for t in candidates]
+        )
+    except LLMError as e:
+        print(f"AI matching failed: {str(e)}")
+        # Fall back to the lexical ranking
+        return template_list_response(
+            conversation_id,
+            query,
+            candidates,
+            "AI matching unavailable. **Closest Templates:**\n\n",
+            "\nReply with the number to select."
+        )
     
-        if match_result.has_match and match_result.best_match:
-            # Found a match
-            conv = conversations[conversation_id]
-            conv["state"] = "template_matched"
-            conv["template_id"] = match_result.best_match.template_id
-            conv["user_query"] = query
-            
-            # Build response with match card
-            response_message = f"""**Template Match Found**
+    if match_result.has_match and match_result.best_match:
+        # Found a match
+        conv = conversations[conversation_id]
+        conv["state"] = "template_matched"
+        conv["template_id"] = match_result.best_match.template_id
+        conv["user_query"] = query
+        
+        # Build response with match card
+        response_message = f"""**Template Match Found**
 
 **Best Match:** {match_result.best_match.title}
 **Confidence:** {match_result.best_match.confidence:.0%}
 **Why:** {match_result.best_match.justification}
 
 """
-            
-            if match_result.alternatives:
-                response_message += "\n**Alternatives:**\n"
-                for alt in match_result.alternatives[:2]:
-                    response_message += f"- {alt.title} ({alt.confidence:.0%})\n"
-            
-            response_message += "\n Reply with 'yes' to use this template, or select an alternative."
-            
-            return schemas.ChatResponse(
-                conversation_id=conversation_id,
-                message=response_message,
-                message_type="template_match",
-                data={
-                    "best_match": match_result.best_match.dict(),
-                    "alternatives": [alt.dict() for alt in match_result.alternatives]
-                }
-            )
-    
-    except Exception as e:
-        print(f"AI matching failed: {str(e)}")
-        # Fallback to showing all templates
-        message = "AI matching unavailable. **Available Templates:**\n\n"
-        for i, t in enumerate(all_templates, 1):
-            message += f"{i}. **{t.title}** ({len(t.variables)} variables)\n"
-        message += "\nReply with the number to select."
         
-        conv = conversations[conversation_id]
-        conv["state"] = "awaiting_template_selection"
-        conv["user_query"] = query
+        if match_result.alternatives:
+            response_message += "\n**Alternatives:**\n"
+            for alt in match_result.alternatives[:2]:
+                response_message += f"- {alt.title} ({alt.confidence:.0%})\n"
+        
+        response_message += "\n Reply with 'yes' to use this template, or select an alternative."
         
         return schemas.ChatResponse(
             conversation_id=conversation_id,
-            message=message,
-            message_type="template_list",
-            data={"templates": [{"id": t.id, "title": t.title} for t in all_templates]}
+            message=response_message,
+            message_type="template_match",
+            data={
+                "best_match": match_result.best_match.dict(),
+                "alternatives": [alt.dict() for alt in match_result.alternatives],
+                "match_method": "llm"
+            }
+        )
+    
+    # The AI rejected every candidate; the lexical ranking still found them relevant
+    if candidates:
+        return template_list_response(
+            conversation_id,
+            query,
+            candidates,
+            "No confident match. **Closest Templates:**\n\n",
+            "\nReply with the number to select, or describe the document differently."
         )
     
     # No match - check if exa.ai is available
-    if exa_service.is_available():
+    if get_exa_service().is_available():
         return await handle_web_bootstrap(conversation_id, query, db)
     else:
         return schemas.ChatResponse(
@@ -199,15 +210,42 @@ async def handle_draft_request(
         )
 
 
+def template_list_response(
+    conversation_id: str,
+    query: str,
+    templates: List[models.Template],
+    header: str,
+    footer: str
+) -> schemas.ChatResponse:
+    """List templates for numeric selection and remember the numbering"""
+    conv = conversations[conversation_id]
+    conv["state"] = "awaiting_template_selection"
+    conv["user_query"] = query
+    conv["template_choices"] = [t.id for t in templates]
+    
+    message = header
+    for i, t in enumerate(templates, 1):
+        message += f"{i}. **{t.title}** ({len(t.variables)} variables)\n"
+    message += footer
+    
+    return schemas.ChatResponse(
+        conversation_id=conversation_id,
+        message=message,
+        message_type="template_list",
+        data={"templates": [{"id": t.id, "title": t.title} for t in templates]}
+    )
+
+
+@traced()
 async def handle_web_bootstrap(
     conversation_id: str,
     query: str,
-    db: Session
+    db: AsyncSession
 ) -> schemas.ChatResponse:
     """Handle web bootstrap using exa.ai (BONUS FEATURE)"""
     
     # Search web for similar templates
-    results = await exa_service.search_legal_templates(query)
+    results = await get_exa_service().search_legal_templates(query)
     
     if not results:
         return schemas.ChatResponse(
@@ -247,10 +285,11 @@ Preview: {result['text'][:150]}...
     )
 
 
+@traced()
 async def handle_template_selection(
     conversation_id: str,
     message: str,
-    db: Session
+    db: AsyncSession
 ) -> schemas.ChatResponse:
     """Handle template or web result selection"""
     
@@ -270,7 +309,7 @@ async def handle_template_selection(
                 )
                 
                 # Save template
-                db_template = template_service.save_template(db, extraction.template)
+                db_template = await template_service.save_template(db, extraction.template)
                 
                 conv["template_id"] = db_template.id
                 conv["state"] = "template_matched"
@@ -283,18 +322,32 @@ async def handle_template_selection(
                 )
         except (ValueError, IndexError):
             pass
+        except LLMError as e:
+            print(f"Web template extraction failed: {str(e)}")
+            # Stay on the web results so the user can retry or pick another
+            return schemas.ChatResponse(
+                conversation_id=conversation_id,
+                message="AI extraction is temporarily unavailable, so I couldn't create a template from that document.\n\nReply with the number again in a moment, or try another result.",
+                message_type="text",
+                data={"error": type(e).__name__}
+            )
     
     # Default: proceed with current template
     message_lower = message.lower()
     if message_lower in ["yes", "y", "use this", "proceed", "continue"]:
         return await start_questions(conversation_id, db)
     
-    # Check if it's a numeric selection
+    # Check if it's a numeric selection (numbered as in the last listing shown)
     try:
         selection = int(message.strip())
-        all_templates = db.query(models.Template).all()
-        if 1 <= selection <= len(all_templates):
-            selected_template = all_templates[selection - 1]
+        choices = conv.get("template_choices") or [
+            t.id for t in await template_service.get_all_templates(db)
+        ]
+        if 1 <= selection <= len(choices):
+            selected_template = await template_service.get_template_by_id(db, choices[selection - 1])
+        else:
+            selected_template = None
+        if selected_template:
             conv["template_id"] = selected_template.id
             conv["state"] = "template_matched"
             
@@ -315,16 +368,17 @@ async def handle_template_selection(
     )
 
 
+@traced()
 async def start_questions(
     conversation_id: str,
-    db: Session
+    db: AsyncSession
 ) -> schemas.ChatResponse:
     """Start asking questions for variables"""
     
     conv = conversations[conversation_id]
     template_id = conv["template_id"]
     
-    template = template_service.get_template_by_id(db, template_id)
+    template = await template_service.get_template_by_id(db, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
@@ -342,7 +396,13 @@ async def start_questions(
         for var in template.variables
     ]
     
-    prefilled = gemini_service.pre_fill_variables(user_query, variables_data)
+    prefill_note = ""
+    try:
+        prefilled = await run_in_threadpool(get_gemini_service().pre_fill_variables, user_query, variables_data)
+    except LLMError as e:
+        print(f"Pre-fill unavailable: {e}")
+        prefilled = {}
+        prefill_note = "\n(AI pre-fill is temporarily unavailable, so every field will be asked.)"
     conv["answers"] = prefilled
     
     # Generate questions for remaining variables
@@ -353,7 +413,7 @@ async def start_questions(
         return await generate_draft(conversation_id, db)
     
     # Generate human-friendly questions
-    questions = gemini_service.generate_questions(remaining_vars, template.title)
+    questions = await run_in_threadpool(get_gemini_service().generate_questions, remaining_vars, template.title)
     conv["pending_variables"] = questions
     conv["state"] = "answering_questions"
     
@@ -368,13 +428,13 @@ async def start_questions(
         answers_json=prefilled
     )
     db.add(db_instance)
-    db.commit()
+    await db.commit()
     
     # Ask first question
     first_question = questions[0]
     response_message = f""" **Let's fill in the details**
 
-Pre-filled {len(prefilled)} variables from your request.
+Pre-filled {len(prefilled)} variables from your request.{prefill_note}
 {len(remaining_vars)} questions remaining.
 
 **Q1/{len(questions)}:** {first_question['question']}
@@ -395,10 +455,11 @@ Pre-filled {len(prefilled)} variables from your request.
     )
 
 
+@traced()
 async def handle_answer(
     conversation_id: str,
     message: str,
-    db: Session
+    db: AsyncSession
 ) -> schemas.ChatResponse:
     """Handle answer to a variable question"""
     
@@ -417,14 +478,8 @@ async def handle_answer(
     # Store answer
     conv["answers"][current_question["variable_key"]] = message.strip()
     
-    # Update instance
-    instance = db.query(models.Instance).filter(
-        models.Instance.id == conv["instance_id"]
-    ).first()
-    
-    if instance:
-        instance.answers_json = conv["answers"]
-        db.commit()
+    # Buffer the answer; it is written in a batch or together with the draft
+    await answer_buffer.buffer(conv["instance_id"], conv["answers"])
     
     # Check if done
     if answered_count + 1 >= len(questions):
@@ -452,9 +507,10 @@ async def handle_answer(
     )
 
 
+@traced()
 async def generate_draft(
     conversation_id: str,
-    db: Session
+    db: AsyncSession
 ) -> schemas.ChatResponse:
     """Generate final draft from template and answers"""
     
@@ -463,25 +519,30 @@ async def generate_draft(
     answers = conv["answers"]
     instance_id = conv["instance_id"]
     
-    template = template_service.get_template_by_id(db, template_id)
+    template = await template_service.get_template_by_id(db, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    # Replace variables in template
-    draft = template.body_md
+    # Write buffered answers and the draft in one transaction. Take them before this
+    # session writes anything: an in-progress flush needs the SQLite write lock.
+    await answer_buffer.take(instance_id)
     
-    for key, value in answers.items():
-        pattern = f"{{{{{key}}}}}"
-        draft = draft.replace(pattern, str(value))
+    # Snapshot the template body so this draft keeps rendering the same way
+    version_id = await draft_renderer.ensure_version(db, template)
+    draft = draft_renderer.render_body(version_id, template.body_md, answers)
     
     # Update instance with draft
-    instance = db.query(models.Instance).filter(
-        models.Instance.id == instance_id
-    ).first()
-    
+    instance = await db.get(models.Instance, instance_id)
     if instance:
-        instance.draft_md = draft
-        db.commit()
+        instance.answers_json = dict(answers)
+        instance.template_version = version_id
+        if settings.DRAFT_STORAGE_MODE == "full":
+            # Drafts repeat most of the template body, so it makes a good zlib dictionary
+            instance.draft_md = with_dictionary(draft, template.body_md)
+        else:
+            # Rendered on demand from answers + template version
+            instance.draft_md = None
+        await db.commit()
     
     # Reset conversation state
     conv["state"] = "draft_generated"
@@ -513,9 +574,97 @@ async def generate_draft(
     )
 
 
-def handle_vars_command(
+@traced()
+async def handle_edit(
     conversation_id: str,
-    db: Session
+    message: str,
+    db: AsyncSession
+) -> schemas.ChatResponse:
+    """
+    Handle 'edit' after a draft: change one variable and return a patch for the draft.
+    Only the slots of that variable are re-rendered; the template body is not reloaded.
+    """
+    
+    conv = conversations[conversation_id]
+    instance = await db.get(models.Instance, conv["instance_id"])
+    if not instance or not instance.template_version:
+        conv["state"] = "draft_generated"
+        return schemas.ChatResponse(
+            conversation_id=conversation_id,
+            message="This draft cannot be edited. Type 'new' to start a new draft.",
+            message_type="text",
+            data=None
+        )
+    
+    variables = (await db.execute(
+        select(models.TemplateVariable.key, models.TemplateVariable.label)
+        .where(models.TemplateVariable.template_id == instance.template_id)
+    )).all()
+    labels = {var.key: var.label for var in variables}
+    
+    # Accept "edit key: value", or "key: value" once editing; key or label
+    request = message[4:].strip() if message.lower().startswith("edit") else message.strip()
+    if request.lower() in ("done", "cancel"):
+        conv["state"] = "draft_generated"
+        return schemas.ChatResponse(
+            conversation_id=conversation_id,
+            message="Editing finished.",
+            message_type="text",
+            data=None
+        )
+    match = re.match(r"^(.+?)\s*[:=]\s*(.+)$", request, re.DOTALL)
+    key = None
+    if match:
+        name = match.group(1).lower()
+        key = next((k for k, label in labels.items() if name in (k.lower(), label.lower())), None)
+    
+    if not key:
+        conv["state"] = "editing"
+        answers = instance.answers_json or {}
+        lines = [f"- `{k}` ({label}): {answers.get(k, 'not set')}" for k, label in labels.items()]
+        return schemas.ChatResponse(
+            conversation_id=conversation_id,
+            message="**Which variable should change?**\n\n" + "\n".join(lines)
+                    + "\n\nReply with `key: new value`, or 'done' to stop editing.",
+            message_type="edit_prompt",
+            data={"variables": list(labels)}
+        )
+    
+    answers = dict(instance.answers_json or {})
+    version_id = instance.template_version
+    compiled = await db.run_sync(lambda session: draft_renderer.compiled_version(session.connection(), version_id))
+    value = match.group(2).strip()
+    edits = compiled.patch(answers, key, value)
+    
+    answers[key] = value
+    instance.answers_json = answers
+    if settings.DRAFT_STORAGE_MODE == "full":
+        version = await db.get(
+            models.TemplateVersion, version_id, options=[undefer(models.TemplateVersion.body_md)]
+        )
+        draft = draft_renderer.render_body(version_id, version.body_md, answers)
+        instance.draft_md = with_dictionary(draft, version.body_md)
+    await db.commit()
+    
+    conv["answers"] = answers
+    conv["state"] = "draft_generated"
+    
+    return schemas.ChatResponse(
+        conversation_id=conversation_id,
+        message=f"Updated **{labels[key]}** to \"{answers[key]}\" ({len(edits)} place(s) in the draft).",
+        message_type="draft_patch",
+        data={
+            "instance_id": instance.id,
+            "variable_key": key,
+            "patch": edits
+        }
+    )
+
+
+@traced()
+async def handle_vars_command(
+    conversation_id: str,
+    db: AsyncSession
 ) -> schemas.ChatResponse:
     """Handle /vars command to show current variable status"""
     
@@ -538,7 +687,7 @@ def handle_vars_command(
             data=None
         )
     
-    template = template_service.get_template_by_id(db, template_id)
+    template = await template_service.get_template_by_id(db, template_id)
     if not template:
         return schemas.ChatResponse(
             conversation_id=conversation_id,
@@ -580,6 +729,29 @@ def handle_vars_command(
     )
 
 
+@router.get("/drafts/{instance_id}", response_model=schemas.InstanceResponse)
+async def get_draft(instance_id: str, db: AsyncSession = Depends(get_db)):
+    """Get a draft instance, rendering the draft from its template version if needed"""
+    instance = await db.get(models.Instance, instance_id, options=[undefer(models.Instance.draft_md)])
+    if not instance:
+        raise HTTPException(status_code=404, detail="Draft not found")
+    
+    try:
+        draft = await draft_renderer.render(db, instance)
+    except LookupError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return schemas.InstanceResponse(
+        id=instance.id,
+        template_id=instance.template_id,
+        template_version=instance.template_version,
+        user_query=instance.user_query,
+        answers_json=instance.answers_json or {},
+        draft_md=draft,
+        created_at=instance.created_at
+    )
+
+
 @router.get("/conversations/{conversation_id}")
 async def get_conversation(conversation_id: str):
     """Get conversation state"""
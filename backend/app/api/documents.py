@@ -4,8 +4,11 @@ Handles file upload, validation, and template extraction.
 """
 
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+from typing import Optional, Tuple
 import uuid
 import os
 from pathlib import Path
@@ -14,8 +17,13 @@ from app.db.database import get_db
 from app.db import models
 from app.schemas import schemas
 from app.services.document_processor import document_processor
-from app.services.template_service import template_service
+from app.services.gemini_service import get_gemini_service
+from app.services.job_queue import extraction_queue
+from app.services.llm_errors import LLMError
+from app.api.jobs import job_to_response
 from app.core.config import settings
+from app.core import metrics
+from app.core.memory import MemoryBudgetExceeded, memory_budget, memory_tracker, stage
 
 router = APIRouter()
 
@@ -23,7 +31,7 @@ router = APIRouter()
 @router.post("/upload", response_model=schemas.DocumentUploadResponse)
 async def upload_document(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload a legal document (DOCX/PDF) for processing.
@@ -32,7 +40,37 @@ async def upload_document(
     """
     # Validate file
     document_processor.validate_file(file, settings.MAX_UPLOAD_SIZE)
+    metrics.upload_bytes.inc(file.size or 0)
     
+    # Reserve the upload's estimated peak memory; over budget this queues or fails
+    reservation = int((file.size or 0) * settings.MEMORY_UPLOAD_FACTOR)
+    try:
+        async with memory_budget.reserve_async(reservation):
+            with memory_tracker.track("upload"):
+                document_id, embedding_text, text_length = await store_upload(file, db)
+    except MemoryBudgetExceeded as e:
+        if e.retry_after is None:
+            raise HTTPException(status_code=413, detail=str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+    
+    # Outside the reservation: the LLM call can take seconds and needs little memory
+    await embed_document(db, document_id, embedding_text)
+    
+    return schemas.DocumentUploadResponse(
+        document_id=document_id,
+        filename=file.filename,
+        status="success",
+        message=f"Document uploaded successfully. Extracted {text_length} characters."
+    )
+
+
+async def store_upload(file: UploadFile, db: AsyncSession) -> Tuple[str, str, int]:
+    """
+    Extract and store an uploaded document (within its memory reservation).
+    
+    Returns:
+        (document_id, text to embed, extracted characters)
+    """
     # Extract text
     try:
         text, temp_path = await document_processor.extract_text(file)
@@ -41,70 +79,76 @@ async def upload_document(
     
     # Save document to database
     document_id = f"doc_{uuid.uuid4().hex[:12]}"
-    
-    # Generate embedding
-    from app.services.gemini_service import gemini_service
-    embedding = gemini_service.generate_embedding(text[:1000])  # Use first 1000 chars
-    embedding_bytes = embedding.tobytes() if embedding is not None else None
-    
     db_document = models.Document(
         id=document_id,
         filename=file.filename,
         mime_type=file.content_type,
-        raw_text=text,
-        embedding=embedding_bytes
+        raw_text=text
     )
     
     db.add(db_document)
-    db.commit()
+    with stage("store"):
+        await db.commit()
+    # Do not keep the text alive through the session once the reservation ends
+    db.expunge(db_document)
     
     # Clean up temp file
     if os.path.exists(temp_path):
         os.unlink(temp_path)
     
-    return schemas.DocumentUploadResponse(
-        document_id=document_id,
-        filename=file.filename,
-        status="success",
-        message=f"Document uploaded successfully. Extracted {len(text)} characters."
+    return document_id, text[:1000], len(text)  # Embed the first 1000 chars
+
+
+async def embed_document(db: AsyncSession, document_id: str, text: str) -> None:
+    """Store a document embedding (optional - the upload succeeds without it)"""
+    try:
+        embedding = await run_in_threadpool(get_gemini_service().generate_embedding, text)
+    except LLMError as e:
+        print(f"Skipping document embedding: {e}")
+        return
+    
+    await db.execute(
+        update(models.Document)
+        .where(models.Document.id == document_id)
+        .values(embedding=embedding.tobytes())
     )
+    await db.commit()
 
 
-@router.post("/extract-template/{document_id}", response_model=schemas.ExtractionResult)
+@router.post(
+    "/extract-template/{document_id}",
+    response_model=schemas.JobResponse,
+    status_code=202
+)
 async def extract_template(
     document_id: str,
-    db: Session = Depends(get_db)
+    force: bool = False,
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Extract template from uploaded document.
-    Uses Gemini AI to identify variables and create reusable template.
+    Submit template extraction for an uploaded document.
+    Runs Gemini extraction as a background job; poll GET /api/jobs/{id} for progress.
+    Repeated submissions for the same document return the existing job unless force=true.
     """
     # Get document
-    document = db.query(models.Document).filter(models.Document.id == document_id).first()
+    document = await db.get(models.Document, document_id, options=[undefer(models.Document.raw_text)])
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
     if not document.raw_text:
         raise HTTPException(status_code=400, detail="Document has no extracted text")
     
-    # Extract template
-    try:
-        result = await template_service.extract_template_from_document(
-            document.raw_text,
-            document.filename
-        )
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error extracting template: {str(e)}")
+    job = await db.run_sync(extraction_queue.submit, document_id, force=force)
+    return job_to_response(job)
 
 
 @router.get("/{document_id}")
 async def get_document(
     document_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get document by ID"""
-    document = db.query(models.Document).filter(models.Document.id == document_id).first()
+    document = await db.get(models.Document, document_id, options=[undefer(models.Document.raw_text)])
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
@@ -0,0 +1,41 @@
+"""
+Jobs API endpoints for polling background extraction jobs.
+Exposes job status, per-chunk progress, and the finished extraction result.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import get_db
+from app.db import models
+from app.schemas import schemas
+
+router = APIRouter()
+
+
+def job_to_response(job: models.ExtractionJob) -> schemas.JobResponse:
+    """Convert a job row into its API response"""
+    return schemas.JobResponse(
+        id=job.id,
+        document_id=job.document_id,
+        status=job.status,
+        chunks_done=job.chunks_done or 0,
+        total_chunks=job.total_chunks,
+        result=job.result_json,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+
+@router.get("/{job_id}", response_model=schemas.JobResponse)
+async def get_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get extraction job status and progress"""
+    job = await db.get(models.ExtractionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job_to_response(job)
@@ -0,0 +1,47 @@
+"""
+Search API endpoint.
+Full-text search over uploaded documents, templates and drafts.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import get_db
+from app.db import search as fts
+from app.schemas import schemas
+
+router = APIRouter()
+
+
+@router.get("/", response_model=schemas.SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, description="Search text; append * to a word for prefix matching"),
+    scope: Optional[str] = Query(None, description="Comma-separated: documents, templates, drafts (default: all)"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Ranked full-text search with highlighted snippets.
+    Results are ordered by relevance; pass next_cursor to fetch the following page.
+    """
+    if not fts.is_supported(db.bind):
+        raise HTTPException(status_code=501, detail="Full-text search requires SQLite")
+
+    scopes = [s.strip() for s in scope.split(",") if s.strip()] if scope else list(fts.SEARCH_SCOPES)
+    unknown = [s for s in scopes if s not in fts.SEARCH_SCOPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search scope: {', '.join(unknown)}")
+
+    try:
+        return await db.run_sync(
+            lambda session: fts.search(
+                session.connection(), q, scopes, limit=limit, cursor=cursor,
+                rank_window=settings.SEARCH_RANK_WINDOW
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
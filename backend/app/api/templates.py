@@ -4,7 +4,9 @@ Handles template creation, retrieval, search, and matching.
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List
 
 from app.db.database import get_db
@@ -12,6 +14,7 @@ from app.db import models
 from app.schemas import schemas
 from app.services.template_service import template_service
 from app.services.document_processor import document_processor
+from app.services.llm_errors import LLMError, LLMQuotaError
 
 router = APIRouter()
 
@@ -19,7 +22,7 @@ router = APIRouter()
 @router.post("/", response_model=schemas.TemplateResponse)
 async def create_template(
     template: schemas.TemplateCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new template.
@@ -27,30 +30,36 @@ async def create_template(
     Created by UOIONHHC
     """
     try:
-        db_template = template_service.save_template(db, template)
+        db_template = await template_service.save_template(db, template)
         return db_template
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating template: {str(e)}")
 
 
-@router.get("/", response_model=List[schemas.TemplateResponse])
+@router.get("/", response_model=List[schemas.TemplateSummary])
 async def list_templates(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get list of all templates"""
-    templates = db.query(models.Template).offset(skip).limit(limit).all()
-    return templates
+    """Get list of all templates (bodies are not loaded; fetch one template for its body)"""
+    result = await db.execute(
+        select(models.Template)
+        .options(selectinload(models.Template.variables))
+        .order_by(models.Template.created_at)
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.scalars().all()
 
 
 @router.get("/{template_id}", response_model=schemas.TemplateResponse)
 async def get_template(
     template_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get template by ID with all variables"""
-    template = template_service.get_template_by_id(db, template_id)
+    template = await template_service.get_template_by_id(db, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     return template
@@ -59,7 +68,7 @@ async def get_template(
 @router.post("/match", response_model=schemas.TemplateMatchResponse)
 async def match_template(
     query: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Match user query to best template.
@@ -68,6 +77,10 @@ async def match_template(
     try:
         result = await template_service.match_template(db, query)
         return result
+    except LLMQuotaError as e:
+        raise HTTPException(status_code=429, detail=f"Gemini quota exhausted: {str(e)}")
+    except LLMError as e:
+        raise HTTPException(status_code=503, detail=f"Gemini unavailable: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error matching template: {str(e)}")
 
@@ -75,15 +88,14 @@ async def match_template(
 @router.delete("/{template_id}")
 async def delete_template(
     template_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete template by ID"""
-    template = template_service.get_template_by_id(db, template_id)
+    template = await template_service.get_template_by_id(db, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    db.delete(template)
-    db.commit()
+    await template_service.delete_template(db, template)
     
     return {"status": "success", "message": f"Template {template_id} deleted"}
 
@@ -91,10 +103,10 @@ async def delete_template(
 @router.get("/{template_id}/variables", response_model=List[schemas.VariableResponse])
 async def get_template_variables(
     template_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all variables for a template"""
-    template = template_service.get_template_by_id(db, template_id)
+    template = await template_service.get_template_by_id(db, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
@@ -104,10 +116,10 @@ async def get_template_variables(
 @router.get("/{template_id}/export")
 async def export_template(
     template_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Export template as Markdown with YAML front-matter"""
-    template = template_service.get_template_by_id(db, template_id)
+    template = await template_service.get_template_by_id(db, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
@@ -4,8 +4,8 @@ Loads environment variables and provides app-wide config.
 """
 
 from pydantic_settings import BaseSettings
-from pydantic import field_validator
-from typing import List, Union
+from pydantic import field_validator, model_validator
+from typing import Dict, List, Optional, Union
 import os
 
 
@@ -18,6 +18,22 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///./lexi.db"
+    SQLITE_JOURNAL_MODE: str = "WAL"  # readers no longer block the writer
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # fsync at checkpoints only; safe with WAL
+    SQLITE_CACHE_SIZE_KB: int = 65536  # page cache per connection
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # memory-mapped I/O window
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # wait for the write lock instead of failing
+    DB_POOL_SIZE: int = 10  # persistent connections per engine
+    DB_MAX_OVERFLOW: int = 20  # extra connections allowed under burst load
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_PRE_PING: bool = True  # validate connections before use
+    DB_POOL_RECYCLE: int = 1800  # seconds before a connection is replaced
+    COMPRESSION_LEVEL: int = 6  # zlib level for large text columns
+    COMPRESSION_MIN_BYTES: int = 256  # smaller values are stored uncompressed
+    COMPRESSION_DICTIONARY_CACHE: int = 256  # template dictionaries kept in memory
+    DRAFT_STORAGE_MODE: str = "delta"  # "delta" stores answers + template version, "full" also the draft text
+    DRAFT_CACHE_SIZE: int = 128  # recently rendered drafts kept in memory
+    COMPILED_TEMPLATE_CACHE_SIZE: int = 64  # parsed template versions kept in memory
     
     # Server
     PORT: int = 8000
@@ -43,15 +59,119 @@ class Settings(BaseSettings):
     GEMINI_EMBEDDING_MODEL: str = "models/embedding-001"
     GEMINI_MAX_TOKENS: int = 8192
     GEMINI_TEMPERATURE: float = 0.3
+    GEMINI_PROMPT_TOKEN_BUDGET: int = 6000  # max estimated input tokens per request
+    GEMINI_MIN_CHUNK_TOKENS: int = 250  # smallest text window when re-chunking
+    
+    # LLM Backend
+    LLM_BACKEND: str = "gemini"  # "gemini", or "fake" for offline load tests
+    LLM_CASSETTE_MODE: str = "off"  # "record" captures backend responses, "replay" serves only recorded ones
+    LLM_CASSETTE_PATH: str = "cassettes/llm.jsonl"
+    LLM_CASSETTE_REPLAY_LATENCY: bool = True  # replayed calls take as long as the recorded ones
+    FAKE_LLM_LATENCY_MS: float = 800.0  # median latency of the fake backend
+    FAKE_LLM_LATENCY_SIGMA: float = 0.5  # log-normal spread; 0 for a constant latency
+    FAKE_LLM_OPERATION_LATENCY_MS: Dict[str, float] = {}  # per-operation medians, e.g. {"extract_variables": 3000}
+    FAKE_LLM_ERROR_RATE: float = 0.0  # share of fake calls failing with 503
+    FAKE_LLM_THROTTLE_RATE: float = 0.0  # share of fake calls failing with 429
+    FAKE_LLM_SEED: Optional[int] = None
+    
+    # LLM Scheduling
+    LLM_MAX_CONCURRENCY: int = 4  # concurrent Gemini calls per process
+    LLM_INTERACTIVE_WEIGHT: float = 8.0  # fair-queuing weight for chat calls
+    LLM_BATCH_WEIGHT: float = 1.0  # fair-queuing weight for bulk extraction
+    LLM_INTERACTIVE_RESERVED: int = 1  # slots batch calls must leave free
+    LLM_MIN_CONCURRENCY: int = 1  # floor for AIMD backoff on 429/503
+    
+    # Gemini Quota & Retries
+    GEMINI_RPM: int = 60  # requests per minute allowed by our quota
+    GEMINI_TPM: int = 1_000_000  # input tokens per minute allowed by our quota
+    LLM_RETRY_MAX_ATTEMPTS: int = 5
+    LLM_RETRY_BASE_DELAY: float = 0.5  # seconds, doubled per attempt with full jitter
+    LLM_RETRY_MAX_DELAY: float = 8.0  # seconds
+    LLM_CALL_DEADLINE_SECONDS: float = 60.0  # overall budget per call incl. waits and retries
+    
+    # LLM Tail Latency
+    LLM_CALL_POOL_SIZE: int = 16  # threads running provider calls under a deadline
+    LLM_HEDGE_ENABLED: bool = True  # duplicate slow interactive calls
+    LLM_HEDGE_PERCENTILE: float = 95  # hedge after this latency percentile
+    LLM_HEDGE_MIN_DELAY: float = 0.25  # seconds
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # latency samples needed before hedging
+    LLM_BREAKER_WINDOW: int = 20  # calls considered per operation
+    LLM_BREAKER_MIN_CALLS: int = 5
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_SLOW_SECONDS: float = 15.0  # interactive calls this slow count against the breaker
+    LLM_BREAKER_BATCH_SLOW_SECONDS: float = 0.0  # same for batch extraction; 0 never counts them as slow
+    LLM_BREAKER_SLOW_RATE: float = 0.5
+    LLM_BREAKER_OPEN_SECONDS: float = 30.0
     
     # Template Processing
-    CHUNK_SIZE: int = 4000  # characters per chunk
+    CHUNK_TOKENS: int = 1000  # estimated tokens per chunk
+    CHUNK_OVERLAP_TOKENS: int = 50  # estimated tokens shared between chunks
+    CHUNK_SIZE: Optional[int] = None  # deprecated: characters per chunk, mapped onto CHUNK_TOKENS
     MIN_CONFIDENCE_THRESHOLD: float = 0.6
+    LEXICAL_MIN_SCORE: float = 0.3  # share of the query's maximum BM25 score needed for a lexical match
+    LEXICAL_AMBIGUITY_RATIO: float = 1.5  # top score must beat runner-up by this factor
+    LEXICAL_INDEX_REFRESH_SECONDS: float = 30.0  # how often to check for catalog changes
+    
+    # Extraction Jobs
+    EXTRACTION_WORKERS: int = 2  # background extraction threads per process
+    EXTRACTION_JOB_HEARTBEAT_SECONDS: float = 30.0  # running jobs refresh updated_at this often
+    EXTRACTION_JOB_STALE_SECONDS: int = 120  # requeue running jobs without a heartbeat this long
+    
+    # Chat Answer Write-behind
+    ANSWER_WRITE_BEHIND_ENABLED: bool = True  # False writes every answer immediately
+    ANSWER_FLUSH_INTERVAL_SECONDS: float = 2.0  # max time an answer waits in memory
+    ANSWER_FLUSH_MAX_PENDING: int = 100  # flush early once this many drafts are buffered
+    
+    # Full-text Search
+    SEARCH_RANK_WINDOW: int = 20000  # newest matches ranked per scope for broad queries
+    
+    # Metrics
+    METRICS_ENABLED: bool = True  # /metrics endpoint and hot-path instrumentation
+    METRICS_MULTIPROC_DIR: str = ""  # shared directory so any worker can report all workers' metrics
+    METRICS_FLUSH_SECONDS: float = 5.0  # how often each worker writes its samples there
+    
+    # Tracing
+    TRACING_ENABLED: bool = True  # X-Trace-Id header and span instrumentation
+    TRACE_SAMPLE_RATE: float = 0.01  # share of requests exported; "X-Trace-Sample: 1" with X-Admin-Token forces one
+    TRACE_SLOW_SECONDS: float = 5.0  # also export any request slower than this; 0 disables
+    TRACE_EXPORT_FORMAT: str = "jsonl"  # "jsonl" (one span per line) or "chrome" (chrome://tracing, Perfetto)
+    TRACE_EXPORT_PATH: str = "traces/spans.jsonl"
+    TRACE_EXPORT_MAX_MB: int = 100  # rotate the export file to <path>.1 at this size; 0 never rotates
+    
+    # Profiling
+    PROFILING_ADMIN_TOKEN: str = ""  # enables request profiling and /api/admin; empty disables both
+    PROFILE_DIR: str = "profiles"
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5.0  # stack sampling period for single-request profiles
+    CONTINUOUS_PROFILING_ENABLED: bool = False  # always-on low-rate stack sampling
+    CONTINUOUS_PROFILE_INTERVAL_MS: float = 100.0
+    CONTINUOUS_PROFILE_MODULES: List[str] = ["app.services.document_processor", "app.api.chat", "app.services.chunker"]
+    
+    # Memory Budgets
+    MEMORY_TRACKING_SAMPLE_RATE: float = 0.05  # share of uploads/extractions run under tracemalloc
+    MEMORY_BUDGET_MB: int = 1024  # estimated peak memory of concurrent uploads/extractions; 0 disables
+    MEMORY_BUDGET_POLICY: str = "queue"  # "queue" waits for room, "reject" fails at once
+    MEMORY_BUDGET_WAIT_SECONDS: float = 30.0  # longest queueing wait before rejecting
+    MEMORY_UPLOAD_FACTOR: float = 4.0  # estimated peak bytes per uploaded byte
+    MEMORY_EXTRACTION_FACTOR: float = 6.0  # estimated peak bytes per character of document text
+    
+    # Startup Warm-up
+    WARMUP_ENABLED: bool = True  # preload caches and connections; /ready waits for it
+    WARMUP_TIMEOUT_SECONDS: float = 60.0  # report ready with whatever is warm after this long
     
     # Exa Settings
     EXA_NUM_RESULTS: int = 5
     EXA_TEXT_LENGTH: int = 2000
     
+    @model_validator(mode='after')
+    def map_chunk_size(self):
+        # Older .env files set CHUNK_SIZE (characters); an explicit CHUNK_TOKENS wins
+        if self.CHUNK_SIZE is not None and 'CHUNK_TOKENS' not in self.model_fields_set:
+            from app.core.tokens import CHARS_PER_TOKEN
+
+            self.CHUNK_TOKENS = max(self.CHUNK_SIZE // CHARS_PER_TOKEN, 1)
+            print(f"CHUNK_SIZE is deprecated; using CHUNK_TOKENS={self.CHUNK_TOKENS}")
+        return self
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,301 @@
+"""
+Memory accounting and budgets for uploads and extraction.
+Sampled tracemalloc stage peaks per operation, and a process-wide budget that queues or rejects work.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+import tracemalloc
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core import metrics
+
+memory_stage_peak = metrics.registry.histogram(
+    "lexi_memory_stage_peak_bytes", "Sampled peak allocation above the stage's starting point", ["path", "stage"],
+    buckets=tuple(2 ** n for n in range(16, 34, 2))  # 64 KB .. 8 GB
+)
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when work cannot get its memory reservation"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AllocationReport:
+    """Per-stage tracemalloc peaks of one tracked operation"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Record the peak allocation above the stage's starting point. tracemalloc is
+        process-wide, so concurrent untracked work is included in the numbers; the
+        peak reset is safe because only one operation is tracked at a time.
+        """
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.stages[name] = {
+                "peak_kb": round((peak - before) / 1024, 1),
+                "retained_kb": round((current - before) / 1024, 1),
+            }
+            memory_stage_peak.observe(peak - before, self.path, name)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "tracked": True,
+            "peak_kb": max((stage["peak_kb"] for stage in self.stages.values()), default=0.0),
+            "stages": self.stages,
+        }
+
+
+_current_report: contextvars.ContextVar[Optional[AllocationReport]] = contextvars.ContextVar(
+    "current_memory_report", default=None
+)
+
+
+class MemoryTracker:
+    """
+    Turns tracemalloc on while a sampled operation is running. Stages reset the
+    process-wide tracemalloc peak, so at most one operation is tracked at a time;
+    one sampled while another is tracked runs untracked - UOIONHHC
+    """
+
+    def __init__(self, sample_rate: float = 0.05):
+        self.sample_rate = sample_rate
+        self._active = 0
+        self._started_tracing = False
+        self._lock = threading.Lock()
+        self.tracked = 0
+        self.skipped = 0
+
+    @contextlib.contextmanager
+    def track(self, path: str, force: bool = False) -> Iterator[Optional[AllocationReport]]:
+        """Sample this operation; stage() calls inside the block record into its report"""
+        if not (force or random.random() < self.sample_rate):
+            yield None
+            return
+
+        with self._lock:
+            busy = self._active > 0
+            if busy:
+                self.skipped += 1
+            else:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(1)  # one frame keeps the overhead low
+                    self._started_tracing = True
+                self._active += 1
+                self.tracked += 1
+        if busy:
+            yield None
+            return
+        report = AllocationReport(path)
+        token = _current_report.set(report)
+        try:
+            yield report
+        finally:
+            _current_report.reset(token)
+            with self._lock:
+                self._active -= 1
+                if self._active == 0 and self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sample_rate": self.sample_rate, "tracked": self.tracked, "skipped": self.skipped, "active": self._active}
+
+
+def stage(name: str) -> contextlib.AbstractContextManager:
+    """Stage of the operation being tracked in this context (no-op when untracked)"""
+    report = _current_report.get()
+    return report.stage(name) if report is not None else contextlib.nullcontext()
+
+
+def summary() -> Dict[str, Any]:
+    """Memory section for extraction_stats"""
+    report = _current_report.get()
+    return report.summary() if report is not None else {"tracked": False}
+
+
+class MemoryBudget:
+    """
+    Process-wide reservations for memory-heavy work. Each operation reserves an
+    estimate of its peak up front; over budget it waits (policy "queue") for up to
+    wait_seconds, or fails at once (policy "reject"). limit 0 disables the budget.
+    Worker threads wait on a condition variable, request handlers on the event loop - UOIONHHC
+    """
+
+    def __init__(self, limit_bytes: int, policy: str = "queue", wait_seconds: float = 30.0):
+        if policy not in ("queue", "reject"):
+            raise ValueError(f"Unknown memory budget policy: {policy}")
+        self.limit = limit_bytes
+        self.policy = policy
+        self.wait_seconds = wait_seconds
+        self.reserved = 0
+        self.waiting = 0
+        self.queued = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+        # (loop, event) per request handler waiting on its event loop
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def _check_size(self, nbytes: int) -> None:
+        if nbytes > self.limit:
+            with self._cond:
+                self.rejected += 1
+            raise MemoryBudgetExceeded(
+                f"Needs an estimated {nbytes / 2**20:.1f} MB, more than the {self.limit / 2**20:.0f} MB memory budget"
+            )
+
+    def _deadline(self) -> float:
+        return time.monotonic() + (self.wait_seconds if self.policy == "queue" else 0)
+
+    def _busy(self) -> MemoryBudgetExceeded:
+        # Called with self._cond held
+        self.rejected += 1
+        return MemoryBudgetExceeded(
+            f"Memory budget busy ({self.reserved // 2**20} of {self.limit // 2**20} MB reserved)",
+            retry_after=max(self.wait_seconds, 1)
+        )
+
+    def acquire(self, nbytes: int) -> None:
+        """
+        Reserve nbytes, blocking the calling thread per the policy.
+
+        Raises:
+            MemoryBudgetExceeded if the reservation cannot be granted
+        """
+        if not self.limit:
+            return
+        self._check_size(nbytes)
+
+        deadline = self._deadline()
+        with self._cond:
+            if self.reserved + nbytes > self.limit:
+                self.queued += 1
+            self.waiting += 1
+            try:
+                while self.reserved + nbytes > self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._busy()
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.reserved += nbytes
+
+    async def acquire_async(self, nbytes: int) -> None:
+        """
+        Reserve nbytes, waiting on the event loop per the policy. Unlike acquire,
+        a queued request holds no threadpool token while it waits.
+
+        Raises:
+            MemoryBudgetExceeded if the reservation cannot be granted
+        """
+        if not self.limit:
+            return
+        self._check_size(nbytes)
+        if self.try_acquire(nbytes):
+            return
+
+        deadline = self._deadline()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self.queued += 1
+            self.waiting += 1
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                # Clear before checking, so a release after the check sets it again
+                waiter[1].clear()
+                with self._cond:
+                    if self.reserved + nbytes <= self.limit:
+                        self.reserved += nbytes
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._busy()
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self.waiting -= 1
+                self._async_waiters.discard(waiter)
+
+    def try_acquire(self, nbytes: int) -> bool:
+        """Reserve nbytes only if that needs no waiting"""
+        if not self.limit:
+            return True
+        with self._cond:
+            if self.reserved + nbytes > self.limit:
+                return False
+            self.reserved += nbytes
+            return True
+
+    def release(self, nbytes: int) -> None:
+        if not self.limit:
+            return
+        with self._cond:
+            self.reserved -= nbytes
+            self._cond.notify_all()
+            async_waiters = list(self._async_waiters)
+        for loop, event in async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The waiter's loop has closed
+                pass
+
+    @contextlib.contextmanager
+    def reserve(self, nbytes: int) -> Iterator[None]:
+        """Blocking reservation for worker threads"""
+        self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    @contextlib.asynccontextmanager
+    async def reserve_async(self, nbytes: int) -> AsyncIterator[None]:
+        """Reservation for request handlers; waiting happens on the event loop"""
+        await self.acquire_async(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit_mb": self.limit // 2**20,
+                "policy": self.policy,
+                "reserved_mb": round(self.reserved / 2**20, 1),
+                "waiting": self.waiting,
+                "queued": self.queued,
+                "rejected": self.rejected,
+            }
+
+
+# Global instances
+memory_tracker = MemoryTracker(sample_rate=settings.MEMORY_TRACKING_SAMPLE_RATE)
+memory_budget = MemoryBudget(
+    limit_bytes=settings.MEMORY_BUDGET_MB * 2**20,
+    policy=settings.MEMORY_BUDGET_POLICY,
+    wait_seconds=settings.MEMORY_BUDGET_WAIT_SECONDS
+)
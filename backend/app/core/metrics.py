@@ -0,0 +1,399 @@
+"""
+Prometheus-style metrics without a client library or collector.
+Counters, gauges and histograms rendered in the text exposition format, aggregated across workers.
+"""
+
+import atexit
+import bisect
+import glob
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Seconds; covers sub-millisecond queries up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    """A named family of samples keyed by label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[Labels, Any]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing value"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Metric):
+    """Point-in-time value, read from a callback at collection time"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        callback: Optional[Callable[[], Dict[Labels, float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def snapshot(self) -> Dict[Labels, float]:
+        if self.callback is None:
+            return {}
+        try:
+            return dict(self.callback())
+        except Exception as e:
+            print(f"Metrics callback {self.name} failed: {e}")
+            return {}
+
+
+class CallbackCounter(Gauge):
+    """Counter whose totals are kept by a service's own stats()"""
+
+    kind = "counter"
+
+
+class Histogram(Metric):
+    """Bucketed observations plus their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[Labels, List[Any]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(self, labels)
+
+    def snapshot(self) -> Dict[Labels, List[Any]]:
+        with self._lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self._values.items()}
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics. With METRICS_MULTIPROC_DIR set, each worker periodically
+    writes its samples to <dir>/<pid>.json and a scrape on any worker merges them:
+    counters and histograms are summed over every file, gauges over live workers.
+    A worker is live while its pid exists and its file is fresh, so a reused pid does
+    not revive a dead worker's gauges. Files of dead workers are removed when a worker
+    starts, which resets their counters - UOIONHHC
+    """
+
+    def __init__(self, multiproc_dir: str = "", flush_interval: float = 5.0):
+        self.metrics: Dict[str, Metric] = {}
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Dict[Labels, float]],
+        labelnames: Iterable[str] = ()
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def callback_counter(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Dict[Labels, float]],
+        labelnames: Iterable[str] = ()
+    ) -> CallbackCounter:
+        return self.register(CallbackCounter(name, documentation, labelnames, callback))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """This process's samples in a JSON-serializable form"""
+        return {
+            name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+            for name, metric in list(self.metrics.items())
+        }
+
+    # Multi-worker aggregation
+
+    def start(self) -> None:
+        """Begin writing this worker's samples to the shared directory"""
+        if not self.multiproc_dir or self._flusher:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        for pid, path in self._worker_files():
+            if pid != os.getpid() and not self._is_live(pid, path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.multiproc_dir:
+            return
+        path = os.path.join(self.multiproc_dir, f"{os.getpid()}.json")
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"Metrics flush failed: {e}")
+
+    def _worker_files(self) -> List[Tuple[int, str]]:
+        """(pid, path) per worker file; other files in the directory are ignored"""
+        files = []
+        for path in glob.glob(os.path.join(self.multiproc_dir, "*.json")):
+            name = os.path.basename(path)[:-len(".json")]
+            if name.isdigit():
+                files.append((int(name), path))
+        return files
+
+    def _is_live(self, pid: int, path: str) -> bool:
+        # Live workers rewrite their file every flush_interval
+        try:
+            fresh = time.time() - os.path.getmtime(path) < 3 * self.flush_interval
+        except OSError:
+            return False
+        return fresh and _pid_alive(pid)
+
+    def _worker_snapshots(self) -> List[Tuple[bool, Dict[str, Any]]]:
+        """(is_live, snapshot) per worker, with this process read from memory"""
+        snapshots = [(True, self.snapshot())]
+        if not self.multiproc_dir:
+            return snapshots
+        for pid, path in self._worker_files():
+            if pid == os.getpid():
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append((self._is_live(pid, path), json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def collect(self) -> Dict[str, Dict[Labels, Any]]:
+        """Samples merged across workers"""
+        merged: Dict[str, Dict[Labels, Any]] = {name: {} for name in self.metrics}
+        for live, snapshot in self._worker_snapshots():
+            for name, samples in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.kind == "gauge" and not live):
+                    continue
+                target = merged[name]
+                for labels, value in samples:
+                    key = tuple(labels)
+                    if metric.kind == "histogram":
+                        counts, total = target.get(key, [[0] * len(value[0]), 0.0])
+                        target[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+                    else:
+                        target[key] = target.get(key, 0.0) + value
+        return merged
+
+    def render(self) -> str:
+        """Text exposition format 0.0.4"""
+        lines = []
+        for name, samples in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(samples.items()):
+                if metric.kind != "histogram":
+                    lines.append(f"{name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), counts):
+                    cumulative += count
+                    le = 'le="' + _format_value(bound) + '"'
+                    lines.append(f"{name}_bucket{_format_labels(metric.labelnames, labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(metric.labelnames, labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(metric.labelnames, labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Global instance
+registry = MetricsRegistry(
+    multiproc_dir=settings.METRICS_MULTIPROC_DIR,
+    flush_interval=settings.METRICS_FLUSH_SECONDS
+)
+
+http_request_duration = registry.histogram(
+    "lexi_http_request_duration_seconds", "HTTP request latency by route template", ["method", "route", "status"]
+)
+llm_call_duration = registry.histogram(
+    "lexi_llm_call_duration_seconds", "GeminiService call latency including queueing and retries",
+    ["operation", "outcome"]
+)
+llm_tokens = registry.counter("lexi_llm_tokens_total", "LLM tokens by operation", ["operation", "kind"])
+llm_errors = registry.counter("lexi_llm_errors_total", "Failed LLM calls by operation and error", ["operation", "error"])
+extraction_chunk_duration = registry.histogram(
+    "lexi_extraction_chunk_duration_seconds", "Template extraction time per document chunk"
+)
+db_query_duration = registry.histogram(
+    "lexi_db_query_duration_seconds", "Database statement execution time", ["engine"]
+)
+upload_bytes = registry.counter("lexi_upload_bytes_total", "Bytes received by document uploads")
+
+
+def instrument_engine(engine: Any, name: str) -> None:
+    """Time every statement executed by a (sync) SQLAlchemy engine"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        db_query_duration.observe(time.perf_counter() - conn.info["metrics_started"].pop(), name)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+class MetricsMiddleware:
+    """ASGI middleware observing request latency per route template (not per raw path)"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up cardinality
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], path, str(status[0]))
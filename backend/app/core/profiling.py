@@ -0,0 +1,273 @@
+"""
+On-demand and continuous profiling.
+Admin-guarded single-request profiles (stack sampling or cProfile) and a low-rate always-on sampler.
+"""
+
+import cProfile
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from app.core.config import settings
+from app.core import tracing
+
+PROFILE_HEADER = "X-Profile"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+PROFILE_MODES = ("sampling", "cprofile")
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# Leaf frames of threads that are waiting rather than working
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "thread.py")
+MAX_STACK_DEPTH = 64
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """Constant-time check against PROFILING_ADMIN_TOKEN; always False while it is unset"""
+    expected = settings.PROFILING_ADMIN_TOKEN
+    return bool(expected and token) and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def _frame_label(code: Any) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Periodically samples every thread's Python stack and counts them in folded
+    form ("thread;outer;...;inner count"), as read by flamegraph.pl and speedscope - UOIONHHC
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        module_prefixes: Tuple[str, ...] = (),
+        max_stacks: int = 10_000,
+        jitter: bool = False
+    ):
+        self.interval = interval
+        # Only keep stacks passing through these modules (all stacks when empty)
+        self.module_prefixes = module_prefixes
+        self.max_stacks = max_stacks
+        self.jitter = jitter
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.sample()
+            # Jitter avoids locking onto work that recurs at the same period
+            delay = self.interval * random.uniform(0.5, 1.5) if self.jitter else self.interval
+            self._stop.wait(delay)
+
+    def sample(self) -> None:
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or frame.f_code.co_filename.endswith(IDLE_FILES):
+                continue
+            stack = self._stack(frame)
+            if stack is None:
+                continue
+            key = names.get(ident, str(ident)) + ";" + ";".join(stack)
+            with self._lock:
+                if key in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[key] += 1
+                else:
+                    self.dropped += 1
+        self.samples += 1
+
+    def _stack(self, frame: Any) -> Optional[List[str]]:
+        labels = []
+        relevant = not self.module_prefixes
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            if not relevant and frame.f_globals.get("__name__", "").startswith(self.module_prefixes):
+                relevant = True
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        if not relevant:
+            return None
+        labels.reverse()
+        return labels
+
+    def folded(self, reset: bool = False) -> str:
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+            if reset:
+                self.stacks.clear()
+                self.dropped = 0
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "interval_ms": round(self.interval * 1000, 1),
+                "samples": self.samples,
+                "distinct_stacks": len(self.stacks),
+                "dropped": self.dropped,
+            }
+
+
+class Profiler:
+    """Runs one request at a time under a profiler and stores the result by request id"""
+
+    def __init__(self, directory: str, sample_interval: float):
+        self.directory = directory
+        self.sample_interval = sample_interval
+        # One profile at a time: cProfile owns the thread's profile hook, and
+        # concurrent samplers would attribute each other's stacks
+        self._busy = threading.Lock()
+        self.continuous: Optional[StackSampler] = None
+
+    def path(self, profile_id: str, mode: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{'prof' if mode == 'cprofile' else 'folded'}")
+
+    def begin(self, mode: str) -> Optional[Callable[[str], str]]:
+        """
+        Start profiling in the given mode.
+
+        Returns:
+            A function that stops profiling and saves it under a profile id (returning
+            the path), or None when another profile is already running
+        """
+        if not self._busy.acquire(blocking=False):
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+
+        if mode == "cprofile":
+            # Deterministic, but only sees this (event loop) thread
+            profile = cProfile.Profile()
+            profile.enable()
+
+            def finish(profile_id: str) -> str:
+                try:
+                    profile.disable()
+                    path = self.path(profile_id, mode)
+                    profile.dump_stats(path)
+                    return path
+                finally:
+                    self._busy.release()
+            return finish
+
+        sampler = StackSampler(self.sample_interval)
+        sampler.start()
+
+        def finish(profile_id: str) -> str:
+            try:
+                sampler.stop()
+                path = self.path(profile_id, mode)
+                with open(path, "w") as f:
+                    f.write(sampler.folded())
+                return path
+            finally:
+                self._busy.release()
+        return finish
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory)):
+            profile_id, _, extension = name.partition(".")
+            if PROFILE_ID_PATTERN.match(profile_id):
+                stat = os.stat(os.path.join(self.directory, name))
+                profiles.append({
+                    "id": profile_id,
+                    "mode": "cprofile" if extension == "prof" else "sampling",
+                    "bytes": stat.st_size,
+                    "created_at": stat.st_mtime,
+                })
+        return profiles
+
+    def find(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        for mode in PROFILE_MODES:
+            path = self.path(profile_id, mode)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def start_continuous(self, interval: float, module_prefixes: Tuple[str, ...]) -> None:
+        if self.continuous is None:
+            self.continuous = StackSampler(interval, module_prefixes, jitter=True)
+            self.continuous.start()
+
+    def stop_continuous(self) -> None:
+        if self.continuous is not None:
+            self.continuous.stop()
+            self.continuous = None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request sent with "X-Profile: sampling|cprofile" (or ?profile=...) and an
+    X-Admin-Token header. The token is never read from the query string, where it would
+    end up in access logs. The profile id is the trace id, returned in X-Profile-Id.
+    """
+
+    def __init__(self, app: Any, profiler_: Optional[Profiler] = None):
+        self.app = app
+        self.profiler = profiler_ or profiler
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        mode = headers.get(PROFILE_HEADER.lower()) or query.get("profile", [None])[0]
+        if not mode:
+            await self.app(scope, receive, send)
+            return
+
+        token = headers.get(ADMIN_TOKEN_HEADER.lower())
+        if mode not in PROFILE_MODES or not is_admin(token):
+            await send({"type": "http.response.start", "status": 403,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": b'{"detail":"Profiling requires a valid admin token"}'})
+            return
+
+        finish = self.profiler.begin(mode)
+        profile_id = tracing.current_trace_id() or uuid.uuid4().hex
+        status = b"busy" if finish is None else profile_id.encode()
+
+        async def send_with_profile_id(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", status)]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            if finish is not None:
+                path = finish(profile_id)
+                print(f"Profiled {scope['method']} {scope['path']} ({mode}, "
+                      f"{time.perf_counter() - started:.2f}s) -> {path}")
+
+
+# Global instance
+profiler = Profiler(settings.PROFILE_DIR, settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
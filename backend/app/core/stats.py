@@ -0,0 +1,44 @@
+"""
+Lightweight in-process statistics helpers.
+Thread-safe rolling latency windows used by service-level metrics.
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+class LatencyWindow:
+    """Rolling window of recent latency samples (seconds) - UOIONHHC"""
+
+    def __init__(self, size: int = 1024):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        """Record one latency sample"""
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Return the pct-th percentile (0-100) of the window, or None when empty"""
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """p50/p95/p99 in milliseconds plus the total sample count"""
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            "count": self.count,
+            "p50_ms": ms(self.percentile(50)),
+            "p95_ms": ms(self.percentile(95)),
+            "p99_ms": ms(self.percentile(99)),
+        }
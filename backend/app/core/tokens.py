@@ -0,0 +1,29 @@
+"""
+Token estimation helpers for LLM prompt budgeting.
+Uses a character-based heuristic so budgets can be checked without an API call.
+"""
+
+import math
+
+# Gemini averages roughly four characters per token for English legal prose
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+
+    Args:
+        text: Input text
+
+    Returns:
+        Estimated token count (0 for empty text)
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def tokens_to_chars(tokens: int) -> int:
+    """Convert a token budget into an approximate character budget"""
+    return max(tokens, 0) * CHARS_PER_TOKEN
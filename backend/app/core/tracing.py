@@ -0,0 +1,351 @@
+"""
+Lightweight per-request tracing with spans kept in contextvars.
+Sampled traces are exported to a local JSONL or Chrome trace file (chrome://tracing, Perfetto).
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+TRACE_HEADER = "X-Trace-Id"
+TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "thread", "attrs")
+
+    def __init__(self, name: str, parent_id: Optional[str], attrs: Dict[str, Any], start: Optional[float] = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.thread = threading.get_ident()
+        self.attrs = attrs
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+class Trace:
+    """Spans of one request or background job"""
+
+    def __init__(self, trace_id: str, sampled: bool, recording: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        # Unsampled traces still record when slow traces may be kept after the fact
+        self.recording = recording
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+        self._lock = threading.Lock()
+        self.wall_start = time.time()
+        self.perf_start = time.perf_counter()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def wall_time(self, perf: float) -> float:
+        """Epoch seconds for a perf_counter reading"""
+        return self.wall_start + (perf - self.perf_start)
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class SpanExporter:
+    """
+    Appends finished traces to a JSONL file or a Chrome trace (JSON array) file.
+    Once the file reaches max_bytes it is rotated to "<path>.1", replacing the previous one
+    """
+
+    def __init__(self, path: str, fmt: str = "jsonl", max_bytes: int = 0):
+        if fmt not in ("jsonl", "chrome"):
+            raise ValueError(f"Unknown trace export format: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.rotations = 0
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        lines = [json.dumps(self._event(trace, span), default=str) for span in trace.spans]
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+                self.rotations += 1
+            with open(self.path, "a") as f:
+                if self.fmt == "chrome":
+                    # The closing bracket is optional in the Chrome trace array format,
+                    # so events can be appended as they come
+                    if f.tell() == 0:
+                        f.write("[\n")
+                    f.write("".join(line + ",\n" for line in lines))
+                else:
+                    f.write("".join(line + "\n" for line in lines))
+
+    def _event(self, trace: Trace, span: Span) -> Dict[str, Any]:
+        start = trace.wall_time(span.start)
+        duration = (span.end or span.start) - span.start
+        if self.fmt == "chrome":
+            return {
+                "name": span.name,
+                "cat": "lexi",
+                "ph": "X",
+                "ts": round(start * 1e6),
+                "dur": round(duration * 1e6),
+                "pid": os.getpid(),
+                "tid": span.thread,
+                "args": {"trace_id": trace.trace_id, "span_id": span.span_id, "parent_id": span.parent_id, **span.attrs},
+            }
+        return {
+            "trace_id": trace.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "start": round(start, 6),
+            "duration_ms": round(duration * 1000, 3),
+            "thread": span.thread,
+            "attrs": span.attrs,
+        }
+
+
+class Tracer:
+    """
+    Head sampling at sample_rate, plus tail sampling of traces slower than
+    slow_seconds (which means every trace records its spans) - UOIONHHC
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        sample_rate: float = 0.01,
+        slow_seconds: float = 0.0,
+        enabled: bool = True
+    ):
+        self.exporter = exporter
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.started = 0
+        self.exported = 0
+
+    def new_trace(self, trace_id: Optional[str] = None, force_sample: bool = False) -> Trace:
+        if not trace_id or not TRACE_ID_PATTERN.match(trace_id):
+            trace_id = uuid.uuid4().hex
+        sampled = self.enabled and (force_sample or random.random() < self.sample_rate)
+        self.started += 1
+        return Trace(trace_id, sampled, recording=sampled or (self.enabled and self.slow_seconds > 0))
+
+    def finish(self, trace: Trace, elapsed: float) -> None:
+        if not trace.recording or not (trace.sampled or (self.slow_seconds and elapsed >= self.slow_seconds)):
+            return
+        try:
+            self.exporter.export(trace)
+            self.exported += 1
+        except OSError as e:
+            print(f"Trace export failed: {e}")
+
+    @contextlib.contextmanager
+    def trace(
+        self,
+        name: str,
+        trace_id: Optional[str] = None,
+        force_sample: bool = False,
+        **attrs: Any
+    ) -> Iterator[Trace]:
+        """Start a trace whose root span covers the block"""
+        trace = self.new_trace(trace_id, force_sample)
+        trace_token = _current_trace.set(trace)
+        try:
+            with span(name, **attrs) as trace.root:
+                yield trace
+        finally:
+            _current_trace.reset(trace_token)
+            if trace.root is not None:
+                self.finish(trace, trace.root.end - trace.root.start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_seconds": self.slow_seconds,
+            "traces": self.started,
+            "exported": self.exported,
+            "rotations": self.exporter.rotations,
+            "path": self.exporter.path,
+        }
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    Time the block as a child of the current span. Yields None (and costs almost
+    nothing) when no recording trace is active.
+    """
+    trace = _current_trace.get()
+    if trace is None or not trace.recording:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        trace.add(current)
+
+
+def record_span(name: str, start: float, end: float, **attrs: Any) -> None:
+    """Add an already-timed leaf span (perf_counter readings) to the current trace"""
+    trace = _current_trace.get()
+    if trace is None or not trace.recording:
+        return
+    parent = _current_span.get()
+    leaf = Span(name, parent.span_id if parent else None, attrs, start=start)
+    leaf.end = end
+    trace.add(leaf)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator wrapping a sync or async function in a span named after it"""
+    def decorate(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    Carry the current trace into fn when it runs on another thread (e.g. a
+    ThreadPoolExecutor). Each call gets its own copy, so concurrent calls are safe.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def instrument_engine(engine: Any) -> None:
+    """Record statements and session commits of a (sync) SQLAlchemy engine as spans"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("trace_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["trace_started"].pop()
+        # First words identify the statement without recording parameters
+        record_span("db.query", started, time.perf_counter(), statement=" ".join(statement.split()[:6]))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("trace_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    if not getattr(Session, "_traced_commits", False):
+        Session._traced_commits = True
+
+        @event.listens_for(Session, "before_commit")
+        def before_commit(session):
+            session.info["commit_started"] = time.perf_counter()
+
+        @event.listens_for(Session, "after_commit")
+        def after_commit(session):
+            started = session.info.pop("commit_started", None)
+            if started is not None:
+                record_span("db.commit", started, time.perf_counter())
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware tracing each HTTP request and returning its X-Trace-Id.
+    "X-Trace-Sample: 1" forces export only together with a valid X-Admin-Token.
+    """
+
+    def __init__(self, app: Any, tracer_: Optional[Tracer] = None):
+        self.app = app
+        self.tracer = tracer_ or tracer
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        force_sample = False
+        if headers.get("x-trace-sample") == "1":
+            # Imported here: profiling depends on this module
+            from app.core.profiling import ADMIN_TOKEN_HEADER, is_admin
+
+            force_sample = is_admin(headers.get(ADMIN_TOKEN_HEADER.lower()))
+        with self.tracer.trace(
+            "http.request",
+            trace_id=headers.get(TRACE_HEADER.lower()),
+            force_sample=force_sample,
+            method=scope["method"],
+            path=scope["path"]
+        ) as trace:
+            header = (TRACE_HEADER.lower().encode(), trace.trace_id.encode())
+
+            async def send_with_trace_id(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [header]
+                    if trace.root is not None:
+                        trace.root.set(status=message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+            route = scope.get("route")
+            if trace.root is not None and route is not None:
+                trace.root.name = f"{scope['method']} {route.path}"
+
+
+# Global instance
+tracer = Tracer(
+    SpanExporter(settings.TRACE_EXPORT_PATH, settings.TRACE_EXPORT_FORMAT, settings.TRACE_EXPORT_MAX_MB * 2**20),
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    slow_seconds=settings.TRACE_SLOW_SECONDS,
+    enabled=settings.TRACING_ENABLED
+)
@@ -0,0 +1,200 @@
+"""
+Transparent zlib compression for large text columns.
+Drafts can be compressed against a shared per-template dictionary (zlib zdict).
+"""
+
+import contextvars
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional, Set, Tuple
+
+from sqlalchemy import LargeBinary, event, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.types import TypeDecorator
+
+from app.core.config import settings
+
+# First byte of every stored value; rows written before compression are plain TEXT
+RAW = b"\x00"
+ZLIB = b"\x01"
+ZLIB_DICT = b"\x02"
+
+DICTIONARY_KEY_BYTES = 16
+ZLIB_WINDOW = 32 * 1024  # zlib only uses the last 32 KiB of a dictionary
+
+
+class DictionaryText(str):
+    """A str that should be compressed against a shared dictionary"""
+
+    dictionary_key: str
+    dictionary: bytes
+
+
+def dictionary_for(source: str) -> Tuple[str, bytes]:
+    """Dictionary bytes and their content key for a source text (e.g. a template body)"""
+    data = source.encode("utf-8")[-ZLIB_WINDOW:]
+    return hashlib.sha256(data).hexdigest()[:DICTIONARY_KEY_BYTES], data
+
+
+def with_dictionary(value: str, source: str) -> DictionaryText:
+    """
+    Mark value for compression against source (e.g. a draft against its template body).
+    The dictionary is registered locally and persisted when the value is flushed.
+    """
+    key, data = dictionary_for(source)
+    dictionaries.put(key, data)
+    marked = DictionaryText(value)
+    marked.dictionary_key = key
+    marked.dictionary = data
+    return marked
+
+
+# Connection of the ORM query whose rows are being decoded, so a dictionary miss is read
+# in that query's transaction (and, under AsyncSession, without blocking the event loop)
+_query_connection: contextvars.ContextVar[Optional[Connection]] = contextvars.ContextVar(
+    "compression_query_connection", default=None
+)
+
+# Models with columns that may reference a dictionary (see register_dictionary_hooks)
+_dictionary_models: Set[Any] = set()
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _decode_on_session_connection(state: ORMExecuteState) -> Any:
+    if not state.is_select or not any(mapper.class_ in _dictionary_models for mapper in state.all_mappers):
+        return None
+    token = _query_connection.set(state.session.connection(bind_arguments=state.bind_arguments))
+    try:
+        # Decode every row now, while the connection is set; rows are otherwise
+        # decoded lazily once the caller iterates the result
+        return state.invoke_statement().freeze()()
+    finally:
+        _query_connection.reset(token)
+
+
+class DictionaryCache:
+    """LRU cache of compression dictionaries, loaded from the database on a miss"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> bytes:
+        """Raises LookupError if the dictionary is unknown"""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        # Rare: first read of this template's drafts in this process
+        query = text("SELECT data FROM compression_dictionaries WHERE id = :id")
+        conn = _query_connection.get()
+        if conn is not None:
+            data = conn.execute(query, {"id": key}).scalar()
+        else:
+            # Core reads and unbuffered sync results; these run off the event loop
+            from app.db.database import engine
+
+            with engine.connect() as conn:
+                data = conn.execute(query, {"id": key}).scalar()
+        if data is None:
+            raise LookupError(f"Unknown compression dictionary {key}")
+        self.put(key, bytes(data))
+        return bytes(data)
+
+
+dictionaries = DictionaryCache(max_entries=settings.COMPRESSION_DICTIONARY_CACHE)
+
+
+def compress(value: str) -> bytes:
+    """Encode a str into the stored representation"""
+    data = value.encode("utf-8")
+    if len(data) < settings.COMPRESSION_MIN_BYTES:
+        return RAW + data
+
+    dictionary_key = getattr(value, "dictionary_key", None)
+    if dictionary_key:
+        compressor = zlib.compressobj(settings.COMPRESSION_LEVEL, zdict=value.dictionary)
+        return ZLIB_DICT + dictionary_key.encode("ascii") + compressor.compress(data) + compressor.flush()
+    return ZLIB + zlib.compress(data, settings.COMPRESSION_LEVEL)
+
+
+def decompress(stored: Any) -> str:
+    """Decode a stored value; plain text from before compression passes through"""
+    if isinstance(stored, str):
+        return stored
+    stored = bytes(stored)
+    marker, body = stored[:1], stored[1:]
+    if marker == RAW:
+        return body.decode("utf-8")
+    if marker == ZLIB:
+        return zlib.decompress(body).decode("utf-8")
+    if marker == ZLIB_DICT:
+        key = body[:DICTIONARY_KEY_BYTES].decode("ascii")
+        decompressor = zlib.decompressobj(zdict=dictionaries.get(key))
+        data = decompressor.decompress(body[DICTIONARY_KEY_BYTES:]) + decompressor.flush()
+        return data.decode("utf-8")
+    # Bytes without a known marker are legacy UTF-8 text
+    return stored.decode("utf-8")
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored zlib-compressed; reads and writes plain str"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress(value)
+
+
+def persist_dictionary(conn: Connection, key: str, data: bytes) -> None:
+    """Store a dictionary in the current transaction if it is not stored yet"""
+    from app.db.models import CompressionDictionary
+
+    table = CompressionDictionary.__table__
+    if conn.dialect.name == "postgresql":
+        statement = pg_insert(table).values(id=key, data=data).on_conflict_do_nothing()
+    elif conn.dialect.name == "sqlite":
+        statement = sqlite_insert(table).values(id=key, data=data).on_conflict_do_nothing()
+    else:
+        if conn.execute(select(table.c.id).where(table.c.id == key)).first():
+            return
+        statement = table.insert().values(id=key, data=data)
+    conn.execute(statement)
+
+
+def register_dictionary_hooks(model: Any, attr: str) -> None:
+    """Persist the dictionary of a DictionaryText assigned to model.attr before it is written"""
+    _dictionary_models.add(model)
+
+    def before_write(mapper, conn, target):
+        added = inspect(target).attrs[attr].history.added
+        value: Optional[Any] = added[0] if added else None
+        # Short values are stored raw and never reference the dictionary
+        if isinstance(value, DictionaryText) and len(value.encode("utf-8")) >= settings.COMPRESSION_MIN_BYTES:
+            persist_dictionary(conn, value.dictionary_key, value.dictionary)
+
+    event.listen(model, "before_insert", before_write)
+    event.listen(model, "before_update", before_write)
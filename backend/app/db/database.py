@@ -1,36 +1,152 @@
 """
 Database connection and session management.
-Sets up SQLAlchemy engine and session factory.
+Sets up the async engine used by the API, plus a sync engine for workers and scripts.
 """
 
-from sqlalchemy import create_engine
+from typing import Any, AsyncIterator, Dict
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core import metrics, tracing
+
+# Async drivers for the sync URLs accepted in DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Derive the async driver URL (aiosqlite / asyncpg) from DATABASE_URL"""
+    parsed = make_url(url)
+    if parsed.drivername in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[parsed.drivername])
+    return parsed.render_as_string(hide_password=False)
+
+
+def engine_options(url: str, is_async: bool = False) -> Dict[str, Any]:
+    """Connection and pool options shared by the sync and async engines"""
+    parsed = make_url(url)
+    options: Dict[str, Any] = {}
+    if parsed.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            # In-memory databases use a single shared connection; no pool sizing
+            return options
+        if is_async:
+            # aiosqlite defaults to opening a connection per checkout
+            options["poolclass"] = AsyncAdaptedQueuePool
 
-# Create engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE
+    )
+    return options
+
+
+# Sync engine (background workers, init_db, scripts)
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+
+# Async engine (API request handlers)
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    **engine_options(settings.DATABASE_URL, is_async=True)
 )
 
-# Create session factory
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the production SQLite profile to every new connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={-settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+
+if settings.METRICS_ENABLED:
+    metrics.instrument_engine(engine, "sync")
+    metrics.instrument_engine(async_engine.sync_engine, "async")
+
+if settings.TRACING_ENABLED:
+    tracing.instrument_engine(engine)
+    tracing.instrument_engine(async_engine.sync_engine)
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False  # attributes stay readable after commit without lazy I/O
+)
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency to get database session"""
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def add_missing_columns() -> None:
+    """Add nullable columns introduced after a table was created (create_all skips them)"""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                ))
+            print(f" Added column {table.name}.{column.name}")
+
+
+def fail_duplicate_active_jobs() -> None:
+    """Keep only the newest active extraction job per document, so the unique index can be built"""
+    # The partial index is only declared for SQLite
+    if engine.dialect.name != "sqlite" or not inspect(engine).has_table("extraction_jobs"):
+        return
+    with engine.begin() as conn:
+        duplicates = conn.execute(text(
+            "UPDATE extraction_jobs SET status = 'failed', error = 'Duplicate of a newer job' "
+            "WHERE status IN ('queued', 'running') AND rowid NOT IN ("
+            "SELECT max(rowid) FROM extraction_jobs WHERE status IN ('queued', 'running') GROUP BY document_id)"
+        )).rowcount
+    if duplicates:
+        print(f" Failed {duplicates} duplicate active extraction job(s)")
 
 
 def init_db():
     """Initialize database - create all tables"""
+    from app.db.search import create_search_tables
+
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    fail_duplicate_active_jobs()
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    create_search_tables(engine)
     print(" Database tables created - UOIONHHC")
@@ -3,9 +3,10 @@ SQLAlchemy database models for the legal templating system.
 Defines templates, variables, instances, and documents tables.
 """
 
-from sqlalchemy import Column, String, Text, Boolean, Integer, Float, JSON, BLOB, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Text, Boolean, Integer, Float, JSON, BLOB, LargeBinary, DateTime, ForeignKey, Index, text
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
+from app.db.compression import CompressedText, register_dictionary_hooks
 from app.db.database import Base
 
 
@@ -19,9 +20,9 @@ class Template(Base):
     doc_type = Column(String)
     jurisdiction = Column(String)
     similarity_tags = Column(JSON)  # List of tags for matching
-    body_md = Column(Text, nullable=False)  # Markdown template body
-    embedding = Column(BLOB)  # Vector embedding for similarity search
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    body_md = deferred(Column(CompressedText, nullable=False))  # Markdown template body
+    embedding = deferred(Column(BLOB))  # Vector embedding for similarity search
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # Relationships
     variables = relationship("TemplateVariable", back_populates="template", cascade="all, delete-orphan")
@@ -33,7 +34,7 @@ class TemplateVariable(Base):
     __tablename__ = "template_variables"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    template_id = Column(String, ForeignKey("templates.id"), nullable=False)
+    template_id = Column(String, ForeignKey("templates.id"), nullable=False, index=True)
     key = Column(String, nullable=False)  # snake_case variable key
     label = Column(String, nullable=False)  # Human-readable label
     description = Column(Text)  # Detailed description
@@ -52,16 +53,27 @@ class Instance(Base):
     __tablename__ = "instances"
     
     id = Column(String, primary_key=True, index=True)
-    template_id = Column(String, ForeignKey("templates.id"), nullable=False)
+    template_id = Column(String, ForeignKey("templates.id"), nullable=False, index=True)
     user_query = Column(Text, nullable=False)  # Original user request
     answers_json = Column(JSON)  # Dict of variable_key: answer
-    draft_md = Column(Text)  # Generated draft markdown
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    template_version = Column(String, ForeignKey("template_versions.id"), index=True)  # Body the draft renders from
+    draft_md = deferred(Column(CompressedText))  # Generated draft markdown; empty in delta storage mode
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # Relationships
     template = relationship("Template", back_populates="instances")
 
 
+class TemplateVersion(Base):
+    """Immutable snapshot of a template body that drafts are rendered from"""
+    __tablename__ = "template_versions"
+    
+    id = Column(String, primary_key=True)  # Content hash of body_md
+    template_id = Column(String, ForeignKey("templates.id"), nullable=False, index=True)
+    body_md = deferred(Column(CompressedText, nullable=False))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class Document(Base):
     """Document model - stores uploaded raw documents"""
     __tablename__ = "documents"
@@ -69,9 +81,44 @@ class Document(Base):
     id = Column(String, primary_key=True, index=True)
     filename = Column(String, nullable=False)
     mime_type = Column(String, nullable=False)
-    raw_text = Column(Text)  # Extracted text content
-    embedding = Column(BLOB)  # Vector embedding
+    raw_text = deferred(Column(CompressedText))  # Extracted text content
+    embedding = deferred(Column(BLOB))  # Vector embedding
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class CompressionDictionary(Base):
+    """Shared zlib dictionaries (template bodies) used to compress drafts"""
+    __tablename__ = "compression_dictionaries"
+    
+    id = Column(String, primary_key=True)  # Content hash of the dictionary
+    data = Column(LargeBinary, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class ExtractionJob(Base):
+    """Extraction job model - tracks background template extraction per document"""
+    __tablename__ = "extraction_jobs"
+    
+    id = Column(String, primary_key=True, index=True)
+    document_id = Column(String, ForeignKey("documents.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, failed
+    chunks_done = Column(Integer, default=0)
+    total_chunks = Column(Integer)
+    result_json = Column(JSON)  # Serialized ExtractionResult once completed
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # At most one queued or running job per document
+        Index(
+            "ix_extraction_jobs_active_document", "document_id", unique=True,
+            sqlite_where=text("status IN ('queued', 'running')")
+        ),
+    )
+
+
+register_dictionary_hooks(Instance, "draft_md")
+
+
 # UOIONHHC - Database models
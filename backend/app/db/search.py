@@ -0,0 +1,298 @@
+"""
+SQLite FTS5 full-text search over documents, templates and drafts.
+FTS rows carry their source id and are kept in sync by ORM write hooks.
+"""
+
+import base64
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, literal_column, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db import models
+
+# scope -> (source model, FTS table, source title attr, source body attr)
+SEARCH_SCOPES = {
+    "documents": (models.Document, "documents_fts", "filename", "raw_text"),
+    "templates": (models.Template, "templates_fts", "title", "body_md"),
+    "drafts": (models.Instance, "instances_fts", "user_query", "draft_md"),
+}
+
+# Bodies that may be stored as a template delta: (version attr, answers attr).
+# Such rows are indexed with their rendered text.
+RENDERED_BODIES = {
+    "instances_fts": ("template_version", "answers_json"),
+}
+
+TERM_PATTERN = re.compile(r"\w+\*?", re.UNICODE)
+
+BACKFILL_BATCH = 1000
+
+# Maximum indexed terms a "word*" query expands to
+PREFIX_EXPANSIONS = 16
+
+
+def is_supported(engine: Engine) -> bool:
+    """Full-text search is only available on SQLite"""
+    return engine.dialect.name == "sqlite"
+
+
+def create_search_tables(engine: Engine) -> None:
+    """
+    Create missing FTS5 tables and backfill them from their source tables.
+
+    FTS rows are keyed by source id, never by the source table's implicit rowid:
+    the source tables have String primary keys, so VACUUM may renumber their rowids.
+    {fts}_ids maps each source id to its FTS rowid, so writes and deletes find the
+    row through a primary key (filtering an UNINDEXED FTS column scans the table).
+    """
+    if not is_supported(engine):
+        return
+
+    with engine.begin() as conn:
+        for model, fts_table, title_attr, body_attr in SEARCH_SCOPES.values():
+            columns = [row[1] for row in conn.execute(text(f"PRAGMA table_info({fts_table})"))]
+            if columns and "id" not in columns:
+                # Tables from before the id column mirrored source rowids; rebuild them
+                conn.execute(text(f"DROP TABLE IF EXISTS {fts_table}_vocab"))
+                conn.execute(text(f"DROP TABLE {fts_table}"))
+                columns = []
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {fts_table}_ids (id TEXT PRIMARY KEY, fts_rowid INTEGER NOT NULL) "
+                f"WITHOUT ROWID"
+            ))
+            if columns:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table}_vocab USING fts5vocab({fts_table}, 'row')"
+                ))
+                continue
+
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+                f"id UNINDEXED, title, body, tokenize = 'porter unicode61 remove_diacritics 2')"
+            ))
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table}_vocab USING fts5vocab({fts_table}, 'row')"
+            ))
+            conn.execute(text(f"DELETE FROM {fts_table}_ids"))
+            # Read through the ORM column types so compressed text is indexed as plain text.
+            # Oldest first, so FTS rowid order follows recency as it does for later writes
+            delta_attrs = RENDERED_BODIES.get(fts_table, ())
+            rows = conn.execute(select(
+                model.id,
+                getattr(model, title_attr),
+                getattr(model, body_attr),
+                *(getattr(model, attr) for attr in delta_attrs)
+            ).order_by(literal_column("rowid"))).yield_per(BACKFILL_BATCH)
+            insert = text(f"INSERT INTO {fts_table}(id, title, body) VALUES (:id, :title, :body)")
+            for batch in rows.partitions():
+                conn.execute(insert, [
+                    {"id": row[0], "title": row[1], "body": _indexed_body(conn, row[2], *row[3:])}
+                    for row in batch
+                ])
+            conn.execute(text(f"INSERT INTO {fts_table}_ids(id, fts_rowid) SELECT id, rowid FROM {fts_table}"))
+
+
+def _indexed_body(conn: Connection, body: Optional[str], version: Optional[str] = None,
+                  answers: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Stored body text, or the draft rendered from its template version in delta mode"""
+    if body is not None or not version:
+        return body
+    from app.services.draft_renderer import draft_renderer
+
+    return draft_renderer.render_version(conn, version, answers or {})
+
+
+def _remove(conn: Connection, fts_table: str, source_id: str) -> None:
+    """Delete a source row's FTS entry, if it has one"""
+    fts_rowid = conn.execute(
+        text(f"SELECT fts_rowid FROM {fts_table}_ids WHERE id = :id"),
+        {"id": source_id}
+    ).scalar()
+    if fts_rowid is not None:
+        conn.execute(text(f"DELETE FROM {fts_table} WHERE rowid = :rowid"), {"rowid": fts_rowid})
+        conn.execute(text(f"DELETE FROM {fts_table}_ids WHERE id = :id"), {"id": source_id})
+
+
+def _register_hooks(model: Any, fts_table: str, title_attr: str, body_attr: str) -> None:
+    """Mirror inserts, relevant updates and deletes of model into fts_table"""
+    delta_attrs = RENDERED_BODIES.get(fts_table, ())
+
+    def write(conn: Connection, target: Any) -> None:
+        body = _indexed_body(conn, getattr(target, body_attr), *(getattr(target, attr) for attr in delta_attrs))
+        _remove(conn, fts_table, target.id)
+        fts_rowid = conn.execute(
+            text(f"INSERT INTO {fts_table}(id, title, body) VALUES (:id, :title, :body)"),
+            {"id": target.id, "title": getattr(target, title_attr), "body": body}
+        ).lastrowid
+        conn.execute(
+            text(f"INSERT INTO {fts_table}_ids(id, fts_rowid) VALUES (:id, :rowid)"),
+            {"id": target.id, "rowid": fts_rowid}
+        )
+
+    @event.listens_for(model, "after_insert")
+    def after_insert(mapper, conn, target):
+        if is_supported(conn.engine):
+            write(conn, target)
+
+    @event.listens_for(model, "after_update")
+    def after_update(mapper, conn, target):
+        # Skip updates that do not touch searchable text; answers only count once a
+        # delta draft renders from them (in-progress answers are bulk-written, without hooks)
+        state = inspect(target)
+        changed = any(
+            state.attrs[attr].history.has_changes() for attr in (title_attr, body_attr, *delta_attrs)
+        )
+        if changed and is_supported(conn.engine):
+            write(conn, target)
+
+    @event.listens_for(model, "before_delete")
+    def before_delete(mapper, conn, target):
+        if is_supported(conn.engine):
+            _remove(conn, fts_table, target.id)
+
+
+for _model, _fts_table, _title_attr, _body_attr in SEARCH_SCOPES.values():
+    _register_hooks(_model, _fts_table, _title_attr, _body_attr)
+
+
+def parse_terms(query: str) -> List[Tuple[str, bool]]:
+    """Split free text into (word, is_prefix) terms; a trailing * requests prefix matching"""
+    terms = []
+    for term in TERM_PATTERN.findall(query.lower()):
+        word = term.rstrip("*")
+        if word:
+            terms.append((word, term.endswith("*")))
+    return terms
+
+
+def build_match_query(conn: Connection, fts_table: str, terms: List[Tuple[str, bool]]) -> str:
+    """
+    Turn parsed terms into a safe FTS5 MATCH expression for one table.
+    Every word is quoted (so operators in user input are inert) and ANDed. Prefix
+    terms are expanded to their most common indexed completions, which is far cheaper
+    than FTS5's own prefix scan on large tables.
+    """
+    parts = []
+    for word, prefix in terms:
+        if not prefix:
+            parts.append(f'"{word}"')
+            continue
+        upper = word[:-1] + chr(ord(word[-1]) + 1)
+        completions = conn.execute(
+            text(
+                f"SELECT term FROM {fts_table}_vocab WHERE term >= :lower AND term < :upper "
+                f"ORDER BY doc DESC LIMIT :n"
+            ),
+            {"lower": word, "upper": upper, "n": PREFIX_EXPANSIONS}
+        ).scalars().all()
+        if completions:
+            parts.append("(" + " OR ".join(f'"{term}"' for term in completions) + ")")
+        else:
+            parts.append(f'"{word}"*')
+    return " ".join(parts)
+
+
+def encode_cursor(score: float, scope: str, rowid: int) -> str:
+    payload = json.dumps([score, scope, rowid]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str, int]:
+    """Raises ValueError for malformed cursors"""
+    try:
+        score, scope, rowid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(score), str(scope), int(rowid)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def search(
+    conn: Connection,
+    query: str,
+    scopes: List[str],
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    rank_window: int = 20000
+) -> Dict[str, Any]:
+    """
+    Ranked full-text search with snippets and keyset pagination.
+
+    Args:
+        conn: Database connection
+        query: Free-text query
+        scopes: Any of "documents", "templates", "drafts"
+        limit: Page size
+        cursor: next_cursor from the previous page
+        rank_window: Maximum matches ranked per scope (newest first)
+
+    Returns:
+        {"results": [...], "next_cursor": str | None}
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return {"results": [], "next_cursor": None}
+    matches = {scope: build_match_query(conn, SEARCH_SCOPES[scope][1], terms) for scope in scopes}
+
+    # Rank first, then build snippets and resolve ids only for the rows on this page.
+    # Very broad queries only rank the newest rank_window matches per scope: FTS5 walks
+    # rowids (assigned in write order) and stops early, keeping latency bounded
+    # regardless of table size.
+    selects = []
+    for scope in scopes:
+        _, fts_table, _, _ = SEARCH_SCOPES[scope]
+        # bm25() is lower-is-better; titles weigh double and the unindexed id not at all
+        selects.append(
+            f"SELECT * FROM (SELECT '{scope}' AS scope, rowid AS rid, bm25({fts_table}, 0.0, 2.0, 1.0) AS score "
+            f"FROM {fts_table} WHERE {fts_table} MATCH :match_{scope} ORDER BY rowid DESC LIMIT :window)"
+        )
+
+    params: Dict[str, Any] = {"limit": limit + 1, "window": rank_window}
+    params.update({f"match_{scope}": match for scope, match in matches.items()})
+    keyset = ""
+    if cursor:
+        params["c_score"], params["c_scope"], params["c_rid"] = decode_cursor(cursor)
+        keyset = "WHERE (score, scope, rid) > (:c_score, :c_scope, :c_rid)"
+
+    sql = (
+        f"SELECT scope, rid, score FROM ({' UNION ALL '.join(selects)}) "
+        f"{keyset} ORDER BY score, scope, rid LIMIT :limit"
+    )
+    rows = conn.execute(text(sql), params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.score, last.scope, last.rid)
+
+    details = {}
+    for row in rows:
+        _, fts_table, _, _ = SEARCH_SCOPES[row.scope]
+        # rowid equality is pushed into FTS5, so each lookup touches one row
+        details[(row.scope, row.rid)] = conn.execute(
+            text(
+                f"SELECT f.id AS id, f.title AS title, "
+                f"snippet({fts_table}, 2, '<mark>', '</mark>', '…', 16) AS snippet "
+                f"FROM {fts_table} AS f "
+                f"WHERE {fts_table} MATCH :match AND f.rowid = :rowid"
+            ),
+            {"match": matches[row.scope], "rowid": row.rid}
+        ).first()
+
+    return {
+        "results": [
+            {
+                "scope": row.scope,
+                "id": details[(row.scope, row.rid)].id,
+                "title": details[(row.scope, row.rid)].title,
+                "snippet": details[(row.scope, row.rid)].snippet,
+                "score": round(-row.score, 4),
+            }
+            for row in rows
+            if details[(row.scope, row.rid)] is not None
+        ],
+        "next_cursor": next_cursor,
+    }
@@ -5,14 +5,22 @@ Created by UOIONHHC
 """
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 from pathlib import Path
 
-from app.api import templates, chat, documents
+from app.api import templates, chat, documents, jobs, search, admin
 from app.core.config import settings
-from app.db.database import init_db
+from app.core import metrics, profiling, tracing
+from app.core.memory import memory_budget
+from app.db.database import async_engine, engine, init_db
+from app.services.job_queue import extraction_queue
+from app.services.gemini_service import get_gemini_service
+from app.services.write_behind import answer_buffer
+from app.services.draft_renderer import draft_renderer
+from app.services.warmup import warmup
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -30,8 +38,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[tracing.TRACE_HEADER],
 )
 
+# Request latency per route (wraps CORS handling)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Admin-requested single-request profiles (inside tracing, so profiles share the trace id)
+if settings.PROFILING_ADMIN_TOKEN:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Per-request spans and the X-Trace-Id response header
+if settings.TRACING_ENABLED:
+    app.add_middleware(tracing.TracingMiddleware)
+
 # Create uploads directory
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -44,17 +65,44 @@ if UPLOAD_DIR.exists():
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
 app.include_router(templates.router, prefix="/api/templates", tags=["templates"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+app.include_router(search.router, prefix="/api/search", tags=["search"])
+if settings.PROFILING_ADMIN_TOKEN:
+    app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
+    """Initialize database and start background workers on startup"""
     init_db()
     print("Database initialized")
+    extraction_queue.start()
+    print(f"Extraction workers started ({extraction_queue.workers})")
+    answer_buffer.start()
+    metrics.registry.start()
+    if settings.CONTINUOUS_PROFILING_ENABLED:
+        profiling.profiler.start_continuous(
+            settings.CONTINUOUS_PROFILE_INTERVAL_MS / 1000,
+            tuple(settings.CONTINUOUS_PROFILE_MODULES)
+        )
+    # Runs in the background; /ready turns 200 when it is done
+    warmup.start()
     print(f"API Server running on http://localhost:{settings.PORT}")
     print(f"API Docs available at http://localhost:{settings.PORT}/docs")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers and flush buffered answers; unfinished jobs resume on next startup"""
+    await warmup.shutdown()
+    extraction_queue.shutdown()
+    await answer_buffer.shutdown()
+    profiling.profiler.stop_continuous()
+    # Pooled aiosqlite connections run on non-daemon threads that keep the process alive
+    await async_engine.dispose()
+    engine.dispose()
+
+
 @app.get("/")
 async def root():
     """Root endpoint - API status"""
@@ -78,6 +126,90 @@ async def health_check():
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness for load balancers: 503 until startup warm-up has finished (and again
+    while shutting down). Use /health for liveness.
+    """
+    return JSONResponse(warmup.stats(), status_code=200 if warmup.ready else 503)
+
+
+@app.get("/health/llm")
+async def llm_health():
+    """LLM scheduler queue depth and latency metrics"""
+    return get_gemini_service().stats()
+
+
+
+def cache_counts(field: str):
+    """hits or misses per in-process cache, for lexi_cache_*_total"""
+    def read():
+        counts = {
+            ("compiled_templates",): draft_renderer.compiled.stats()[field],
+            ("rendered_drafts",): draft_renderer.drafts.stats()[field],
+        }
+        cassette = getattr(get_gemini_service().backend, "stats", None)
+        if cassette:
+            counts[("llm_cassette",)] = cassette()[field]
+        return counts
+    return read
+
+
+def coalesced_calls():
+    groups = get_gemini_service().inflight.stats()["groups"]
+    return {(group,): counts["coalesced"] for group, counts in groups.items()}
+
+
+def llm_queue_depth():
+    classes = get_gemini_service().scheduler.stats()["classes"]
+    return {(name,): pclass["queue_depth"] for name, pclass in classes.items()}
+
+
+if settings.METRICS_ENABLED:
+    metrics.registry.gauge(
+        "lexi_chat_conversations", "Conversations held in the in-memory chat store",
+        lambda: {(): len(chat.conversations)}
+    )
+    metrics.registry.gauge(
+        "lexi_answer_buffer_pending", "Drafts with answers buffered but not yet written",
+        lambda: {(): answer_buffer.stats()["pending"]}
+    )
+    metrics.registry.gauge("lexi_llm_queue_depth", "LLM calls waiting for a slot", llm_queue_depth, ["priority"])
+    metrics.registry.callback_counter(
+        "lexi_cache_hits_total", "Cache hits; hit ratio = hits / (hits + misses)", cache_counts("hits"), ["cache"]
+    )
+    metrics.registry.callback_counter(
+        "lexi_cache_misses_total", "Cache misses", cache_counts("misses"), ["cache"]
+    )
+    metrics.registry.callback_counter(
+        "lexi_llm_coalesced_calls_total", "LLM calls served by an identical in-flight call", coalesced_calls,
+        ["operation"]
+    )
+
+    metrics.registry.gauge(
+        "lexi_ready", "1 once startup warm-up has finished and the worker takes traffic",
+        lambda: {(): int(warmup.ready)}
+    )
+    metrics.registry.gauge(
+        "lexi_memory_budget_reserved_bytes", "Memory reserved by running uploads and extractions",
+        lambda: {(): memory_budget.reserved}
+    )
+    metrics.registry.gauge(
+        "lexi_memory_budget_waiting", "Operations waiting for memory budget",
+        lambda: {(): memory_budget.waiting}
+    )
+    metrics.registry.callback_counter(
+        "lexi_memory_budget_rejections_total", "Operations refused by the memory budget",
+        lambda: {(): memory_budget.rejected}
+    )
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics_endpoint():
+        """Prometheus text exposition of this process (and sibling workers with METRICS_MULTIPROC_DIR)"""
+        return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
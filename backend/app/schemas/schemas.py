@@ -40,15 +40,14 @@ class TemplateCreate(BaseModel):
     variables: List[VariableSchema]
 
 
-class TemplateResponse(BaseModel):
-    """Template response schema"""
+class TemplateSummary(BaseModel):
+    """Template list item (without the body)"""
     id: str
     title: str
     file_description: Optional[str]
     doc_type: Optional[str]
     jurisdiction: Optional[str]
     similarity_tags: Optional[List[str]]
-    body_md: str
     created_at: datetime
     variables: List[VariableResponse] = []
     
@@ -56,6 +55,11 @@ class TemplateResponse(BaseModel):
         from_attributes = True
 
 
+class TemplateResponse(TemplateSummary):
+    """Template response schema"""
+    body_md: str
+
+
 class TemplateMatchResult(BaseModel):
     """Template match result for selection"""
     template_id: str
@@ -83,6 +87,7 @@ class InstanceResponse(BaseModel):
     """Draft instance response"""
     id: str
     template_id: str
+    template_version: Optional[str] = None
     user_query: str
     answers_json: Dict[str, Any]
     draft_md: Optional[str]
@@ -106,6 +111,34 @@ class ExtractionResult(BaseModel):
     extraction_stats: Dict[str, Any]
 
 
+class JobResponse(BaseModel):
+    """Background extraction job status"""
+    id: str
+    document_id: str
+    status: str  # "queued", "running", "completed", "failed"
+    chunks_done: int = 0
+    total_chunks: Optional[int] = None
+    result: Optional[ExtractionResult] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class SearchHit(BaseModel):
+    """One full-text search result"""
+    scope: str  # "documents", "templates", "drafts"
+    id: str
+    title: Optional[str] = None
+    snippet: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    """Page of full-text search results"""
+    results: List[SearchHit]
+    next_cursor: Optional[str] = None
+
+
 class ChatMessage(BaseModel):
     """Chat message schema"""
     role: str  # "user" or "assistant"
@@ -0,0 +1,134 @@
+"""
+Structure-aware text chunker sized by estimated tokens.
+Produces (start, end) offsets into the source text instead of copied slices.
+"""
+
+import re
+from typing import Iterable, Iterator, Optional, Tuple
+
+from app.core.tokens import tokens_to_chars
+
+# Boundary patterns, strongest first. Headings and clauses split *before* the
+# match so the heading stays with its body; the rest split *after* the match.
+HEADING_PATTERN = re.compile(
+    r'^[ \t]*(?:(?:ARTICLE|SECTION|SCHEDULE|ANNEXURE|EXHIBIT|Article|Section|Schedule)\b'
+    r'|\d+(?:\.\d+)*\.?[ \t]+[A-Z]'
+    r'|[A-Z][A-Z0-9 ,&\-]{3,}$)',
+    re.MULTILINE
+)
+CLAUSE_PATTERN = re.compile(r'^[ \t]*\(?(?:[a-z]|[ivx]+|\d+)[\.\)][ \t]+', re.MULTILINE)
+PARAGRAPH_PATTERN = re.compile(r'\n[ \t]*\n')
+LINE_PATTERN = re.compile(r'\n')
+SENTENCE_PATTERN = re.compile(r'[\.;:!?][\)"\']?[ \t]+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+BOUNDARIES = (
+    (HEADING_PATTERN, False),
+    (CLAUSE_PATTERN, False),
+    (PARAGRAPH_PATTERN, True),
+    (LINE_PATTERN, True),
+    (SENTENCE_PATTERN, True),
+    (WHITESPACE_PATTERN, True),
+)
+
+
+class TextChunker:
+    """Splits text on heading/clause/paragraph boundaries - UOIONHHC"""
+
+    def __init__(self, max_tokens: int = 1000, overlap_tokens: int = 50):
+        """
+        Args:
+            max_tokens: Maximum estimated tokens per chunk
+            overlap_tokens: Estimated tokens shared between consecutive chunks
+        """
+        self.max_chars = max(tokens_to_chars(max_tokens), 1)
+        # Overlap is capped at a quarter chunk so every step makes progress
+        self.overlap_chars = min(tokens_to_chars(overlap_tokens), self.max_chars // 4)
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Lazily yield chunk offsets over a complete text.
+
+        Args:
+            text: Source text
+
+        Yields:
+            (start, end) offsets; text[start:end] is the chunk
+        """
+        start = 0
+        length = len(text)
+
+        while start < length:
+            end = self._find_end(text, start, length)
+            yield start, end
+            if end >= length:
+                break
+            start = self._next_start(text, start, end)
+
+    def iter_stream(self, pages: Iterable[str], separator: str = "\n\n") -> Iterator[Tuple[int, int, str]]:
+        """
+        Lazily chunk a streaming page source.
+        Only the unconsumed tail of the stream is held in memory.
+
+        Args:
+            pages: Iterable of page (or block) texts
+            separator: Text inserted between pages
+
+        Yields:
+            (start, end, chunk_text) with offsets into the joined stream
+        """
+        buffer = ""
+        offset = 0  # global offset of buffer[0]
+        first = True
+
+        for page in pages:
+            if not page:
+                continue
+            buffer = page if first else buffer + separator + page
+            first = False
+
+            # Emit chunks while the buffer holds more than one full window
+            while len(buffer) > self.max_chars * 2:
+                end = self._find_end(buffer, 0, len(buffer))
+                yield offset, offset + end, buffer[:end]
+                next_start = self._next_start(buffer, 0, end)
+                buffer = buffer[next_start:]
+                offset += next_start
+
+        for start, end in self.spans(buffer):
+            yield offset + start, offset + end, buffer[start:end]
+
+    def _find_end(self, text: str, start: int, length: int) -> int:
+        """Pick the end offset of the chunk starting at start"""
+        limit = start + self.max_chars
+        if limit >= length:
+            return length
+
+        # Only accept boundaries in the back half so chunks stay reasonably full
+        floor = start + self.max_chars // 2
+        for pattern, split_after in BOUNDARIES:
+            cut = self._last_match(pattern, text, floor, limit, split_after)
+            if cut is not None and cut > start:
+                return cut
+        return limit
+
+    def _next_start(self, text: str, start: int, end: int) -> int:
+        """Pick where the next chunk starts, stepping back by the overlap"""
+        if not self.overlap_chars:
+            return end
+        next_start = end - self.overlap_chars
+        # Snap forward to a word boundary so the overlap does not begin mid-word
+        match = WHITESPACE_PATTERN.search(text, next_start, end)
+        if match:
+            next_start = match.end()
+        return max(next_start, start + 1)
+
+    @staticmethod
+    def _last_match(pattern: re.Pattern, text: str, lo: int, hi: int, split_after: bool) -> Optional[int]:
+        """Return the offset of the last boundary match within [lo, hi]"""
+        cut = None
+        for match in pattern.finditer(text, lo, hi):
+            position = match.end() if split_after else match.start()
+            if lo < position <= hi:
+                cut = position
+        return cut
@@ -4,12 +4,17 @@ Handles file validation, text extraction, and chunking.
 """
 
 import os
+import shutil
 import tempfile
 from pathlib import Path
-from typing import List, Tuple
-import docx
-import PyPDF2
+from typing import Iterator, List, Tuple
 from fastapi import UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.memory import stage
+from app.core.tokens import CHARS_PER_TOKEN
+from app.core.tracing import traced
+from app.services.chunker import TextChunker
 
 
 class DocumentProcessor:
@@ -47,6 +52,54 @@ class DocumentProcessor:
             )
     
     @staticmethod
+    def iter_docx_blocks(file_path: str) -> Iterator[str]:
+        """
+        Lazily yield non-empty paragraph and table-cell texts from a DOCX file.
+        
+        Args:
+            file_path: Path to DOCX file
+            
+        Yields:
+            Text of each block in document order (paragraphs, then tables)
+        """
+        import docx
+
+        doc = docx.Document(file_path)
+        
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():
+                yield paragraph.text
+        
+        # Extract text from tables
+        for table in doc.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    if cell.text.strip():
+                        yield cell.text
+    
+    @staticmethod
+    def iter_pdf_pages(file_path: str) -> Iterator[str]:
+        """
+        Lazily yield non-empty page texts from a PDF file.
+        
+        Args:
+            file_path: Path to PDF file
+            
+        Yields:
+            Text of each page
+        """
+        import PyPDF2
+
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            
+            for page in pdf_reader.pages:
+                page_text = page.extract_text()
+                if page_text.strip():
+                    yield page_text
+    
+    @staticmethod
+    @traced()
     def extract_text_from_docx(file_path: str) -> str:
         """
         Extract text from DOCX file.
@@ -58,21 +111,7 @@ class DocumentProcessor:
             Extracted text
         """
         try:
-            doc = docx.Document(file_path)
-            text = []
-            
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text.append(paragraph.text)
-            
-            # Extract text from tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        if cell.text.strip():
-                            text.append(cell.text)
-            
-            return '\n\n'.join(text)
+            return '\n\n'.join(DocumentProcessor.iter_docx_blocks(file_path))
         
         except Exception as e:
             raise HTTPException(
@@ -81,6 +120,7 @@ class DocumentProcessor:
             )
     
     @staticmethod
+    @traced()
     def extract_text_from_pdf(file_path: str) -> str:
         """
         Extract text from PDF file.
@@ -92,17 +132,7 @@ class DocumentProcessor:
             Extracted text
         """
         try:
-            text = []
-            
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text.strip():
-                        text.append(page_text)
-            
-            return '\n\n'.join(text)
+            return '\n\n'.join(DocumentProcessor.iter_pdf_pages(file_path))
         
         except Exception as e:
             raise HTTPException(
@@ -111,6 +141,7 @@ class DocumentProcessor:
             )
     
     @staticmethod
+    @traced()
     async def extract_text(file: UploadFile) -> Tuple[str, str]:
         """
         Extract text from uploaded file.
@@ -124,17 +155,20 @@ class DocumentProcessor:
         # Save to temp file
         file_ext = Path(file.filename).suffix.lower()
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            content = await file.read()
-            temp_file.write(content)
+        with stage("spool"), tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
+            # Copy in blocks rather than holding the whole upload as one bytes object
+            await file.seek(0)
+            await run_in_threadpool(shutil.copyfileobj, file.file, temp_file, 1024 * 1024)
             temp_path = temp_file.name
         
         try:
             # Extract based on file type
             if file_ext == '.pdf':
-                text = DocumentProcessor.extract_text_from_pdf(temp_path)
+                with stage("extract_text"):
+                    text = DocumentProcessor.extract_text_from_pdf(temp_path)
             elif file_ext in ['.docx', '.doc']:
-                text = DocumentProcessor.extract_text_from_docx(temp_path)
+                with stage("extract_text"):
+                    text = DocumentProcessor.extract_text_from_docx(temp_path)
             else:
                 raise HTTPException(
                     status_code=400,
@@ -150,40 +184,69 @@ class DocumentProcessor:
             raise e
     
     @staticmethod
+    def chunk_spans(
+        text: str,
+        max_tokens: int = 1000,
+        overlap_tokens: int = 50
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Lazily split text into structure-aware chunks.
+        
+        Args:
+            text: Input text
+            max_tokens: Maximum estimated tokens per chunk
+            overlap_tokens: Estimated tokens shared between chunks
+            
+        Yields:
+            (start, end) offsets into text
+        """
+        return TextChunker(max_tokens, overlap_tokens).spans(text)
+    
+    @staticmethod
+    def iter_file_chunks(
+        file_path: str,
+        max_tokens: int = 1000,
+        overlap_tokens: int = 50
+    ) -> Iterator[Tuple[int, int, str]]:
+        """
+        Stream chunks straight from a PDF/DOCX file without building the full text.
+        
+        Args:
+            file_path: Path to PDF or DOCX file
+            max_tokens: Maximum estimated tokens per chunk
+            overlap_tokens: Estimated tokens shared between chunks
+            
+        Yields:
+            (start, end, chunk_text) with offsets into the extracted text
+        """
+        if Path(file_path).suffix.lower() == '.pdf':
+            pages = DocumentProcessor.iter_pdf_pages(file_path)
+        else:
+            pages = DocumentProcessor.iter_docx_blocks(file_path)
+        return TextChunker(max_tokens, overlap_tokens).iter_stream(pages)
+    
+    @staticmethod
+    @traced()
     def chunk_text(text: str, chunk_size: int = 4000, overlap: int = 200) -> List[str]:
         """
         Split text into overlapping chunks.
         
+        Kept for callers that want materialized strings; prefer chunk_spans.
+        
         Args:
             text: Input text
-            chunk_size: Size of each chunk in characters
-            overlap: Overlap between chunks
+            chunk_size: Approximate size of each chunk in characters
+            overlap: Approximate overlap between chunks in characters
             
         Returns:
             List of text chunks
         """
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at sentence boundaries
-            if end < len(text):
-                # Look for sentence end in last 100 chars
-                search_start = max(end - 100, start)
-                sentence_end = text.rfind('.', search_start, end)
-                
-                if sentence_end > start:
-                    end = sentence_end + 1
-            
-            chunks.append(text[start:end])
-            start = end - overlap
-        
-        return chunks
+        spans = DocumentProcessor.chunk_spans(
+            text,
+            max_tokens=max(chunk_size // CHARS_PER_TOKEN, 1),
+            overlap_tokens=overlap // CHARS_PER_TOKEN
+        )
+        return [text[start:end] for start, end in spans] or [text]
     
     @staticmethod
     def create_markdown_template(
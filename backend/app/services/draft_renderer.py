@@ -0,0 +1,253 @@
+"""
+Draft rendering from template versions and answers.
+Drafts can be stored as answers plus a template version hash and rendered on demand.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db import models
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{([a-zA-Z_][a-zA-Z0-9_]*)\}\}")
+
+
+def version_hash(body_md: str) -> str:
+    """Content hash identifying one version of a template body"""
+    return hashlib.sha256(body_md.encode("utf-8")).hexdigest()[:16]
+
+
+def answers_digest(answers: Dict[str, Any]) -> str:
+    payload = json.dumps(answers, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompiledTemplate:
+    """A template body split into literal text and placeholder slots"""
+
+    def __init__(self, body_md: str):
+        self.literals: List[str] = []
+        self.keys: List[str] = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(body_md):
+            self.literals.append(body_md[position:match.start()])
+            self.keys.append(match.group(1))
+            position = match.end()
+        self.literals.append(body_md[position:])
+
+        # Literal text preceding each slot, so slot offsets in a rendered draft
+        # only depend on the answers, not on the template text
+        self.literal_offsets: List[int] = []
+        total = 0
+        for literal in self.literals[:-1]:
+            total += len(literal)
+            self.literal_offsets.append(total)
+
+    @staticmethod
+    def slot_text(key: str, answers: Dict[str, Any]) -> str:
+        """Text a slot renders to; unanswered placeholders stay as {{key}}"""
+        return str(answers[key]) if key in answers else f"{{{{{key}}}}}"
+
+    def render(self, answers: Dict[str, Any]) -> str:
+        parts = [self.literals[0]]
+        for key, literal in zip(self.keys, self.literals[1:]):
+            parts.append(self.slot_text(key, answers))
+            parts.append(literal)
+        return "".join(parts)
+
+    def patch(self, answers: Dict[str, Any], key: str, value: Any) -> List[Dict[str, Any]]:
+        """
+        Edits that turn render(answers) into render(answers with key set to value).
+        Cost depends on the number of slots, not on the length of the template.
+
+        Returns:
+            [{"start", "end", "text"}] in ascending order; offsets index the old draft
+            in Unicode code points, so apply them from the last to the first
+        """
+        old_text = self.slot_text(key, answers)
+        new_text = str(value)
+        if old_text == new_text:
+            return []
+
+        edits = []
+        filled = 0  # rendered length of the slots before this one
+        for index, slot_key in enumerate(self.keys):
+            if slot_key == key:
+                start = self.literal_offsets[index] + filled
+                edits.append({"start": start, "end": start + len(old_text), "text": new_text})
+            filled += len(self.slot_text(slot_key, answers))
+        return edits
+
+
+def apply_patch(draft: str, edits: List[Dict[str, Any]]) -> str:
+    """Apply edits from CompiledTemplate.patch to the draft they were computed for"""
+    for edit in reversed(edits):
+        draft = draft[:edit["start"]] + edit["text"] + draft[edit["end"]:]
+    return draft
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with hit/miss counters"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: Any) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class DraftRenderer:
+    """Renders drafts through cached compiled template versions - UOIONHHC"""
+
+    def __init__(self, compiled_cache_size: int = 64, draft_cache_size: int = 256):
+        self.compiled = LRUCache(compiled_cache_size)
+        self.drafts = LRUCache(draft_cache_size)
+
+    def compile(self, version_id: str, body_md: str) -> CompiledTemplate:
+        compiled = self.compiled.get(version_id)
+        if compiled is None:
+            compiled = CompiledTemplate(body_md)
+            self.compiled.put(version_id, compiled)
+        return compiled
+
+    def render_body(self, version_id: str, body_md: str, answers: Dict[str, Any]) -> str:
+        """Render answers against a version whose body is already at hand"""
+        return self._render(version_id, answers, lambda: body_md)
+
+    def _compiled(self, version_id: str, load_body: Callable[[], Optional[str]]) -> CompiledTemplate:
+        compiled = self.compiled.get(version_id)
+        if compiled is None:
+            body_md = load_body()
+            if body_md is None:
+                raise LookupError(f"Unknown template version {version_id}")
+            compiled = self.compile(version_id, body_md)
+        return compiled
+
+    def _render(self, version_id: str, answers: Dict[str, Any], load_body: Callable[[], Optional[str]]) -> str:
+        return self._render_with(version_id, answers, lambda: self._compiled(version_id, load_body))
+
+    def _render_with(
+        self, version_id: str, answers: Dict[str, Any], get_compiled: Callable[[], CompiledTemplate]
+    ) -> str:
+        key = (version_id, answers_digest(answers))
+        draft = self.drafts.get(key)
+        if draft is None:
+            draft = get_compiled().render(answers)
+            self.drafts.put(key, draft)
+        return draft
+
+    @staticmethod
+    def _version_loader(conn: Connection, version_id: str) -> Callable[[], Optional[str]]:
+        return lambda: conn.execute(
+            select(models.TemplateVersion.body_md).where(models.TemplateVersion.id == version_id)
+        ).scalar()
+
+    async def ensure_version(self, db: AsyncSession, template: models.Template) -> str:
+        """
+        Record the template's current body as a version (if new) and return its hash.
+        Versions are immutable, so drafts keep rendering exactly after the template changes.
+        Runs in the caller's transaction; an existing version is left untouched.
+        """
+        version_id = version_hash(template.body_md)
+        self.compile(version_id, template.body_md)
+        await db.run_sync(lambda session: self._store_version(session.connection(), version_id, template))
+        return version_id
+
+    @staticmethod
+    def _store_version(conn: Connection, version_id: str, template: models.Template) -> None:
+        table = models.TemplateVersion.__table__
+        values = {"id": version_id, "template_id": template.id, "body_md": template.body_md}
+        if conn.dialect.name == "postgresql":
+            conn.execute(pg_insert(table).values(**values).on_conflict_do_nothing())
+        elif conn.dialect.name == "sqlite":
+            conn.execute(sqlite_insert(table).values(**values).on_conflict_do_nothing())
+        elif not conn.execute(select(table.c.id).where(table.c.id == version_id)).first():
+            conn.execute(table.insert().values(**values))
+
+    def render_version(self, conn: Connection, version_id: str, answers: Dict[str, Any]) -> str:
+        """
+        Render answers against a stored template version (sync; usable inside a flush).
+
+        Raises:
+            LookupError if the version does not exist
+        """
+        return self._render(version_id, answers, self._version_loader(conn, version_id))
+
+    def compiled_version(self, conn: Connection, version_id: str) -> CompiledTemplate:
+        """
+        Compiled form of a stored template version (sync).
+
+        Raises:
+            LookupError if the version does not exist
+        """
+        return self._compiled(version_id, self._version_loader(conn, version_id))
+
+    async def render(self, db: AsyncSession, instance: models.Instance) -> Optional[str]:
+        """
+        The instance's draft: stored text if present, otherwise rendered from its version.
+        draft_md is deferred, so load the instance with undefer(models.Instance.draft_md).
+
+        Returns:
+            Draft markdown, or None if no draft was generated yet
+        """
+        if instance.draft_md is not None:
+            return instance.draft_md
+        if not instance.template_version:
+            return None
+
+        answers = instance.answers_json or {}
+        # Render with the object looked up here; a membership check followed by a second
+        # lookup could see the entry evicted in between
+        compiled = self.compiled.get(instance.template_version)
+        if compiled is not None:
+            # No database access needed
+            return self._render_with(instance.template_version, answers, lambda: compiled)
+        return await db.run_sync(
+            lambda session: self.render_version(session.connection(), instance.template_version, answers)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {"compiled": self.compiled.stats(), "drafts": self.drafts.stats()}
+
+
+# Global instance
+draft_renderer = DraftRenderer(
+    compiled_cache_size=settings.COMPILED_TEMPLATE_CACHE_SIZE,
+    draft_cache_size=settings.DRAFT_CACHE_SIZE
+)
@@ -4,10 +4,9 @@ Searches the web for similar legal documents when no local match exists.
 BONUS FEATURE - Created by UOIONHHC
 """
 
-from exa_py import Exa
+import threading
 from typing import List, Dict, Any, Optional
 from app.core.config import settings
-import httpx
 
 
 class ExaService:
@@ -16,6 +15,8 @@ class ExaService:
     def __init__(self):
         self.client = None
         if settings.EXA_API_KEY:
+            from exa_py import Exa
+
             self.client = Exa(api_key=settings.EXA_API_KEY)
     
     async def search_legal_templates(
@@ -127,6 +128,8 @@ class ExaService:
         Returns:
             Document text content
         """
+        import httpx
+
         try:
             async with httpx.AsyncClient(timeout=30.0) as client:
                 response = await client.get(url)
@@ -144,5 +147,16 @@ class ExaService:
         return self.client is not None
 
 
-# Global instance
-exa_service = ExaService()
+# Global instance, built on first use
+_exa_service: Optional[ExaService] = None
+_exa_service_lock = threading.Lock()
+
+
+def get_exa_service() -> ExaService:
+    """Shared ExaService; the Exa client (and its SDK) load on first use"""
+    global _exa_service
+    if _exa_service is None:
+        with _exa_service_lock:
+            if _exa_service is None:
+                _exa_service = ExaService()
+    return _exa_service
@@ -4,28 +4,213 @@ Handles variable extraction, template matching, question generation, and embeddi
 Created by UOIONHHC
 """
 
-import google.generativeai as genai
 import json
 import re
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Callable, List, Dict, Any, Optional, Tuple
 from app.core.config import settings
-import numpy as np
+from app.core import metrics, tracing
+from app.core.stats import LatencyWindow
+from app.core.tokens import estimate_tokens
+from app.services.chunker import TextChunker
+from app.services.llm_backends import build_backend
+from app.services.llm_errors import LLMError
+from app.services.llm_resilience import CircuitBreaker, build_breaker, build_hedger
+from app.services.llm_scheduler import BATCH, INTERACTIVE, build_scheduler
+from app.services.rate_limiter import AIMDController, build_quota_limiter, build_retry_policy
+from app.services.singleflight import SingleFlight, request_key
 
-# Configure Gemini
-genai.configure(api_key=settings.GEMINI_API_KEY)
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class GeminiService:
     """Service for Gemini AI operations"""
     
     def __init__(self):
-        # Try gemini-pro which is the stable production model
+        # Gemini, the offline fake, or a cassette (see LLM_BACKEND)
+        self.backend = build_backend()
+        self.scheduler = build_scheduler()
+        self.limiter = build_quota_limiter()
+        self.retry = build_retry_policy()
+        self.aimd = AIMDController(
+            self.scheduler,
+            min_limit=settings.LLM_MIN_CONCURRENCY,
+            max_limit=settings.LLM_MAX_CONCURRENCY
+        )
+        self.hedger = build_hedger()
+        self.inflight = SingleFlight()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self._operation_latency: Dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+    
+    def _generate(
+        self,
+        operation: str,
+        priority: str,
+        contents: List[str],
+        generation_config: Dict[str, Any]
+    ) -> Any:
+        """
+        Send a generate_content call through request coalescing, the rate
+        limiter and the LLM scheduler.
+        
+        Args:
+            operation: Service operation name, used for metrics
+            priority: Scheduler priority class (INTERACTIVE or BATCH)
+            contents: Prompt parts
+            generation_config: Gemini generation config
+            
+        Returns:
+            Gemini response
+            
+        Raises:
+            LLMError (or a subclass) when the call fails after retries
+        """
+        # Identical concurrent requests share one in-flight call
+        return self.inflight.do(
+            request_key(operation, contents, generation_config),
+            lambda: self._call(
+                operation,
+                priority,
+                lambda timeout: self.backend.generate(operation, contents, generation_config, timeout=timeout),
+                prompt_tokens=self.estimate_tokens(*contents),
+                # Interactive generations are idempotent reads, so they are safe to hedge
+                hedge=priority == INTERACTIVE
+            ),
+            group=operation
+        )
+    
+    def _call(
+        self,
+        operation: str,
+        priority: str,
+        fn: Callable[[float], Any],
+        prompt_tokens: int,
+        hedge: bool = False
+    ) -> Any:
+        """
+        Run one provider call with circuit breaking, quota limiting, scheduling,
+        AIMD, hedging and retries, all bounded by LLM_CALL_DEADLINE_SECONDS.
+        fn takes the seconds left before the deadline and passes them to the provider
+        as a request timeout, so an abandoned call cannot hold its slot past it.
+        
+        Raises:
+            CircuitOpenError immediately while the operation's breaker is open
+        """
+        breaker = self._breaker(operation, priority)
+        breaker.allow()
+        
+        deadline = time.monotonic() + settings.LLM_CALL_DEADLINE_SECONDS
+        hedge_after = None
+        if hedge and settings.LLM_HEDGE_ENABLED:
+            hedge_after = self.hedger.delay_for(self._operation_latency[operation])
+        
+        def attempt(mark_sent: Callable[[], None]) -> Any:
+            with tracing.span("llm.quota_wait"):
+                self.limiter.acquire(prompt_tokens, deadline)
+            queued = time.perf_counter()
+            with self.scheduler.slot(priority, deadline):
+                started = time.perf_counter()
+                tracing.record_span("llm.scheduler_wait", queued, started)
+                # Starts the hedge timer: hedge_after is a provider-only latency
+                mark_sent()
+                try:
+                    with tracing.span("llm.provider_call", backend=self.backend.name):
+                        result = fn(max(deadline - time.monotonic(), 0.001))
+                finally:
+                    self._operation_latency[operation].observe(time.perf_counter() - started)
+            self.aimd.on_success()
+            return result
+        
+        started = time.perf_counter()
         try:
-            self.model = genai.GenerativeModel('gemini-pro')
-        except:
-            # Fallback to 1.5-flash
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-        self.embedding_model = "models/embedding-001"
+            with tracing.span(f"llm.{operation}", priority=priority, prompt_tokens=prompt_tokens):
+                # Hedged attempts run on pool threads; carry the trace over
+                attempt_in_trace = tracing.bind(attempt)
+                result = self.retry.call(
+                    lambda: self.hedger.run(attempt_in_trace, deadline, hedge_after),
+                    deadline,
+                    operation,
+                    on_throttle=self.aimd.on_throttle
+                )
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            breaker.record(False, elapsed)
+            metrics.llm_call_duration.observe(elapsed, operation, "error")
+            metrics.llm_errors.inc(1, operation, type(e).__name__)
+            raise
+        elapsed = time.perf_counter() - started
+        breaker.record(True, elapsed)
+        metrics.llm_call_duration.observe(elapsed, operation, "ok")
+        self._record_tokens(operation, result, prompt_tokens)
+        return result
+    
+    @staticmethod
+    def _record_tokens(operation: str, result: Any, prompt_tokens: int) -> None:
+        """Provider-reported token counts when available, else the prompt estimate"""
+        usage = getattr(result, "usage_metadata", None)
+        metrics.llm_tokens.inc(getattr(usage, "prompt_token_count", None) or prompt_tokens, operation, "prompt")
+        completion_tokens = getattr(usage, "candidates_token_count", None)
+        if completion_tokens:
+            metrics.llm_tokens.inc(completion_tokens, operation, "completion")
+    
+    def _breaker(self, operation: str, priority: str) -> CircuitBreaker:
+        """Get or create the circuit breaker for an operation at a priority"""
+        name = operation if priority == INTERACTIVE else f"{operation}:{priority}"
+        with self._breakers_lock:
+            if name not in self._breakers:
+                self._breakers[name] = build_breaker(name, interactive=priority == INTERACTIVE)
+            return self._breakers[name]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Scheduler, throttling, retry, hedging, breaker, coalescing and latency metrics"""
+        return {
+            "backend": self.backend.name,
+            "scheduler": self.scheduler.stats(),
+            "rate_limiter": self.limiter.stats(),
+            "concurrency": self.aimd.stats(),
+            "retries": self.retry.stats(),
+            "hedging": self.hedger.stats(),
+            "coalescing": self.inflight.stats(),
+            "circuit_breakers": {
+                operation: breaker.stats()
+                for operation, breaker in list(self._breakers.items())
+            },
+            "operations": {
+                operation: window.summary()
+                for operation, window in list(self._operation_latency.items())
+            }
+        }
+    
+    def estimate_tokens(self, *parts: str) -> int:
+        """Estimate the combined token count of the given prompt parts"""
+        return sum(estimate_tokens(part) for part in parts)
+    
+    @staticmethod
+    def compact_variables(
+        variables: List[Dict[str, Any]],
+        include_labels: bool = True
+    ) -> str:
+        """
+        Build a compact key/label listing of variables for prompts.
+        
+        Args:
+            variables: Variable definitions
+            include_labels: Whether to append the human-readable label
+            
+        Returns:
+            One "- key: label" line per variable
+        """
+        lines = []
+        for var in variables:
+            if include_labels and var.get("label"):
+                lines.append(f"- {var['key']}: {var['label']}")
+            else:
+                lines.append(f"- {var['key']}")
+        return "\n".join(lines)
     
     def extract_variables_from_chunk(
         self,
@@ -36,20 +221,18 @@ class GeminiService:
         Extract variables from a document chunk.
         Uses existing variables to prevent duplication.
         
+        Existing variables are sent as a compact key/label list, and chunks
+        whose prompt would exceed GEMINI_PROMPT_TOKEN_BUDGET are split and
+        extracted piece by piece.
+        
         Args:
             text: Document text chunk
             existing_variables: Previously discovered variables
             
         Returns:
-            Dict with variables and similarity_tags
+            Dict with variables, similarity_tags and token_usage
         """
         
-        existing_vars_str = ""
-        if existing_variables:
-            existing_vars_str = "\n\nPreviously discovered variables:\n" + json.dumps(
-                existing_variables, indent=2
-            )
-        
         system_prompt = """You are a legal document templating expert. Extract reusable variables from legal documents to create templates.
 
 CRITICAL RULES:
@@ -90,19 +273,35 @@ OUTPUT FORMAT (strict JSON only):
 }
 """
         
-        user_prompt = f"""Extract variables from this legal document text:
-
-{text}
-{existing_vars_str}
-
-IMPORTANT: 
-- If existing variables match the meaning of a field in this text, REUSE that variable key
-- Only create NEW variables for genuinely new fields
-- Ensure all variables have clear labels, descriptions, and examples
-- Return ONLY valid JSON"""
+        budget = settings.GEMINI_PROMPT_TOKEN_BUDGET
+        existing_vars_str = ""
+        if existing_variables:
+            listing = self.compact_variables(existing_variables)
+            if self.estimate_tokens(listing) > budget // 2:
+                # Drop labels once the listing itself eats half the budget
+                listing = self.compact_variables(existing_variables, include_labels=False)
+            existing_vars_str = "\n\nPreviously discovered variable keys:\n" + listing
+        
+        overhead = self.estimate_tokens(system_prompt, self._extraction_user_prompt("", existing_vars_str))
+        text_budget = max(budget - overhead, settings.GEMINI_MIN_CHUNK_TOKENS)
+        
+        if estimate_tokens(text) > text_budget:
+            return self._extract_rechunked(text, existing_variables, text_budget)
+        
+        user_prompt = self._extraction_user_prompt(text, existing_vars_str)
+        prompt_tokens = self.estimate_tokens(system_prompt, user_prompt)
+        token_usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": 0,
+            "calls": 1,
+            "rechunked": False
+        }
+        result_text = ""
         
         try:
-            response = self.model.generate_content(
+            response = self._generate(
+                "extract_variables",
+                BATCH,
                 [system_prompt, user_prompt],
                 generation_config={
                     "temperature": settings.GEMINI_TEMPERATURE,
@@ -111,6 +310,7 @@ IMPORTANT:
             )
             
             result_text = response.text.strip()
+            token_usage.update(self._response_token_usage(response, prompt_tokens, result_text))
             
             # Extract JSON from markdown code blocks if present
             json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', result_text, re.DOTALL)
@@ -118,17 +318,89 @@ IMPORTANT:
                 result_text = json_match.group(1)
             
             result = json.loads(result_text)
+            result["token_usage"] = token_usage
             return result
             
         except json.JSONDecodeError as e:
             print(f" JSON decode error: {e}")
             print(f" Response text (first 500 chars): {result_text[:500]}")
-            return {"variables": [], "similarity_tags": []}
+            return {"variables": [], "similarity_tags": [], "token_usage": token_usage}
+        except LLMError:
+            # Quota/outage failures must not masquerade as "no variables found"
+            raise
         except Exception as e:
             print(f" Error extracting variables: {e}")
             import traceback
             traceback.print_exc()
-            return {"variables": [], "similarity_tags": []}
+            return {"variables": [], "similarity_tags": [], "token_usage": token_usage}
+    
+    @staticmethod
+    def _extraction_user_prompt(text: str, existing_vars_str: str) -> str:
+        """Build the user prompt for variable extraction"""
+        return f"""Extract variables from this legal document text:
+
+{text}
+{existing_vars_str}
+
+IMPORTANT: 
+- If a previously discovered key matches the meaning of a field in this text, REUSE that variable key
+- Only create NEW variables for genuinely new fields
+- Ensure all variables have clear labels, descriptions, and examples
+- Return ONLY valid JSON"""
+    
+    def _extract_rechunked(
+        self,
+        text: str,
+        existing_variables: Optional[List[Dict[str, Any]]],
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        """
+        Extract variables from text that does not fit the prompt budget.
+        Splits the text on structural boundaries into budget-sized pieces
+        and merges their results.
+        """
+        known = list(existing_variables or [])
+        known_keys = {v["key"] for v in known}
+        new_variables = []
+        tags = []
+        token_usage = {
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "calls": 0,
+            "rechunked": True
+        }
+        
+        for start, end in TextChunker(max_tokens, overlap_tokens=0).spans(text):
+            piece = text[start:end]
+            piece_result = self.extract_variables_from_chunk(piece, existing_variables=known or None)
+            
+            for var in piece_result.get("variables", []):
+                if var.get("key") and var["key"] not in known_keys:
+                    known_keys.add(var["key"])
+                    known.append(var)
+                    new_variables.append(var)
+            
+            for tag in piece_result.get("similarity_tags", []):
+                if tag not in tags:
+                    tags.append(tag)
+            
+            usage = piece_result.get("token_usage", {})
+            token_usage["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            token_usage["completion_tokens"] += usage.get("completion_tokens", 0)
+            token_usage["calls"] += usage.get("calls", 0)
+        
+        return {"variables": new_variables, "similarity_tags": tags, "token_usage": token_usage}
+    
+    @staticmethod
+    def _response_token_usage(response: Any, prompt_tokens: int, result_text: str) -> Dict[str, int]:
+        """Read token counts from the response, falling back to estimates"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            return {
+                "prompt_tokens": getattr(usage, "prompt_token_count", prompt_tokens),
+                "completion_tokens": getattr(usage, "candidates_token_count", estimate_tokens(result_text))
+            }
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(result_text)}
     
     def match_template(
         self,
@@ -210,7 +482,9 @@ Available templates:
 Return the best matching template and top alternatives with confidence scores."""
         
         try:
-            response = self.model.generate_content(
+            response = self._generate(
+                "match_template",
+                INTERACTIVE,
                 [system_prompt, user_prompt],
                 generation_config={
                     "temperature": 0.2,  # Lower temperature for consistent matching
@@ -237,6 +511,8 @@ Return the best matching template and top alternatives with confidence scores.""
                 "has_match": has_match
             }
             
+        except LLMError:
+            raise
         except Exception as e:
             print(f"Error matching template: {e}")
             return {
@@ -304,7 +580,9 @@ Return questions as JSON array with this format:
 Return clear, user-friendly questions."""
         
         try:
-            response = self.model.generate_content(
+            response = self._generate(
+                "generate_questions",
+                INTERACTIVE,
                 [system_prompt, user_prompt],
                 generation_config={
                     "temperature": 0.4,
@@ -376,7 +654,9 @@ Variables to fill:
 Extract any values mentioned in the query that match these variables."""
         
         try:
-            response = self.model.generate_content(
+            response = self._generate(
+                "pre_fill_variables",
+                INTERACTIVE,
                 [system_prompt, user_prompt],
                 generation_config={
                     "temperature": 0.1,
@@ -394,38 +674,59 @@ Extract any values mentioned in the query that match these variables."""
             filled = json.loads(result_text)
             return filled
             
+        except LLMError:
+            raise
         except Exception as e:
             print(f"Error pre-filling variables: {e}")
             return {}
     
-    def generate_embedding(self, text: str) -> Optional[np.ndarray]:
+    def generate_embedding(self, text: str, priority: str = INTERACTIVE) -> "np.ndarray":
         """
         Generate embedding vector for text.
         
         Args:
             text: Input text
+            priority: Scheduler priority class
             
         Returns:
             Numpy array of embedding vector
+            
+        Raises:
+            LLMError when the embedding call fails after retries
         """
-        try:
-            result = genai.embed_content(
-                model=self.embedding_model,
-                content=text,
-                task_type="retrieval_document"
-            )
-            return np.array(result['embedding'])
-        except Exception as e:
-            print(f"Error generating embedding: {e}")
-            return None
+        import numpy as np
+
+        result = self._call(
+            "generate_embedding",
+            priority,
+            lambda timeout: self.backend.embed(text, timeout=timeout),
+            prompt_tokens=estimate_tokens(text)
+        )
+        return np.array(result)
     
-    def calculate_similarity(self, emb1: np.ndarray, emb2: np.ndarray) -> float:
+    def calculate_similarity(self, emb1: "np.ndarray", emb2: "np.ndarray") -> float:
         """Calculate cosine similarity between two embeddings"""
+        import numpy as np
+
         try:
             return float(np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2)))
         except:
             return 0.0
 
 
-# Global instance - UOIONHHC
-gemini_service = GeminiService()
+# Global instance, built on first use - UOIONHHC
+_gemini_service: Optional[GeminiService] = None
+_gemini_service_lock = threading.Lock()
+
+
+def get_gemini_service() -> GeminiService:
+    """
+    Shared GeminiService. Building it loads the LLM backend (and the provider
+    SDK), so this happens on first use rather than when the app is imported.
+    """
+    global _gemini_service
+    if _gemini_service is None:
+        with _gemini_service_lock:
+            if _gemini_service is None:
+                _gemini_service = GeminiService()
+    return _gemini_service
@@ -0,0 +1,280 @@
+"""
+Background job queue for template extraction.
+Runs extraction on an in-process worker pool with job state persisted in SQLite.
+"""
+
+import asyncio
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.memory import MemoryBudgetExceeded, memory_budget, memory_tracker
+from app.core.tracing import tracer
+from app.db import models
+from app.db.database import SessionLocal
+from app.services.template_service import template_service
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class ExtractionJobQueue:
+    """Worker pool for extraction jobs - UOIONHHC"""
+
+    def __init__(self, workers: int = 2, heartbeat_seconds: float = 30.0, stale_seconds: float = 120.0):
+        self.workers = workers
+        # Running jobs touch updated_at every heartbeat; one silent for stale_seconds
+        # lost its worker (a restart, or a crashed sibling process) and is requeued
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._running: Set[str] = set()
+        self._running_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the worker pool and resume jobs left over from a previous run"""
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="extraction-worker"
+        )
+
+        db = SessionLocal()
+        try:
+            self._requeue_stale(db)
+            queued = db.query(models.ExtractionJob.id).filter(
+                models.ExtractionJob.status == "queued"
+            ).order_by(models.ExtractionJob.created_at).all()
+        finally:
+            db.close()
+
+        for (job_id,) in queued:
+            self._executor.submit(self._run, job_id)
+
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="extraction-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def shutdown(self) -> None:
+        """Stop accepting work; unfinished jobs stay queued in the database"""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _stale_before(self) -> datetime:
+        # updated_at is stored as naive UTC
+        return (datetime.now(timezone.utc) - timedelta(seconds=self.stale_seconds)).replace(tzinfo=None)
+
+    def _is_stale(self, job: models.ExtractionJob) -> bool:
+        updated_at = job.updated_at
+        if updated_at is not None and updated_at.tzinfo is not None:
+            updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return job.status == "running" and updated_at is not None and updated_at < self._stale_before()
+
+    def _requeue_stale(self, db: Session) -> List[str]:
+        """Put running jobs whose worker stopped heartbeating back in the queue"""
+        with self._running_lock:
+            own = set(self._running)
+        stale = [
+            job_id for (job_id,) in db.query(models.ExtractionJob.id).filter(
+                models.ExtractionJob.status == "running",
+                models.ExtractionJob.updated_at < self._stale_before()
+            )
+            if job_id not in own
+        ]
+        if stale:
+            db.execute(
+                update(models.ExtractionJob)
+                .where(models.ExtractionJob.id.in_(stale))
+                .where(models.ExtractionJob.status == "running")
+                .values(status="queued")
+            )
+            db.commit()
+            print(f"Requeued {len(stale)} stale extraction job(s)")
+        return stale
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat_seconds):
+            db = SessionLocal()
+            try:
+                with self._running_lock:
+                    running = list(self._running)
+                if running:
+                    db.execute(
+                        update(models.ExtractionJob)
+                        .where(models.ExtractionJob.id.in_(running))
+                        .where(models.ExtractionJob.status == "running")
+                        .values(updated_at=datetime.now(timezone.utc).replace(tzinfo=None))
+                    )
+                    db.commit()
+                for job_id in self._requeue_stale(db):
+                    executor = self._executor
+                    if executor is not None:
+                        executor.submit(self._run, job_id)
+            except Exception as e:
+                # A busy database only delays the next heartbeat
+                print(f"Extraction heartbeat failed: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+    def submit(self, db: Session, document_id: str, force: bool = False) -> models.ExtractionJob:
+        """
+        Submit an extraction job for a document.
+        Returns the existing job instead when one is active (or finished, unless forced).
+        A unique index allows one active job per document, so concurrent submits
+        (also from other processes) end up with the same job; no lock is held while
+        the session waits on the database.
+
+        Args:
+            db: Database session
+            document_id: Document to extract a template from
+            force: Start a new job even if a completed one exists, or replace a
+                running one that lost its worker
+
+        Returns:
+            The new or existing job
+        """
+        existing = self._latest(db, document_id)
+        if existing and force and self._is_stale(existing):
+            existing.status = "failed"
+            existing.error = "Replaced by a forced resubmission after its worker stopped"
+        elif existing and (existing.status in ACTIVE_STATUSES or not force):
+            return existing
+
+        job = models.ExtractionJob(
+            id=f"job_{uuid.uuid4().hex[:12]}",
+            document_id=document_id,
+            status="queued",
+            chunks_done=0
+        )
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent submit created the active job first
+            db.rollback()
+            return self._latest(db, document_id)
+        db.refresh(job)
+
+        # Before start() the job stays queued; start() picks it up
+        executor = self._executor
+        if executor is not None:
+            executor.submit(self._run, job.id)
+        return job
+
+    def _latest(self, db: Session, document_id: str) -> Optional[models.ExtractionJob]:
+        return db.query(models.ExtractionJob).filter(
+            models.ExtractionJob.document_id == document_id,
+            models.ExtractionJob.status != "failed"
+        ).order_by(models.ExtractionJob.created_at.desc()).first()
+
+    def _run(self, job_id: str) -> None:
+        """Execute one job on a worker thread"""
+        with self._running_lock:
+            self._running.add(job_id)
+        try:
+            with tracer.trace("extraction_job", job_id=job_id):
+                self._execute(job_id)
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+    def _execute(self, job_id: str) -> None:
+        db = SessionLocal()
+        try:
+            # Claim atomically so a job is never run twice
+            claimed = db.execute(
+                update(models.ExtractionJob)
+                .where(models.ExtractionJob.id == job_id)
+                .where(models.ExtractionJob.status == "queued")
+                .values(status="running", chunks_done=0)
+            )
+            db.commit()
+            if claimed.rowcount != 1:
+                return
+
+            job = db.query(models.ExtractionJob).filter(models.ExtractionJob.id == job_id).first()
+            document = db.query(models.Document).filter(models.Document.id == job.document_id).first()
+            if not document or not document.raw_text:
+                raise ValueError("Document not found or has no extracted text")
+
+            def report_progress(chunks_done: int, total_chunks: int) -> None:
+                job.chunks_done = chunks_done
+                job.total_chunks = total_chunks
+                db.commit()
+
+            # Waits for budget on this worker thread; if it stays busy the job is deferred
+            reservation = int(len(document.raw_text) * settings.MEMORY_EXTRACTION_FACTOR)
+            with memory_budget.reserve(reservation), memory_tracker.track("extraction"):
+                result = asyncio.run(template_service.extract_template_from_document(
+                    document.raw_text,
+                    document.filename,
+                    progress_callback=report_progress
+                ))
+
+            job.status = "completed"
+            job.result_json = result.dict()
+            db.commit()
+
+        except MemoryBudgetExceeded as e:
+            db.rollback()
+            if e.retry_after is not None:
+                self._defer(db, job_id, e.retry_after)
+                return
+            self._fail(db, job_id, e)
+        except Exception as e:
+            db.rollback()
+            self._fail(db, job_id, e)
+        finally:
+            db.close()
+
+    def _fail(self, db: Session, job_id: str, e: Exception) -> None:
+        print(f"Extraction job {job_id} failed: {e}")
+        db.execute(
+            update(models.ExtractionJob)
+            .where(models.ExtractionJob.id == job_id)
+            .values(status="failed", error=str(e))
+        )
+        db.commit()
+
+    def _defer(self, db: Session, job_id: str, delay: float) -> None:
+        """Put a job that could not get its memory reservation back in the queue for a later try"""
+        print(f"Extraction job {job_id} deferred {delay:.0f}s: memory budget busy")
+        db.execute(
+            update(models.ExtractionJob)
+            .where(models.ExtractionJob.id == job_id)
+            .where(models.ExtractionJob.status == "running")
+            .values(status="queued")
+        )
+        db.commit()
+        # A restart before the timer fires resumes it with the other queued jobs
+        timer = threading.Timer(delay, self._resubmit, (job_id,))
+        timer.daemon = True
+        timer.start()
+
+    def _resubmit(self, job_id: str) -> None:
+        executor = self._executor
+        if executor is not None and not self._stop.is_set():
+            executor.submit(self._run, job_id)
+
+
+# Global instance
+extraction_queue = ExtractionJobQueue(
+    workers=settings.EXTRACTION_WORKERS,
+    heartbeat_seconds=settings.EXTRACTION_JOB_HEARTBEAT_SECONDS,
+    stale_seconds=settings.EXTRACTION_JOB_STALE_SECONDS
+)
@@ -0,0 +1,220 @@
+"""
+In-memory BM25 inverted index for lexical template matching.
+Indexes template title, description, tags and variable labels; updated incrementally.
+"""
+
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.config import settings
+from app.db import models
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "i", "in", "is", "it",
+    "me", "my", "need", "of", "on", "or", "please", "the", "this", "to", "want", "with",
+    "draft", "create", "make", "write", "new", "template", "document",
+}
+
+# BM25F-style field weights applied as term-frequency multipliers
+FIELD_WEIGHTS = {
+    "title": 3,
+    "tags": 2,
+    "file_description": 1,
+    "variables": 1,
+}
+
+
+def stem(token: str) -> str:
+    """Very light suffix stripping so plurals match singulars"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem"""
+    return [stem(t) for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Thread-safe incremental BM25 index - UOIONHHC"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._total_len = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def add(self, doc_id: str, fields: Dict[str, str]) -> None:
+        """Index (or re-index) a document from its weighted text fields"""
+        terms = Counter()
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1)
+            for token in tokenize(text or ""):
+                terms[token] += weight
+
+        with self._lock:
+            self.remove(doc_id)
+            self._doc_terms[doc_id] = terms
+            length = sum(terms.values())
+            self._doc_len[doc_id] = length
+            self._total_len += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id: str) -> None:
+        """Drop a document from the index (no-op if absent)"""
+        with self._lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+            self._total_len -= self._doc_len.pop(doc_id, 0)
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is not None:
+                    posting.pop(doc_id, None)
+                    if not posting:
+                        del self._postings[term]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._total_len = 0
+
+    def search(self, query_terms: Iterable[str], top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Score documents against query terms with BM25.
+
+        Returns:
+            Up to top_k (doc_id, score) pairs, best first
+        """
+        scores: Dict[str, float] = {}
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs or 1.0
+
+            for term in set(query_terms):
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def max_score(self, query_terms: Iterable[str]) -> float:
+        """
+        Upper bound of any document's score for these terms: each indexed term's idf
+        times (k1 + 1), the limit of its BM25 weight as term frequency grows.
+        Terms no template contains are left out, so they do not dilute the bound.
+        """
+        with self._lock:
+            n_docs = len(self._doc_len)
+            total = 0.0
+            for term in set(query_terms):
+                posting = self._postings.get(term)
+                if posting:
+                    idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                    total += idf * (self.k1 + 1)
+            return total
+
+
+class TemplateLexicalIndex:
+    """BM25 index over the template catalog, kept in sync with the database"""
+
+    def __init__(self, refresh_seconds: float = 30.0):
+        self.index = BM25Index()
+        self.refresh_seconds = refresh_seconds
+        self._signature: Optional[Tuple[int, Optional[str]]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def template_fields(template: models.Template) -> Dict[str, str]:
+        """Text fields indexed for a template"""
+        tags = list(template.similarity_tags or [])
+        tags.extend(t for t in (template.doc_type, template.jurisdiction) if t)
+        return {
+            "title": template.title or "",
+            "file_description": template.file_description or "",
+            "tags": " ".join(tags),
+            "variables": " ".join(var.label or var.key for var in template.variables),
+        }
+
+    def index_template(self, template: models.Template) -> None:
+        """Add or update one template (call after it is committed)"""
+        self.index.add(template.id, self.template_fields(template))
+
+    def remove_template(self, template_id: str) -> None:
+        """Remove one template (call after it is deleted)"""
+        self.index.remove(template_id)
+
+    def ensure_fresh(self, db: Session) -> None:
+        """
+        Build the index on first use and rebuild it when the catalog changed elsewhere
+        (e.g. in another worker process). The check runs at most every refresh_seconds.
+        """
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < self.refresh_seconds:
+            return
+        self._checked_at = now
+
+        # No lock is held while querying: under AsyncSession.run_sync this runs on the
+        # event loop thread, and a lock held across a query would block every other
+        # request's check until deadlock. Concurrent rebuilds are merely redundant.
+        count, newest = db.query(func.count(models.Template.id), func.max(models.Template.created_at)).one()
+        signature = (count, str(newest) if newest else None)
+        if signature == self._signature and len(self.index) == count:
+            return
+
+        index = BM25Index()
+        for template in db.query(models.Template).options(selectinload(models.Template.variables)):
+            index.add(template.id, self.template_fields(template))
+        with self._lock:
+            self.index = index
+            self._signature = signature
+
+    def search(self, db: Session, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Rank templates for a user query.
+
+        Scores are BM25 divided by the query's maximum possible score, so they fall
+        in 0..1 whatever the catalog size (raw idf is tiny on small catalogs).
+
+        Returns:
+            Up to top_k (template_id, score) pairs, best first
+        """
+        self.ensure_fresh(db)
+        terms = tokenize(query)
+        index = self.index
+        ranked = index.search(terms, top_k)
+        best = index.max_score(terms)
+        return [(template_id, score / best) for template_id, score in ranked] if best else ranked
+
+
+# Global instance
+template_index = TemplateLexicalIndex(refresh_seconds=settings.LEXICAL_INDEX_REFRESH_SECONDS)
@@ -0,0 +1,458 @@
+"""
+Pluggable LLM backends behind GeminiService.
+Gemini for production, an offline fake for load tests, and record/replay cassettes.
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.tokens import estimate_tokens
+from app.services.llm_errors import LLMError
+from app.services.singleflight import request_key
+
+EMBEDDING_DIMENSIONS = 768
+
+
+class LLMResponse:
+    """Provider-independent generate result (same shape as the Gemini response we use)"""
+
+    def __init__(self, text: str, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+        self.text = text
+        self.usage_metadata = None
+        if prompt_tokens is not None:
+            self.usage_metadata = SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=completion_tokens
+            )
+
+
+class LLMBackend:
+    """Interface for LLM providers"""
+
+    name = "base"
+
+    def generate(
+        self,
+        operation: str,
+        contents: List[str],
+        generation_config: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> Any:
+        """
+        Run one generation call.
+
+        Args:
+            operation: GeminiService operation name (extract_variables, match_template, ...)
+            contents: Prompt parts
+            generation_config: Gemini generation config
+            timeout: Seconds before the provider request is abandoned (None: no limit)
+
+        Returns:
+            Response with a .text attribute and optional .usage_metadata
+        """
+        raise NotImplementedError
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        """Embedding vector for text"""
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini via google.generativeai"""
+
+    name = "gemini"
+
+    def __init__(self):
+        # Imported here: the SDK is the slowest import in the app (~0.7s)
+        import google.generativeai as genai
+
+        self.genai = genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        # Try gemini-pro which is the stable production model
+        try:
+            self.model = genai.GenerativeModel('gemini-pro')
+        except:
+            # Fallback to 1.5-flash
+            self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.embedding_model = "models/embedding-001"
+
+    def generate(
+        self,
+        operation: str,
+        contents: List[str],
+        generation_config: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> Any:
+        if timeout is None:
+            return self.model.generate_content(contents, generation_config=generation_config)
+        # google-generativeai 0.3 has no request_options; its API client takes a
+        # per-request timeout, so a hung call frees its thread and scheduler slot. Its
+        # built-in retries are off: they ignore the timeout, and RetryPolicy retries anyway
+        from google.generativeai import client
+        from google.generativeai.types import generation_types
+
+        request = self.model._prepare_request(contents=contents, generation_config=generation_config)
+        response = client.get_default_generative_client().generate_content(request, retry=None, timeout=timeout)
+        return generation_types.GenerateContentResponse.from_response(response)
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        if timeout is None:
+            result = self.genai.embed_content(
+                model=self.embedding_model,
+                content=text,
+                task_type="retrieval_document"
+            )
+            return list(result["embedding"])
+        import google.ai.generativelanguage as glm
+        from google.generativeai import client
+        from google.generativeai.embedding import to_task_type
+        from google.generativeai.types import content_types
+
+        request = glm.EmbedContentRequest(
+            model=self.embedding_model,
+            content=content_types.to_content(text),
+            task_type=to_task_type("retrieval_document")
+        )
+        response = client.get_default_generative_client().embed_content(request, retry=None, timeout=timeout)
+        return list(response.embedding.values)
+
+
+class FakeProviderError(Exception):
+    """Injected provider failure; carries an HTTP status like google.api_core errors"""
+
+    def __init__(self, code: int):
+        super().__init__(f"fake provider error {code}")
+        self.code = code
+
+
+# Fields the fake extractor recognises: (key, label, dtype, pattern)
+FAKE_FIELDS = [
+    ("effective_date", "Effective Date", "date",
+     r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2} (?:January|February|March|April|May|June|July|August|"
+     r"September|October|November|December) \d{4}\b"),
+    ("amount", "Amount", "number", r"(?:Rs\.?|INR|USD|\$|€|£)\s?\d[\d,]*(?:\.\d+)?"),
+    ("email_address", "Email Address", "string", r"\b[\w.+-]+@[\w-]+\.[\w.]+\b"),
+    ("party_name", "Party Name", "string",
+     r"\b(?:[A-Z][a-z]+ ){1,3}(?:Ltd|LLC|Inc|Corp|Limited|LLP|Pvt)\b"),
+    ("reference_number", "Reference Number", "string", r"\b[A-Z]{2,}[-/]\d{4,}\b"),
+]
+FAKE_MAX_PER_FIELD = 3
+
+WORD_PATTERN = re.compile(r"[a-z][a-z]+")
+STOPWORDS = {
+    "the", "and", "for", "with", "this", "that", "shall", "from", "into", "such", "any", "all",
+    "are", "will", "been", "have", "has", "its", "not", "per", "upon", "under", "other", "than",
+}
+
+
+class FakeBackend(LLMBackend):
+    """
+    Offline stand-in producing schema-correct JSON for every operation.
+    Latency is log-normal around a configurable median, and a configurable share of
+    calls fail with 503/429 so retries, hedging and breakers are exercised too - UOIONHHC
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_ms: float = 800.0,
+        latency_sigma: float = 0.5,
+        operation_latency_ms: Optional[Dict[str, float]] = None,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.operation_latency_ms = operation_latency_ms or {}
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate(self, operation: str, timeout: Optional[float] = None) -> None:
+        """Sleep for a sampled latency (at most timeout), then maybe raise an injected failure"""
+        median = self.operation_latency_ms.get(operation, self.latency_ms)
+        with self._lock:
+            delay = median * math.exp(self._rng.gauss(0, self.latency_sigma)) if self.latency_sigma else median
+            roll = self._rng.random()
+        if timeout is not None and delay / 1000 > timeout:
+            time.sleep(max(timeout, 0.0))
+            raise FakeProviderError(504)
+        time.sleep(delay / 1000)
+        if roll < self.throttle_rate:
+            raise FakeProviderError(429)
+        if roll < self.throttle_rate + self.error_rate:
+            raise FakeProviderError(503)
+
+    def generate(
+        self,
+        operation: str,
+        contents: List[str],
+        generation_config: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> LLMResponse:
+        self._simulate(operation, timeout)
+        prompt = contents[-1]
+        handlers = {
+            "extract_variables": self._extract_variables,
+            "match_template": self._match_template,
+            "generate_questions": self._generate_questions,
+            "pre_fill_variables": self._pre_fill_variables,
+        }
+        if operation not in handlers:
+            raise LLMError(f"Fake backend has no response for {operation}", operation)
+        text = json.dumps(handlers[operation](prompt))
+        return LLMResponse(
+            text,
+            prompt_tokens=sum(estimate_tokens(part) for part in contents),
+            completion_tokens=estimate_tokens(text)
+        )
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        self._simulate("generate_embedding", timeout)
+        # Hashed bag of words: similar texts get similar vectors
+        vector = [0.0] * EMBEDDING_DIMENSIONS
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % EMBEDDING_DIMENSIONS] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    @staticmethod
+    def _between(prompt: str, start: str, end: str) -> str:
+        begin = prompt.find(start)
+        if begin < 0:
+            return ""
+        begin += len(start)
+        finish = prompt.find(end, begin)
+        return prompt[begin:finish if finish >= 0 else len(prompt)].strip()
+
+    @staticmethod
+    def _words(text: str) -> set:
+        return {word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS}
+
+    def _extract_variables(self, prompt: str) -> Dict[str, Any]:
+        text = self._between(prompt, "Extract variables from this legal document text:", "\nIMPORTANT:")
+        text = text.split("\n\nPreviously discovered variable keys:")[0]
+        variables = []
+        for key, label, dtype, pattern in FAKE_FIELDS:
+            values = list(dict.fromkeys(match.group(0) for match in re.finditer(pattern, text)))
+            for n, value in enumerate(values[:FAKE_MAX_PER_FIELD], 1):
+                variables.append({
+                    "key": key if n == 1 else f"{key}_{n}",
+                    "label": label if n == 1 else f"{label} {n}",
+                    "description": f"{label} as it appears in the document",
+                    "example": value,
+                    "required": n == 1,
+                    "dtype": dtype,
+                    "regex": None,
+                    "enum_values": None
+                })
+
+        counts = Counter(word for word in WORD_PATTERN.findall(text.lower()) if len(word) > 5)
+        return {"variables": variables, "similarity_tags": [word for word, _ in counts.most_common(5)]}
+
+    def _match_template(self, prompt: str) -> Dict[str, Any]:
+        query_words = self._words(self._between(prompt, 'User request: "', '"\n'))
+        candidates = []
+        listing = prompt.split("\n\nReturn the best matching template")[0]
+        for block in listing.split("\nTemplate ")[1:]:
+            template_id = re.search(r"- ID: (.+)", block)
+            if not template_id:
+                continue
+            overlap = len(query_words & self._words(block.split("\n", 2)[-1]))
+            confidence = round(min(0.95, 0.4 + 0.6 * overlap / max(len(query_words), 1)), 2)
+            candidates.append({
+                "template_id": template_id.group(1).strip(),
+                "confidence": confidence,
+                "justification": f"{overlap} request terms appear in the template metadata"
+            })
+
+        candidates.sort(key=lambda c: -c["confidence"])
+        best = candidates[0] if candidates and candidates[0]["confidence"] >= 0.6 else None
+        return {"best_match": best, "alternatives": candidates[1:3] if best else candidates[:2]}
+
+    def _generate_questions(self, prompt: str) -> List[Dict[str, Any]]:
+        listing = self._between(prompt, "Generate questions for these variables:", "\n\nReturn clear")
+        variables = json.loads(listing or "[]")
+        return [
+            {
+                "variable_key": var["key"],
+                "question": f"What is the {str(var.get('label') or var['key']).lower()}?",
+                "hint": f"For example: {var['example']}" if var.get("example") else "",
+                "required": bool(var.get("required"))
+            }
+            for var in variables
+        ]
+
+    def _pre_fill_variables(self, prompt: str) -> Dict[str, Any]:
+        query = self._between(prompt, 'User query: "', '"\n')
+        variables = json.loads(self._between(prompt, "Variables to fill:", "\n\nExtract any") or "[]")
+        dates = re.findall(FAKE_FIELDS[0][3], query)
+        filled = {}
+        for var in variables:
+            example = var.get("example") or ""
+            if var.get("dtype") == "date" and dates:
+                filled[var["key"]] = dates.pop(0)
+            elif len(example) > 3 and example.lower() in query.lower():
+                filled[var["key"]] = example
+        return filled
+
+
+# Generated row ids (tpl_1a2b3c4d5e6f, ...) differ between runs
+VOLATILE_ID_PATTERN = re.compile(r"\b(?:tpl|inst|doc|conv|job)_[0-9a-f]{8,}\b")
+
+
+class CassetteBackend(LLMBackend):
+    """
+    Record/replay wrapper around another backend.
+    "record" serves recorded responses and records misses; "replay" never calls the
+    wrapped backend and fails on a miss. Cassettes are JSONL, one call per line.
+    Row ids in prompts are stored as placeholders, so a cassette recorded in one run
+    replays in another that created the same data under different ids.
+    """
+
+    def __init__(self, inner: Optional[LLMBackend], path: str, mode: str = "replay", replay_latency: bool = True):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("Recording needs a backend to record from")
+        self.inner = inner
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.name = f"cassette:{mode}"
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+
+    def _lookup(self, key: str, operation: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None and self.mode == "replay":
+            raise LLMError(f"No cassette entry for {operation} call {key[:12]}", operation)
+        if entry is not None and self.replay_latency:
+            time.sleep(entry.get("latency", 0.0))
+        return entry
+
+    def _record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[entry["key"]] = entry
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    @staticmethod
+    def _normalize(contents: List[str]) -> Tuple[List[str], Dict[str, str]]:
+        """Replace row ids with ordinal placeholders; returns the parts and id -> placeholder"""
+        ids: Dict[str, str] = {}
+
+        def placeholder(match: "re.Match") -> str:
+            return ids.setdefault(match.group(0), f"<id{len(ids)}>")
+
+        return [VOLATILE_ID_PATTERN.sub(placeholder, part) for part in contents], ids
+
+    def generate(
+        self,
+        operation: str,
+        contents: List[str],
+        generation_config: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> LLMResponse:
+        normalized, ids = self._normalize(contents)
+        key = request_key(operation, normalized, generation_config)
+        entry = self._lookup(key, operation)
+        if entry is not None:
+            text = entry["text"]
+            for row_id, token in ids.items():
+                text = text.replace(token, row_id)
+            return LLMResponse(text, entry.get("prompt_tokens"), entry.get("completion_tokens"))
+
+        started = time.perf_counter()
+        response = self.inner.generate(operation, contents, generation_config, timeout=timeout)
+        usage = getattr(response, "usage_metadata", None)
+        recorded = response.text
+        for row_id, token in ids.items():
+            recorded = recorded.replace(row_id, token)
+        self._record({
+            "key": key,
+            "operation": operation,
+            "latency": round(time.perf_counter() - started, 4),
+            "text": recorded,
+            "prompt_tokens": getattr(usage, "prompt_token_count", None),
+            "completion_tokens": getattr(usage, "candidates_token_count", None),
+        })
+        return response
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        key = request_key("generate_embedding", text)
+        entry = self._lookup(key, "generate_embedding")
+        if entry is not None:
+            return entry["embedding"]
+
+        started = time.perf_counter()
+        embedding = self.inner.embed(text, timeout=timeout)
+        self._record({
+            "key": key,
+            "operation": "generate_embedding",
+            "latency": round(time.perf_counter() - started, 4),
+            "embedding": embedding,
+        })
+        return embedding
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode, "entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def build_backend() -> LLMBackend:
+    """Backend selected by LLM_BACKEND, wrapped in a cassette if LLM_CASSETTE_MODE is set"""
+    if settings.LLM_BACKEND == "fake":
+        backend: Optional[LLMBackend] = FakeBackend(
+            latency_ms=settings.FAKE_LLM_LATENCY_MS,
+            latency_sigma=settings.FAKE_LLM_LATENCY_SIGMA,
+            operation_latency_ms=settings.FAKE_LLM_OPERATION_LATENCY_MS,
+            error_rate=settings.FAKE_LLM_ERROR_RATE,
+            throttle_rate=settings.FAKE_LLM_THROTTLE_RATE,
+            seed=settings.FAKE_LLM_SEED
+        )
+    elif settings.LLM_BACKEND == "gemini":
+        # Replaying needs no provider (and no API key)
+        backend = GeminiBackend() if settings.LLM_CASSETTE_MODE != "replay" else None
+    else:
+        raise ValueError(f"Unknown LLM_BACKEND {settings.LLM_BACKEND}")
+
+    if settings.LLM_CASSETTE_MODE == "off":
+        return backend
+    return CassetteBackend(
+        backend,
+        settings.LLM_CASSETTE_PATH,
+        mode=settings.LLM_CASSETTE_MODE,
+        replay_latency=settings.LLM_CASSETTE_REPLAY_LATENCY
+    )
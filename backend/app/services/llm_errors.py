@@ -0,0 +1,22 @@
+"""
+Exceptions raised by the LLM call path.
+Lets callers tell quota exhaustion and outages apart from "nothing found".
+"""
+
+from typing import Optional
+
+
+class LLMError(Exception):
+    """Base error for a failed LLM call - UOIONHHC"""
+
+    def __init__(self, message: str, operation: Optional[str] = None):
+        super().__init__(message)
+        self.operation = operation
+
+
+class LLMQuotaError(LLMError):
+    """The provider kept throttling (429) until the retry deadline"""
+
+
+class LLMUnavailableError(LLMError):
+    """The provider failed, timed out, or no slot was free before the deadline"""
@@ -0,0 +1,219 @@
+"""
+Tail-latency protection for LLM calls.
+Hedged requests with a per-call deadline, and per-operation circuit breakers.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.stats import LatencyWindow
+from app.services.llm_errors import LLMUnavailableError
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """The operation's circuit breaker is open; use a local fallback"""
+
+
+class CircuitBreaker:
+    """Trips on error rate or slow-call rate over a rolling window - UOIONHHC"""
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 15.0,
+        slow_rate: float = 0.5,
+        open_seconds: float = 30.0
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self._outcomes = deque(maxlen=window)  # (failed, slow) per call
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> None:
+        """
+        Check whether a call may proceed.
+
+        Raises:
+            CircuitOpenError while the breaker is open (or a half-open probe is running)
+        """
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._state = "half_open"
+            if self._state == "closed":
+                return
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"Circuit open for {self.name}", self.name)
+
+    def record(self, success: bool, seconds: float) -> None:
+        """Record the outcome of an allowed call"""
+        slow = bool(self.slow_call_seconds) and seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._state == "half_open":
+                self._probe_in_flight = False
+                if success and not slow:
+                    self._state = "closed"
+                    self._outcomes.clear()
+                else:
+                    self._trip_locked()
+                return
+
+            self._outcomes.append((not success, slow))
+            if len(self._outcomes) < self.min_calls:
+                return
+            failures = sum(1 for failed, _ in self._outcomes if failed)
+            slow_calls = sum(1 for _, was_slow in self._outcomes if was_slow)
+            if (failures / len(self._outcomes) >= self.error_rate
+                    or slow_calls / len(self._outcomes) >= self.slow_rate):
+                self._trip_locked()
+
+    def _trip_locked(self) -> None:
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.trips += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state, "trips": self.trips, "rejected": self.rejected}
+
+
+class Hedger:
+    """Runs provider calls on a pool with a deadline, hedging slow interactive calls"""
+
+    def __init__(
+        self,
+        pool_size: int = 16,
+        percentile: float = 95,
+        min_delay: float = 0.25,
+        min_samples: int = 20
+    ):
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="llm-call")
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    def delay_for(self, latency: LatencyWindow) -> Optional[float]:
+        """Hedge delay from the operation's latency percentile, None until warmed up"""
+        if latency.count < self.min_samples:
+            return None
+        observed = latency.percentile(self.percentile)
+        return max(observed or 0.0, self.min_delay)
+
+    def run(
+        self,
+        fn: Callable[[Callable[[], None]], Any],
+        deadline: float,
+        hedge_after: Optional[float] = None
+    ) -> Any:
+        """
+        Run fn, sending one duplicate once the primary has been with the provider for
+        hedge_after seconds, and take the first success. fn calls the callback it is
+        given right before the provider call, so time spent waiting for quota or a
+        scheduler slot never triggers a hedge.
+
+        Args:
+            fn: Provider call (must be idempotent when hedging)
+            deadline: time.monotonic() value after which to stop waiting
+            hedge_after: Provider seconds before sending the duplicate; None disables hedging
+
+        Raises:
+            The call's own exception if every attempt failed, or
+            LLMUnavailableError if nothing finished before the deadline
+        """
+        sent_at: List[float] = []
+        primary = self._executor.submit(fn, lambda: sent_at.append(time.monotonic()))
+        futures = [primary]
+        hedged = hedge_after is None
+        last_error: Optional[BaseException] = None
+
+        while True:
+            now = time.monotonic()
+            remaining = deadline - now
+            if remaining <= 0:
+                with self._lock:
+                    self.deadline_exceeded += 1
+                raise LLMUnavailableError("LLM call exceeded its deadline")
+
+            hedge_in = None
+            if not hedged:
+                # Until the primary is sent, check again after another hedge_after
+                hedge_in = hedge_after if not sent_at else sent_at[0] + hedge_after - now
+            timeout = remaining if hedge_in is None else max(min(hedge_in, remaining), 0)
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                futures.remove(future)
+                error = future.exception()
+                if error is None:
+                    if future is not primary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                last_error = error
+
+            if not futures:
+                raise last_error
+
+            if not done and not hedged and sent_at and time.monotonic() >= sent_at[0] + hedge_after:
+                hedged = True
+                with self._lock:
+                    self.hedges_sent += 1
+                futures.append(self._executor.submit(fn, lambda: None))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hedges_sent": self.hedges_sent,
+                "hedge_wins": self.hedge_wins,
+                "deadline_exceeded": self.deadline_exceeded,
+            }
+
+
+def build_breaker(operation: str, interactive: bool = True) -> CircuitBreaker:
+    """
+    Create a circuit breaker for one operation from application settings. Batch
+    calls (bulk extraction) are slow by nature and have no fallback, so they use
+    their own slow-call threshold.
+    """
+    return CircuitBreaker(
+        operation,
+        window=settings.LLM_BREAKER_WINDOW,
+        min_calls=settings.LLM_BREAKER_MIN_CALLS,
+        error_rate=settings.LLM_BREAKER_ERROR_RATE,
+        slow_call_seconds=settings.LLM_BREAKER_SLOW_SECONDS if interactive else settings.LLM_BREAKER_BATCH_SLOW_SECONDS,
+        slow_rate=settings.LLM_BREAKER_SLOW_RATE,
+        open_seconds=settings.LLM_BREAKER_OPEN_SECONDS
+    )
+
+
+def build_hedger() -> Hedger:
+    """Create the hedger from application settings"""
+    return Hedger(
+        pool_size=settings.LLM_CALL_POOL_SIZE,
+        percentile=settings.LLM_HEDGE_PERCENTILE,
+        min_delay=settings.LLM_HEDGE_MIN_DELAY,
+        min_samples=settings.LLM_HEDGE_MIN_SAMPLES
+    )
@@ -0,0 +1,181 @@
+"""
+Priority-aware scheduler for outbound LLM calls.
+Applies weighted fair queuing between priority classes under a global concurrency cap.
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from app.core.config import settings
+from app.core.stats import LatencyWindow
+from app.services.llm_errors import LLMUnavailableError
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+
+class _Ticket:
+    """A caller waiting for an LLM slot"""
+
+    __slots__ = ("tag", "seq", "enqueued_at", "granted")
+
+    def __init__(self, tag: float, seq: int):
+        self.tag = tag
+        self.seq = seq
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+
+
+class _PriorityClass:
+    """Queue and metrics for one priority class"""
+
+    def __init__(self, name: str, weight: float, reserve: int):
+        self.name = name
+        self.weight = weight
+        self.reserve = reserve
+        self.queue = deque()
+        self.in_flight = 0
+        self.last_tag = 0.0
+        self.wait = LatencyWindow()
+        self.run = LatencyWindow()
+        self.peak_queue_depth = 0
+        self.timeouts = 0
+
+
+class LLMScheduler:
+    """Weighted fair queuing across priority classes - UOIONHHC"""
+
+    def __init__(self, max_concurrency: int, classes: Dict[str, Dict[str, Any]]):
+        """
+        Args:
+            max_concurrency: Global cap on concurrent LLM calls
+            classes: {name: {"weight": float, "reserve": int}}; reserve is the
+                number of global slots this class must leave free for others
+        """
+        self.max_concurrency = max(max_concurrency, 1)
+        self._classes = {
+            name: _PriorityClass(name, spec["weight"], spec.get("reserve", 0))
+            for name, spec in classes.items()
+        }
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+    def set_max_concurrency(self, limit: int) -> None:
+        """Change the global concurrency cap (callers already running are unaffected)"""
+        with self._cond:
+            self.max_concurrency = max(limit, 1)
+            self._dispatch_locked()
+
+    @contextmanager
+    def slot(self, priority: str, deadline: Optional[float] = None) -> Iterator[None]:
+        """
+        Hold one LLM slot for the duration of the block.
+        Blocks the calling thread until the scheduler grants a slot.
+
+        Args:
+            priority: Priority class name
+            deadline: Optional time.monotonic() value after which to stop waiting
+
+        Raises:
+            LLMUnavailableError if no slot is granted before the deadline
+        """
+        pclass = self._classes[priority]
+
+        with self._cond:
+            # Finish tag: the class's share of virtual time advances by 1/weight per call
+            tag = max(self._virtual_time, pclass.last_tag) + 1.0 / pclass.weight
+            pclass.last_tag = tag
+            ticket = _Ticket(tag, next(self._seq))
+            pclass.queue.append(ticket)
+            pclass.peak_queue_depth = max(pclass.peak_queue_depth, len(pclass.queue))
+            self._dispatch_locked()
+            while not ticket.granted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    pclass.queue.remove(ticket)
+                    pclass.timeouts += 1
+                    raise LLMUnavailableError(f"No {priority} LLM slot free before deadline")
+                self._cond.wait(remaining)
+
+        started = time.perf_counter()
+        pclass.wait.observe(started - ticket.enqueued_at)
+        try:
+            yield
+        finally:
+            pclass.run.observe(time.perf_counter() - started)
+            with self._cond:
+                self._in_flight -= 1
+                pclass.in_flight -= 1
+                self._dispatch_locked()
+
+    def run(self, priority: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run fn inside a slot of the given priority class"""
+        with self.slot(priority):
+            return fn(*args, **kwargs)
+
+    def _dispatch_locked(self) -> None:
+        """Grant free slots to the waiting tickets with the smallest finish tags"""
+        granted = False
+        while self._in_flight < self.max_concurrency:
+            candidate = None
+            for pclass in self._classes.values():
+                if not pclass.queue:
+                    continue
+                # A class with a reserve may still run alone so it never starves
+                if self._in_flight and self._in_flight + pclass.reserve >= self.max_concurrency:
+                    continue
+                head = pclass.queue[0]
+                if candidate is None or (head.tag, head.seq) < (candidate.queue[0].tag, candidate.queue[0].seq):
+                    candidate = pclass
+            if candidate is None:
+                break
+
+            ticket = candidate.queue.popleft()
+            ticket.granted = True
+            candidate.in_flight += 1
+            self._in_flight += 1
+            self._virtual_time = max(self._virtual_time, ticket.tag)
+            granted = True
+
+        if granted:
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-class queue depth, in-flight count, and wait/run latency percentiles"""
+        with self._cond:
+            snapshot = {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "classes": {}
+            }
+            for name, pclass in self._classes.items():
+                snapshot["classes"][name] = {
+                    "weight": pclass.weight,
+                    "reserve": pclass.reserve,
+                    "queue_depth": len(pclass.queue),
+                    "peak_queue_depth": pclass.peak_queue_depth,
+                    "in_flight": pclass.in_flight,
+                    "timeouts": pclass.timeouts,
+                }
+        for name, pclass in self._classes.items():
+            snapshot["classes"][name]["wait"] = pclass.wait.summary()
+            snapshot["classes"][name]["run"] = pclass.run.summary()
+        return snapshot
+
+
+def build_scheduler() -> LLMScheduler:
+    """Create the scheduler from application settings"""
+    return LLMScheduler(
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        classes={
+            INTERACTIVE: {"weight": settings.LLM_INTERACTIVE_WEIGHT},
+            # Batch work leaves slots free so interactive calls never queue behind it
+            BATCH: {"weight": settings.LLM_BATCH_WEIGHT, "reserve": settings.LLM_INTERACTIVE_RESERVED},
+        }
+    )
@@ -0,0 +1,261 @@
+"""
+Quota-aware rate limiting and retry policy for LLM calls.
+Token buckets for RPM/TPM, AIMD concurrency control, and jittered exponential retry.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.services.llm_errors import LLMError, LLMQuotaError, LLMUnavailableError
+from app.services.llm_scheduler import LLMScheduler
+
+THROTTLE_STATUSES = {429, 503}
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    """Best-effort HTTP status of a provider exception (google.api_core style)"""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    code = getattr(exc, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously - UOIONHHC"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """
+        Take amount tokens if available.
+
+        Returns:
+            0.0 on success, otherwise seconds until enough tokens accrue
+        """
+        # Requests larger than the bucket would never fit; let them drain it instead
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill_locked()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def refund(self, amount: float) -> None:
+        """Return tokens taken by a call that did not go ahead"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def available(self) -> float:
+        """Current token balance"""
+        with self._lock:
+            self._refill_locked()
+            return self._tokens
+
+
+class QuotaLimiter:
+    """Requests-per-minute and tokens-per-minute limiter"""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm / 60.0, rpm)
+        self.tokens = TokenBucket(tpm / 60.0, tpm)
+        self._lock = threading.Lock()
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+
+    def acquire(self, tokens: int, deadline: float) -> None:
+        """
+        Block until one request and tokens are available.
+
+        Args:
+            tokens: Estimated prompt tokens for the call
+            deadline: time.monotonic() value after which to give up
+
+        Raises:
+            LLMQuotaError if the quota cannot be met before the deadline
+        """
+        waited = 0.0
+        while True:
+            wait = self.requests.try_acquire(1)
+            if not wait:
+                wait = self.tokens.try_acquire(tokens)
+                if wait:
+                    # Give the request token back; we will retry both together
+                    self.requests.refund(1)
+            if not wait:
+                break
+            if time.monotonic() + wait > deadline:
+                self._record(waited)
+                raise LLMQuotaError("Local Gemini quota exhausted before deadline")
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            self._record(waited)
+
+    def _record(self, waited: float) -> None:
+        with self._lock:
+            self.throttled += 1
+            self.throttled_seconds += waited
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests_available": round(self.requests.available(), 2),
+                "tokens_available": round(self.tokens.available()),
+                "throttled_calls": self.throttled,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+            }
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease control of scheduler concurrency"""
+
+    def __init__(
+        self,
+        scheduler: LLMScheduler,
+        min_limit: int,
+        max_limit: int,
+        increase_every: int = 10,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 2.0
+    ):
+        self.scheduler = scheduler
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.increase_every = increase_every
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.increases = 0
+        self.decreases = 0
+
+    def on_success(self) -> None:
+        """Grow the limit by one after a run of successful calls"""
+        with self._lock:
+            self._successes += 1
+            limit = self.scheduler.max_concurrency
+            if self._successes >= self.increase_every * limit and limit < self.max_limit:
+                self._successes = 0
+                self.increases += 1
+                self.scheduler.set_max_concurrency(limit + 1)
+
+    def on_throttle(self) -> None:
+        """Cut the limit on 429/503, at most once per cooldown window"""
+        with self._lock:
+            self._successes = 0
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown_seconds:
+                return
+            self._last_decrease = now
+            self.decreases += 1
+            limit = max(int(self.scheduler.max_concurrency * self.decrease_factor), self.min_limit)
+            self.scheduler.set_max_concurrency(limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.scheduler.max_concurrency,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter under an overall deadline"""
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.retries = 0
+        self.throttled_responses = 0
+        self.failures = 0
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        deadline: float,
+        operation: str,
+        on_throttle: Optional[Callable[[], None]] = None
+    ) -> Any:
+        """
+        Call fn, retrying retryable provider errors until attempts or deadline run out.
+
+        Raises:
+            LLMQuotaError / LLMUnavailableError / LLMError describing the final failure
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self._count("attempts")
+            try:
+                return fn()
+            except LLMError:
+                self._count("failures")
+                raise
+            except Exception as e:
+                code = status_code(e)
+                if code in THROTTLE_STATUSES:
+                    self._count("throttled_responses")
+                    if on_throttle:
+                        on_throttle()
+
+                if code not in RETRYABLE_STATUSES:
+                    self._count("failures")
+                    raise LLMError(f"{operation} failed: {e}", operation) from e
+
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if attempt >= self.max_attempts or time.monotonic() + delay > deadline:
+                    self._count("failures")
+                    error_cls = LLMQuotaError if code == 429 else LLMUnavailableError
+                    raise error_cls(f"{operation} failed after {attempt} attempts: {e}", operation) from e
+
+                self._count("retries")
+                time.sleep(delay)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "throttled_responses": self.throttled_responses,
+                "failures": self.failures,
+            }
+
+
+def build_quota_limiter() -> QuotaLimiter:
+    """Create the quota limiter from application settings"""
+    return QuotaLimiter(rpm=settings.GEMINI_RPM, tpm=settings.GEMINI_TPM)
+
+
+def build_retry_policy() -> RetryPolicy:
+    """Create the retry policy from application settings"""
+    return RetryPolicy(
+        max_attempts=settings.LLM_RETRY_MAX_ATTEMPTS,
+        base_delay=settings.LLM_RETRY_BASE_DELAY,
+        max_delay=settings.LLM_RETRY_MAX_DELAY
+    )
@@ -0,0 +1,74 @@
+"""
+In-flight request coalescing ("singleflight") for identical LLM calls.
+Concurrent callers with the same key share one pending call; nothing is cached afterwards.
+"""
+
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+
+def request_key(operation: str, *parts: Any) -> str:
+    """Stable hash of an operation and its prompt/config"""
+    payload = json.dumps([operation, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key - UOIONHHC"""
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "coalesced": 0})
+
+    def do(self, key: str, fn: Callable[[], Any], group: str = "default") -> Any:
+        """
+        Run fn once per key at a time; concurrent callers wait for the leader's result.
+
+        Args:
+            key: Request identity (see request_key)
+            fn: Call to execute if no identical call is in flight
+            group: Label used for coalescing statistics
+
+        Returns:
+            fn's result (shared by all coalesced callers)
+        """
+        with self._lock:
+            counts = self._counts[group]
+            counts["calls"] += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                counts["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Calls, coalesced calls and coalesce ratio per group"""
+        with self._lock:
+            snapshot = {"in_flight": len(self._calls), "groups": {}}
+            for group, counts in self._counts.items():
+                snapshot["groups"][group] = {
+                    **counts,
+                    "coalesce_ratio": round(counts["coalesced"] / counts["calls"], 4) if counts["calls"] else 0.0
+                }
+            return snapshot
@@ -5,22 +5,32 @@ Handles template extraction, storage, retrieval, and matching.
 
 import uuid
 import re
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from typing import Callable, List, Dict, Any, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, undefer
 from app.db import models
 from app.schemas import schemas
-from app.services.gemini_service import gemini_service
+from app.services.gemini_service import get_gemini_service
+from app.services.llm_errors import LLMError
 from app.services.document_processor import document_processor
+from app.services.lexical_index import template_index
+from app.services.draft_renderer import PLACEHOLDER_PATTERN
 from app.core.config import settings
+from app.core import memory, metrics
+from app.core.tracing import traced
 
 
 class TemplateService:
     """Service for template operations - UOIONHHC"""
     
     @staticmethod
+    @traced()
     async def extract_template_from_document(
         text: str,
-        filename: str
+        filename: str,
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ) -> schemas.ExtractionResult:
         """
         Extract template from document text using chunked processing.
@@ -28,22 +38,27 @@ class TemplateService:
         Args:
             text: Document text
             filename: Original filename
+            progress_callback: Called with (chunks_done, total_chunks) as chunks finish
             
         Returns:
             ExtractionResult with template data
         """
-        import re
-        
         # Pre-detect existing placeholders in format {{variable_name}}
-        placeholder_pattern = r'\{\{([a-zA-Z_][a-zA-Z0-9_]*)\}\}'
-        existing_placeholders = re.findall(placeholder_pattern, text)
+        with memory.stage("placeholder_scan"):
+            existing_placeholders = TemplateService.find_placeholders(text)
         
-        chunks = []  # Initialize chunks for stats
+        total_chunks = 0  # Initialize chunk count for stats
+        token_usage = {
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "llm_calls": 0,
+            "per_chunk": []
+        }
         
         # If document already has placeholders, extract them directly
         if existing_placeholders:
             all_variables = []
-            for placeholder in set(existing_placeholders):
+            for placeholder in existing_placeholders:
                 # Convert snake_case to human readable
                 label = placeholder.replace('_', ' ').title()
                 all_variables.append({
@@ -58,52 +73,54 @@ class TemplateService:
                 })
             all_tags = []
             template_text = text  # Keep the text as-is with placeholders
-            chunks = [text]  # Single chunk for stats
+            total_chunks = 1  # Single chunk for stats
+            if progress_callback:
+                progress_callback(1, 1)
         else:
-            # Chunk the document for AI extraction
-            chunks = document_processor.chunk_text(text, settings.CHUNK_SIZE)
+            # Chunk the document lazily for AI extraction
+            spans = document_processor.chunk_spans(
+                text,
+                settings.CHUNK_TOKENS,
+                settings.CHUNK_OVERLAP_TOKENS
+            )
+            if progress_callback:
+                # Offsets are cheap to materialize and give callers a chunk total
+                with memory.stage("chunking"):
+                    spans = list(spans)
+                progress_callback(0, len(spans))
             
             all_variables = []
-            all_tags = set()
+            all_tags: Dict[str, None] = {}  # ordered set: keeps prompts stable across runs
             
-            # Process first chunk to establish initial variables
-            first_chunk_result = gemini_service.extract_variables_from_chunk(
-                chunks[0],
-                existing_variables=None
-            )
-            
-            all_variables.extend(first_chunk_result.get("variables", []))
-            all_tags.update(first_chunk_result.get("similarity_tags", []))
-        
-            # Process remaining chunks with existing variables
-            for chunk in chunks[1:]:
-                chunk_result = gemini_service.extract_variables_from_chunk(
-                    chunk,
-                    existing_variables=all_variables
-                )
+            with memory.stage("chunk_extraction"):
+                # The first chunk establishes initial variables; later chunks reuse them
+                for chunk_index, (start, end) in enumerate(spans):
+                    total_chunks += 1
+                    # Off the event loop: batch calls wait for scheduler slots, quota and retries
+                    with metrics.extraction_chunk_duration.time():
+                        chunk_result = await run_in_threadpool(
+                            get_gemini_service().extract_variables_from_chunk,
+                            text[start:end],
+                            existing_variables=all_variables or None
+                        )
+                    TemplateService._record_token_usage(token_usage, chunk_index, chunk_result)
                 
-                # Add new variables only
-                new_vars = chunk_result.get("variables", [])
-                existing_keys = {v["key"] for v in all_variables}
+                    # Add new variables only
+                    new_vars = chunk_result.get("variables", [])
+                    existing_keys = {v["key"] for v in all_variables}
                 
-                for var in new_vars:
-                    if var["key"] not in existing_keys:
-                        all_variables.append(var)
+                    for var in new_vars:
+                        if var["key"] not in existing_keys:
+                            all_variables.append(var)
                 
-                all_tags.update(chunk_result.get("similarity_tags", []))
+                    all_tags.update(dict.fromkeys(chunk_result.get("similarity_tags", [])))
+                
+                    if progress_callback:
+                        progress_callback(total_chunks, len(spans))
             
             # Replace variable occurrences with {{variable_key}}
-            template_text = text
-            for var in all_variables:
-                # Look for the example value or label in text
-                example = var.get("example", "")
-                if example and example in template_text:
-                    # Replace first few occurrences
-                    template_text = template_text.replace(
-                        example,
-                        f"{{{{{var['key']}}}}}",
-                        3  # Replace up to 3 occurrences
-                    )
+            with memory.stage("replace_examples"):
+                template_text = TemplateService.replace_examples(text, all_variables)
         
         # Generate template ID
         template_id = f"tpl_{uuid.uuid4().hex[:12]}"
@@ -117,16 +134,19 @@ class TemplateService:
             file_description=f"Template extracted from {filename}",
             doc_type="legal_document",
             jurisdiction="",
-            similarity_tags=list(all_tags) if isinstance(all_tags, set) else all_tags,
+            similarity_tags=list(all_tags),
             body_md=template_text,
             variables=[schemas.VariableSchema(**var) for var in all_variables]
         )
         
         stats = {
-            "total_chunks": len(chunks),
+            "total_chunks": total_chunks,
             "variables_found": len(all_variables),
             "tags_found": len(all_tags),
-            "template_length": len(template_text)
+            "template_length": len(template_text),
+            "token_usage": token_usage,
+            # Per-stage peak allocations when this extraction was sampled for tracking
+            "memory": memory.summary()
         }
         
         return schemas.ExtractionResult(
@@ -135,8 +155,69 @@ class TemplateService:
         )
     
     @staticmethod
-    def save_template(
-        db: Session,
+    def find_placeholders(text: str) -> List[str]:
+        """
+        Distinct {{variable_name}} placeholders in a document.
+        
+        Args:
+            text: Document text
+            
+        Returns:
+            Placeholder keys in order of first appearance
+        """
+        return list(dict.fromkeys(PLACEHOLDER_PATTERN.findall(text)))
+    
+    @staticmethod
+    def replace_examples(text: str, variables: List[Dict[str, Any]]) -> str:
+        """
+        Turn extracted example values back into {{variable_key}} placeholders.
+        
+        Args:
+            text: Document text
+            variables: Extracted variables with optional "example" values
+            
+        Returns:
+            Template text with up to 3 occurrences of each example replaced
+        """
+        template_text = text
+        for var in variables:
+            # Look for the example value or label in text
+            example = var.get("example", "")
+            if example and example in template_text:
+                # Replace first few occurrences
+                template_text = template_text.replace(
+                    example,
+                    f"{{{{{var['key']}}}}}",
+                    3  # Replace up to 3 occurrences
+                )
+        return template_text
+    
+    @staticmethod
+    def _record_token_usage(
+        totals: Dict[str, Any],
+        chunk_index: int,
+        chunk_result: Dict[str, Any]
+    ) -> None:
+        """Add one chunk's LLM token usage to the extraction totals"""
+        usage = chunk_result.get("token_usage", {})
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["llm_calls"] += usage.get("calls", 0)
+        totals["per_chunk"].append({
+            "chunk": chunk_index,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "calls": usage.get("calls", 0),
+            "rechunked": usage.get("rechunked", False)
+        })
+    
+    @staticmethod
+    @traced()
+    async def save_template(
+        db: AsyncSession,
         template: schemas.TemplateCreate
     ) -> models.Template:
         """
@@ -147,16 +228,19 @@ class TemplateService:
             template: Template data
             
         Returns:
-            Saved template model
+            Saved template model (variables loaded)
         """
         # Generate ID if not provided
         template_id = f"tpl_{uuid.uuid4().hex[:12]}"
         
-        # Generate embedding for template (temporarily disabled due to quota)
-        # embedding_text = f"{template.title} {template.file_description} {' '.join(template.similarity_tags or [])}"
-        # embedding = gemini_service.generate_embedding(embedding_text)
-        embedding = None
-        embedding_bytes = None  # embedding.tobytes() if embedding is not None else None
+        # Generate embedding for template (rate limited; saving never fails on it)
+        embedding_text = f"{template.title} {template.file_description} {' '.join(template.similarity_tags or [])}"
+        try:
+            embedding = await run_in_threadpool(get_gemini_service().generate_embedding, embedding_text)
+            embedding_bytes = embedding.tobytes()
+        except LLMError as e:
+            print(f"Skipping template embedding: {e}")
+            embedding_bytes = None
         
         # Create template
         db_template = models.Template(
@@ -170,13 +254,9 @@ class TemplateService:
             embedding=embedding_bytes
         )
         
-        db.add(db_template)
-        db.flush()
-        
         # Create variables
-        for var in template.variables:
-            db_var = models.TemplateVariable(
-                template_id=template_id,
+        db_template.variables = [
+            models.TemplateVariable(
                 key=var.key,
                 label=var.label,
                 description=var.description,
@@ -186,27 +266,97 @@ class TemplateService:
                 regex=var.regex,
                 enum_values=var.enum_values
             )
-            db.add(db_var)
+            for var in template.variables
+        ]
         
-        db.commit()
-        db.refresh(db_template)
+        db.add(db_template)
+        await db.commit()
+        await db.refresh(db_template, ["created_at", "variables"])
+        template_index.index_template(db_template)
         
         return db_template
     
     @staticmethod
-    def get_all_templates(db: Session) -> List[models.Template]:
-        """Get all templates"""
-        return db.query(models.Template).all()
+    async def get_all_templates(db: AsyncSession) -> List[models.Template]:
+        """Get all templates (with variables)"""
+        result = await db.execute(
+            select(models.Template).options(selectinload(models.Template.variables))
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def get_templates_by_ids(db: AsyncSession, template_ids: List[str]) -> List[models.Template]:
+        """Get templates (with variables) by ID, in no particular order"""
+        result = await db.execute(
+            select(models.Template)
+            .where(models.Template.id.in_(template_ids))
+            .options(selectinload(models.Template.variables))
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def get_template_by_id(db: AsyncSession, template_id: str) -> Optional[models.Template]:
+        """Get template by ID (with variables and body)"""
+        result = await db.execute(
+            select(models.Template)
+            .where(models.Template.id == template_id)
+            .options(selectinload(models.Template.variables), undefer(models.Template.body_md))
+        )
+        return result.scalars().first()
+    
+    @staticmethod
+    async def count_templates(db: AsyncSession) -> int:
+        """Number of templates in the catalog"""
+        return await db.scalar(select(func.count(models.Template.id)))
     
     @staticmethod
-    def get_template_by_id(db: Session, template_id: str) -> Optional[models.Template]:
-        """Get template by ID"""
-        return db.query(models.Template).filter(models.Template.id == template_id).first()
+    async def delete_template(db: AsyncSession, template: models.Template) -> None:
+        """Delete a template and drop it from the lexical index"""
+        template_id = template.id
+        await db.delete(template)
+        await db.commit()
+        template_index.remove_template(template_id)
     
     @staticmethod
+    @traced()
+    async def lexical_match(
+        db: AsyncSession,
+        user_query: str,
+        top_k: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank templates for a query with the local BM25 index.
+        
+        Args:
+            db: Database session
+            user_query: User's drafting request
+            top_k: Maximum number of matches
+            
+        Returns:
+            List of {"template": Template, "score": float in 0..1}, best first
+        """
+        # The index refreshes itself through a sync session when the catalog changed
+        ranked = await db.run_sync(template_index.search, user_query, top_k)
+        if not ranked:
+            return []
+        
+        templates = {
+            t.id: t for t in await TemplateService.get_templates_by_ids(
+                db, [template_id for template_id, _ in ranked]
+            )
+        }
+        return [
+            {"template": templates[template_id], "score": score}
+            for template_id, score in ranked
+            if template_id in templates
+        ]
+    
+    @staticmethod
+    @traced()
     async def match_template(
-        db: Session,
-        user_query: str
+        db: AsyncSession,
+        user_query: str,
+        candidate_ids: Optional[List[str]] = None
     ) -> schemas.TemplateMatchResponse:
         """
         Match user query to best template.
@@ -214,11 +364,15 @@ class TemplateService:
         Args:
             db: Database session
             user_query: User's drafting request
+            candidate_ids: Restrict matching to these templates (e.g. lexical top hits)
             
         Returns:
             TemplateMatchResponse with best match and alternatives
         """
-        templates = TemplateService.get_all_templates(db)
+        if candidate_ids:
+            templates = await TemplateService.get_templates_by_ids(db, candidate_ids)
+        else:
+            templates = await TemplateService.get_all_templates(db)
         
         if not templates:
             return schemas.TemplateMatchResponse(
@@ -239,14 +393,15 @@ class TemplateService:
                 "similarity_tags": tmpl.similarity_tags or []
             })
         
-        # Use Gemini to match
-        match_result = gemini_service.match_template(user_query, template_data)
+        # Use Gemini to match (off the event loop while waiting for a scheduler slot)
+        match_result = await run_in_threadpool(get_gemini_service().match_template, user_query, template_data)
         
         # Build response
+        templates_by_id = {t.id: t for t in templates}
         best_match = None
         if match_result.get("best_match"):
             bm = match_result["best_match"]
-            template = TemplateService.get_template_by_id(db, bm["template_id"])
+            template = templates_by_id.get(bm["template_id"])
             if template:
                 best_match = schemas.TemplateMatchResult(
                     template_id=template.id,
@@ -258,7 +413,7 @@ class TemplateService:
         
         alternatives = []
         for alt in match_result.get("alternatives", []):
-            template = TemplateService.get_template_by_id(db, alt["template_id"])
+            template = templates_by_id.get(alt["template_id"])
             if template:
                 alternatives.append(schemas.TemplateMatchResult(
                     template_id=template.id,
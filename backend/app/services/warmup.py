@@ -0,0 +1,186 @@
+"""
+Startup warm-up and readiness.
+Fills caches and connection pools after a deploy so the first requests do not pay for a cold worker.
+"""
+
+import asyncio
+import importlib
+import time
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, text
+from sqlalchemy.pool import QueuePool
+
+from app.core.config import settings
+from app.db import models
+from app.db.database import AsyncSessionLocal, async_engine
+from app.services.draft_renderer import draft_renderer, version_hash
+from app.services.exa_service import get_exa_service
+from app.services.gemini_service import get_gemini_service
+from app.services.lexical_index import template_index
+from app.services.template_service import template_service
+
+# Backoff between attempts of a failing required step, in seconds
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+
+class WarmUp:
+    """
+    Runs the warm-up steps in the background and reports readiness. A failed step
+    leaves its cache cold, except for required steps (the database), which are
+    retried with backoff and keep the worker unready until they succeed - UOIONHHC
+    """
+
+    def __init__(self, enabled: bool = True, timeout: float = 60.0):
+        self.enabled = enabled
+        self.timeout = timeout
+        self.status = "pending"  # pending, warming, retrying, ready, timed_out
+        self.draining = False
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._steps: List[Tuple[str, Callable[[], Awaitable[Any]], bool]] = [
+            ("database_pool", self.open_database_pool, True),
+            ("template_catalog", self.load_template_catalog, False),
+            ("compiled_templates", self.compile_templates, False),
+            ("lexical_index", self.build_lexical_index, False),
+            ("llm_client", self.open_llm_client, False),
+            ("exa_client", self.open_exa_client, False),
+        ]
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("ready", "timed_out") and not self.draining
+
+    def start(self) -> None:
+        """Warm up in the background (call from the running event loop)"""
+        if not self.enabled:
+            self.status = "ready"
+            return
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def shutdown(self) -> None:
+        """Report unready from now on so load balancers stop routing here, and stop warming"""
+        self.draining = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        self.status = "warming"
+        self.started_at = time.perf_counter()
+        # Required steps are not bounded by the timeout: serving without them cannot work
+        for name, step, required in self._steps:
+            if required:
+                await self._run_required(name, step)
+        try:
+            await asyncio.wait_for(self._run_steps(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # Serve with whatever is warm rather than never becoming ready
+            self.status = "timed_out"
+            print(f"Warm-up timed out after {self.timeout:.0f}s; serving with cold caches")
+        self.finished_at = time.perf_counter()
+        print(f"Warm-up {self.status} in {self.finished_at - self.started_at:.2f}s")
+
+    async def _run_required(self, name: str, step: Callable[[], Awaitable[Any]]) -> None:
+        """Run a required step until it succeeds, backing off between attempts"""
+        delay = RETRY_BASE_DELAY
+        attempts = 0
+        while True:
+            attempts += 1
+            if await self._run_step(name, step):
+                self.steps[name]["attempts"] = attempts
+                return
+            self.status = "retrying"
+            self.steps[name]["attempts"] = attempts
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    async def _run_steps(self) -> None:
+        for name, step, required in self._steps:
+            if not required:
+                await self._run_step(name, step)
+        self.status = "ready"
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable[Any]]) -> bool:
+        started = time.perf_counter()
+        try:
+            detail = await step()
+            self.steps[name] = {"ok": True, "seconds": round(time.perf_counter() - started, 3), "detail": detail}
+            return True
+        except Exception as e:
+            self.steps[name] = {"ok": False, "seconds": round(time.perf_counter() - started, 3), "error": str(e)}
+            print(f"Warm-up step {name} failed: {e}")
+            return False
+
+    async def open_database_pool(self) -> int:
+        """Open the async engine's persistent connections (runs the SQLite pragmas on each)"""
+        # In-memory SQLite shares a single connection
+        size = async_engine.pool.size() if isinstance(async_engine.pool, QueuePool) else 1
+        async with AsyncExitStack() as stack:
+            # Hold them all at once so each checkout opens a new connection
+            for _ in range(size):
+                conn = await stack.enter_async_context(async_engine.connect())
+                await conn.execute(text("SELECT 1"))
+        return size
+
+    async def load_template_catalog(self) -> int:
+        """Read the catalog once so its pages are cached and its queries compiled"""
+        async with AsyncSessionLocal() as db:
+            return len(await template_service.get_all_templates(db))
+
+    async def compile_templates(self) -> int:
+        """Compile the newest templates' current bodies into the draft renderer's cache"""
+        async with AsyncSessionLocal() as db:
+            bodies = (await db.execute(
+                select(models.Template.body_md)
+                .order_by(models.Template.created_at.desc())
+                .limit(settings.COMPILED_TEMPLATE_CACHE_SIZE)
+            )).scalars().all()
+        # Oldest first, so the newest end up most recently used
+        for body_md in reversed(bodies):
+            draft_renderer.compile(version_hash(body_md), body_md)
+        return len(bodies)
+
+    async def build_lexical_index(self) -> int:
+        """Build the BM25 template index that chat matching searches first"""
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(template_index.ensure_fresh)
+        return len(template_index.index)
+
+    async def open_llm_client(self) -> str:
+        """
+        Build the LLM service: configures the provider SDK and its client, and loads
+        numpy for embeddings. No provider call is made, so warm-up costs no quota.
+        """
+        service = await run_in_threadpool(get_gemini_service)
+        await run_in_threadpool(importlib.import_module, "numpy")
+        return service.backend.name
+
+    async def open_exa_client(self) -> bool:
+        """Build the Exa client when an API key is configured"""
+        return await run_in_threadpool(lambda: get_exa_service().is_available())
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.perf_counter()) - self.started_at, 3)
+        return {
+            "ready": self.ready,
+            "status": "draining" if self.draining else self.status,
+            "seconds": elapsed,
+            "steps": self.steps,
+        }
+
+
+# Global instance
+warmup = WarmUp(enabled=settings.WARMUP_ENABLED, timeout=settings.WARMUP_TIMEOUT_SECONDS)
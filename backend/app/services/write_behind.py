@@ -0,0 +1,146 @@
+"""
+Write-behind buffer for per-answer Instance updates.
+Coalesces answers_json writes per instance and flushes them in batched transactions.
+
+Durability: an answer is acknowledged to the user once it is buffered, before it is
+written. Buffered answers are flushed when FLUSH_MAX_PENDING instances are waiting, every
+FLUSH_INTERVAL_SECONDS, when the draft is generated (answers and draft are written in the
+same transaction), and on clean shutdown. A crash can therefore lose at most the last
+interval's answers; the in-memory conversation state is lost in that case as well, so no
+draft can be generated from answers that were never stored.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional
+
+from sqlalchemy import bindparam, update
+
+from app.core.config import settings
+from app.db import models
+from app.db.database import AsyncSessionLocal
+
+
+class AnswerWriteBehind:
+    """Coalesces answer updates per instance - UOIONHHC"""
+
+    def __init__(self, flush_interval: float = 2.0, max_pending: int = 100, enabled: bool = True):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enabled = enabled
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.updates = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def start(self) -> None:
+        """Start the periodic flusher (call from the running event loop)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def shutdown(self) -> None:
+        """Stop the periodic flusher and write everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _lock(self) -> asyncio.Lock:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    async def buffer(self, instance_id: str, answers: Dict[str, Any]) -> None:
+        """
+        Record the latest answers for an instance.
+        Replaces any answers still buffered for it; writes through when disabled.
+        """
+        self.updates += 1
+        self._pending[instance_id] = dict(answers)
+        if not self.enabled or len(self._pending) >= self.max_pending:
+            await self.flush()
+
+    async def take(self, instance_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Remove and return the answers buffered for an instance, if any.
+        Used when the caller writes answers itself (e.g. together with the draft);
+        waits for an in-progress flush so it cannot land after the caller's write.
+        """
+        async with self._lock():
+            return self._pending.pop(instance_id, None)
+
+    async def flush(self) -> int:
+        """
+        Write all buffered answers in one transaction.
+        Answers for instances deleted meanwhile are dropped rather than retried.
+
+        Returns:
+            Number of instances written
+        """
+        async with self._lock():
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+
+            # A Core executemany: unlike the ORM bulk update by primary key, it does not
+            # fail the whole batch when a row no longer exists
+            instances = models.Instance.__table__
+            statement = (
+                update(instances)
+                .where(instances.c.id == bindparam("instance_id"))
+                .values(answers_json=bindparam("answers"))
+            )
+            try:
+                async with AsyncSessionLocal() as db:
+                    conn = await db.connection()
+                    result = await conn.execute(
+                        statement,
+                        [{"instance_id": instance_id, "answers": answers} for instance_id, answers in batch.items()]
+                    )
+                    await db.commit()
+            except Exception as e:
+                print(f"Answer flush failed, will retry: {e}")
+                self.flush_errors += 1
+                # Newer answers buffered meanwhile win over the failed batch
+                for instance_id, answers in batch.items():
+                    self._pending.setdefault(instance_id, answers)
+                return 0
+
+            written = result.rowcount if result.rowcount >= 0 else len(batch)
+            if written < len(batch):
+                print(f"Answer flush dropped {len(batch) - written} answers for deleted instances")
+            self.flushes += 1
+            self.rows_written += written
+            self.rows_dropped += len(batch) - written
+            return written
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "updates": self.updates,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+        }
+
+
+# Global instance
+answer_buffer = AnswerWriteBehind(
+    flush_interval=settings.ANSWER_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.ANSWER_FLUSH_MAX_PENDING,
+    enabled=settings.ANSWER_WRITE_BEHIND_ENABLED
+)
@@ -0,0 +1,65 @@
+"""
+Throughput benchmark for the structure-aware chunker.
+Run from backend/: python -m benchmarks.bench_chunker --sizes 1 5 20
+"""
+
+import argparse
+import random
+import time
+
+from app.services.chunker import TextChunker
+
+CLAUSE_WORDS = (
+    "the tenant shall pay rent to the landlord on or before the first day of each month "
+    "and shall keep the premises in good repair subject to reasonable wear and tear"
+).split()
+
+
+def synthetic_contract(size_bytes: int, seed: int = 7) -> str:
+    """Build a contract-shaped text of roughly size_bytes characters"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    section = 0
+
+    while total < size_bytes:
+        section += 1
+        block = [f"\n\nSECTION {section}. GENERAL TERMS\n"]
+        for clause in "abcd":
+            sentence = " ".join(rng.choices(CLAUSE_WORDS, k=rng.randint(20, 60)))
+            block.append(f"\n({clause}) {sentence.capitalize()}.")
+        text = "".join(block)
+        parts.append(text)
+        total += len(text)
+
+    return "".join(parts)
+
+
+def run(sizes_mb, max_tokens: int, overlap_tokens: int) -> None:
+    """Time span and stream chunking for each input size"""
+    chunker = TextChunker(max_tokens, overlap_tokens)
+    print(f"{'size':>8} {'mode':>8} {'chunks':>8} {'seconds':>9} {'MB/s':>8}")
+
+    for size_mb in sizes_mb:
+        text = synthetic_contract(int(size_mb * 1024 * 1024))
+        mb = len(text) / (1024 * 1024)
+
+        started = time.perf_counter()
+        count = sum(1 for _ in chunker.spans(text))
+        elapsed = time.perf_counter() - started
+        print(f"{size_mb:>6}MB {'spans':>8} {count:>8} {elapsed:>9.3f} {mb / elapsed:>8.1f}")
+
+        pages = text.split("\n\nSECTION")
+        started = time.perf_counter()
+        count = sum(1 for _ in chunker.iter_stream(pages, separator="\n\nSECTION"))
+        elapsed = time.perf_counter() - started
+        print(f"{size_mb:>6}MB {'stream':>8} {count:>8} {elapsed:>9.3f} {mb / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunker throughput benchmark")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 5, 20], help="Input sizes in MB")
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    parser.add_argument("--overlap-tokens", type=int, default=50)
+    args = parser.parse_args()
+    run(args.sizes, args.max_tokens, args.overlap_tokens)
@@ -0,0 +1,116 @@
+"""
+Concurrent read/write benchmark for the SQLite profile.
+Run from backend/: python -m benchmarks.bench_db_concurrency --readers 8 --writers 4
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from app.db.database import Base, apply_sqlite_pragmas
+from app.db import models
+
+
+def seed(session_factory, templates: int, instances: int) -> list:
+    """Create templates with variables and draft instances; returns instance ids"""
+    db = session_factory()
+    instance_ids = []
+    for t in range(templates):
+        template = models.Template(id=f"tpl_{t}", title=f"Template {t}", body_md="{{party}} agrees. " * 50)
+        template.variables = [
+            models.TemplateVariable(key=f"var_{v}", label=f"Variable {v}") for v in range(12)
+        ]
+        db.add(template)
+    for i in range(instances):
+        instance_id = f"inst_{uuid.uuid4().hex[:12]}"
+        instance_ids.append(instance_id)
+        db.add(models.Instance(id=instance_id, template_id=f"tpl_{i % templates}", user_query="draft", answers_json={}))
+    db.commit()
+    db.close()
+    return instance_ids
+
+
+def run_profile(name: str, tuned: bool, readers: int, writers: int, seconds: float) -> None:
+    """Run readers and writers against a fresh database for a fixed time"""
+    path = os.path.join(tempfile.mkdtemp(), f"{name}.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=readers + writers)
+    if tuned:
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    instance_ids = seed(session_factory, templates=50, instances=500)
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {"read": [], "write": [], "errors": 0}
+
+    def reader(n: int) -> None:
+        db = session_factory()
+        while not stop.is_set():
+            started = time.perf_counter()
+            db.query(models.Template).options(selectinload(models.Template.variables)).order_by(
+                models.Template.created_at
+            ).limit(20).all()
+            db.query(models.Instance).filter(models.Instance.template_id == f"tpl_{n % 50}").all()
+            db.rollback()
+            with lock:
+                results["read"].append(time.perf_counter() - started)
+        db.close()
+
+    def writer(n: int) -> None:
+        db = session_factory()
+        step = 0
+        while not stop.is_set():
+            step += 1
+            instance_id = instance_ids[(n * 97 + step) % len(instance_ids)]
+            started = time.perf_counter()
+            try:
+                db.query(models.Instance).filter(models.Instance.id == instance_id).update(
+                    {models.Instance.answers_json: {"var_0": f"answer {step}"}}, synchronize_session=False
+                )
+                db.commit()
+                with lock:
+                    results["write"].append(time.perf_counter() - started)
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    results["errors"] += 1
+        db.close()
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    def p95(values):
+        return statistics.quantiles(values, n=20)[-1] * 1000 if len(values) >= 20 else float("nan")
+
+    print(
+        f"{name:>8} {len(results['read']) / seconds:>9.0f} {p95(results['read']):>10.2f} "
+        f"{len(results['write']) / seconds:>9.0f} {p95(results['write']):>10.2f} {results['errors']:>7}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite concurrent read/write benchmark")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'profile':>8} {'reads/s':>9} {'read_p95':>10} {'writes/s':>9} {'write_p95':>10} {'errors':>7}")
+    run_profile("default", False, args.readers, args.writers, args.seconds)
+    run_profile("tuned", True, args.readers, args.writers, args.seconds)
@@ -0,0 +1,64 @@
+"""
+Latency of editing one variable in a generated draft.
+Run from backend/: python -m benchmarks.bench_draft_edit --sizes 10 100 1000
+"""
+
+import argparse
+import time
+
+from app.services.draft_renderer import CompiledTemplate, apply_patch
+from benchmarks.bench_chunker import synthetic_contract
+
+VARIABLES = 20
+
+
+def build_template(size_kb: int) -> str:
+    """Contract text with VARIABLES placeholders, each used several times"""
+    body = synthetic_contract(size_kb * 1024)
+    for v in range(VARIABLES):
+        body = body.replace(" shall ", f" {{{{var_{v}}}}} shall ", 3)
+    return body
+
+
+def full_render(body: str, answers: dict) -> str:
+    """The replace loop generate_draft used before drafts were compiled"""
+    draft = body
+    for key, value in answers.items():
+        draft = draft.replace(f"{{{{{key}}}}}", str(value))
+    return draft
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def run(sizes_kb, repeat: int) -> None:
+    print(f"{'size_KB':>8} {'slots':>6} {'full_render_us':>15} {'compiled_us':>12} {'patch_us':>9}")
+    for size_kb in sizes_kb:
+        body = build_template(size_kb)
+        compiled = CompiledTemplate(body)
+        answers = {f"var_{v}": f"Answer number {v}" for v in range(VARIABLES)}
+        draft = compiled.render(answers)
+
+        edits = compiled.patch(answers, "var_7", "A considerably longer replacement answer")
+        edited = dict(answers, var_7="A considerably longer replacement answer")
+        assert apply_patch(draft, edits) == compiled.render(edited) == full_render(body, edited)
+
+        print(
+            f"{size_kb:>8} {len(compiled.keys):>6} "
+            f"{timed(lambda: full_render(body, edited), repeat):>15.1f} "
+            f"{timed(lambda: compiled.render(edited), repeat):>12.1f} "
+            f"{timed(lambda: compiled.patch(answers, 'var_7', 'Another answer'), repeat):>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Draft edit latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Template sizes in KB")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    run(args.sizes, args.repeat)
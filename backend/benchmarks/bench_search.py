@@ -0,0 +1,90 @@
+"""
+Latency benchmark for FTS5 full-text search.
+Run from backend/: python -m benchmarks.bench_search --documents 200000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine, text
+
+from app.core.config import settings
+from app.db.database import Base
+from app.db import search as fts
+
+WORDS = (
+    "tenant landlord premises rent deposit indemnify indemnification liability warranty "
+    "termination notice assignment confidentiality arbitration jurisdiction governing law "
+    "employee employer salary severance insurer premium policy coverage claim breach remedy "
+    "force majeure payment invoice schedule exhibit amendment waiver severability counterpart"
+).split()
+
+FILLER = [f"w{i}" for i in range(5000)]
+FILLER_WEIGHTS = [1 / (rank + 1) for rank in range(len(FILLER))]
+
+QUERIES = ["indemnif*", "force majeure", "tenant deposit", "arbitration jurisdiction", "severance", "warranty breach remedy"]
+
+
+def seed(engine, documents: int, words_per_doc: int) -> None:
+    """Bulk insert synthetic documents, then build the FTS tables from them"""
+    rng = random.Random(11)
+    with engine.begin() as conn:
+        batch = []
+        for i in range(documents):
+            # Zipf-distributed filler with roughly one legal term in ten words
+            legal = rng.choices(WORDS, k=max(words_per_doc // 10, 1))
+            filler = rng.choices(FILLER, weights=FILLER_WEIGHTS, k=words_per_doc - len(legal))
+            body = " ".join(filler + legal)
+            batch.append({"id": str(uuid.uuid4()), "filename": f"contract_{i}.docx", "raw_text": body})
+            if len(batch) == 5000:
+                conn.execute(text(
+                    "INSERT INTO documents(id, filename, mime_type, raw_text) VALUES (:id, :filename, 'text/plain', :raw_text)"
+                ), batch)
+                batch = []
+        if batch:
+            conn.execute(text(
+                "INSERT INTO documents(id, filename, mime_type, raw_text) VALUES (:id, :filename, 'text/plain', :raw_text)"
+            ), batch)
+    fts.create_search_tables(engine)
+
+
+def run(documents: int, words_per_doc: int, limit: int, repeats: int, window: int) -> None:
+    """Time first pages and a deep keyset page for each query"""
+    path = os.path.join(tempfile.mkdtemp(), "bench_search.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+
+    started = time.perf_counter()
+    seed(engine, documents, words_per_doc)
+    print(f"Seeded {documents} documents in {time.perf_counter() - started:.1f}s ({path})")
+    print(f"{'query':>26} {'page':>6} {'p50_ms':>8} {'max_ms':>8}")
+
+    with engine.connect() as conn:
+        for query in QUERIES:
+            for page in ("first", "fifth"):
+                timings = []
+                for _ in range(repeats):
+                    cursor = None
+                    if page == "fifth":
+                        for _ in range(4):
+                            cursor = fts.search(conn, query, ["documents"], limit, cursor, window)["next_cursor"]
+                    started = time.perf_counter()
+                    fts.search(conn, query, ["documents"], limit, cursor, window)
+                    timings.append((time.perf_counter() - started) * 1000)
+                print(f"{query:>26} {page:>6} {statistics.median(timings):>8.1f} {max(timings):>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FTS5 search latency benchmark")
+    parser.add_argument("--documents", type=int, default=200_000)
+    parser.add_argument("--words", type=int, default=60, help="Words per synthetic document")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--window", type=int, default=settings.SEARCH_RANK_WINDOW, help="Rank window per scope")
+    args = parser.parse_args()
+    run(args.documents, args.words, args.limit, args.repeats, args.window)
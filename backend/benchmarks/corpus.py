@@ -0,0 +1,474 @@
+"""
+Synthetic legal corpus: DOCX/PDF/TXT contracts and templates seeded through the API.
+Families, headings and tags are extended with the clauses of the TXT contracts in samples/.
+In-process into a SQLite file: python -m benchmarks.corpus --templates 10000 --documents 2000 --database-url sqlite:///./scale.db
+Files only: python -m benchmarks.corpus --templates 50 --documents 50 --out corpus/ --files-only
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.documents import write_docx, write_pdf
+
+# doc_type -> (title, core tags, variables as key -> example values, clauses using {key} slots)
+FAMILIES: Dict[str, Tuple[str, List[str], Dict[str, List[str]], List[str]]] = {
+    "lease": (
+        "Residential Lease Agreement", ["lease", "rent", "tenant", "landlord"],
+        {
+            "landlord_name": ["Harbor Properties LLC", "Maple Estates Ltd", "R. Iyer"],
+            "tenant_name": ["Jane Doe", "Arjun Mehta", "Lucia Fernandez"],
+            "property_address": ["12 Baker Street, London", "44 Elm Road, Pune", "9 Ocean Drive, Miami"],
+            "monthly_rent": ["USD 2,500", "INR 45,000", "GBP 1,850"],
+            "security_deposit": ["USD 5,000", "INR 90,000", "GBP 3,700"],
+            "lease_start_date": ["1 March 2025", "15 July 2024", "1 January 2026"],
+            "lease_term_months": ["12", "11", "24"],
+        },
+        [
+            "The Landlord, {landlord_name}, agrees to let the premises at {property_address} to the Tenant, {tenant_name}.",
+            "The Tenant shall pay a monthly rent of {monthly_rent} on or before the fifth day of each month.",
+            "A security deposit of {security_deposit} shall be held by the Landlord for the term of this lease.",
+            "This lease commences on {lease_start_date} and continues for {lease_term_months} months.",
+            "The Tenant shall keep the premises at {property_address} in good repair, fair wear and tear excepted.",
+        ],
+    ),
+    "employment": (
+        "Employment Offer Letter", ["employment", "offer", "salary", "employee"],
+        {
+            "employer_name": ["Acme Holdings Ltd", "Northwind Traders", "Globex Corporation"],
+            "employee_name": ["Priya Sharma", "John Smith", "Mei Chen"],
+            "job_title": ["Senior Analyst", "Software Engineer", "Operations Manager"],
+            "annual_salary": ["USD 95,000", "INR 18,00,000", "EUR 72,000"],
+            "joining_date": ["2 June 2025", "1 October 2024", "6 January 2026"],
+            "notice_period": ["30 days", "60 days", "90 days"],
+        },
+        [
+            "{employer_name} is pleased to offer {employee_name} the position of {job_title}.",
+            "The Employee shall receive an annual salary of {annual_salary}, payable in monthly instalments.",
+            "The Employee shall join on {joining_date} at the principal office of {employer_name}.",
+            "Either party may terminate this employment by giving {notice_period} written notice.",
+        ],
+    ),
+    "nda": (
+        "Mutual Non-Disclosure Agreement", ["nda", "confidentiality", "disclosure"],
+        {
+            "disclosing_party": ["Initech Inc", "Stark Industries", "Wayne Enterprises"],
+            "receiving_party": ["Umbrella Ltd", "Hooli LLC", "Vandelay Imports"],
+            "effective_date": ["10 April 2025", "3 September 2024", "20 February 2026"],
+            "term_years": ["2", "3", "5"],
+            "governing_law": ["the State of New York", "England and Wales", "the Republic of India"],
+        },
+        [
+            "This agreement is made on {effective_date} between {disclosing_party} and {receiving_party}.",
+            "{receiving_party} shall hold all Confidential Information of {disclosing_party} in strict confidence.",
+            "The obligations of confidentiality survive for {term_years} years after disclosure.",
+            "This agreement is governed by the laws of {governing_law}.",
+        ],
+    ),
+    "services": (
+        "Master Services Agreement", ["services", "vendor", "fees", "deliverables"],
+        {
+            "client_name": ["Contoso Ltd", "Fabrikam Inc", "Tailspin Toys"],
+            "provider_name": ["Blue Yonder Consulting", "Litware LLC", "Adatum Services"],
+            "service_fee": ["USD 12,000 per month", "EUR 150 per hour", "INR 6,00,000 per milestone"],
+            "payment_terms_days": ["30", "45", "15"],
+            "liability_cap": ["the fees paid in the preceding twelve months", "USD 250,000", "twice the annual fees"],
+        },
+        [
+            "{provider_name} shall provide the services described in each statement of work to {client_name}.",
+            "{client_name} shall pay {service_fee} within {payment_terms_days} days of a valid invoice.",
+            "The aggregate liability of {provider_name} shall not exceed {liability_cap}.",
+        ],
+    ),
+    "loan": (
+        "Loan Agreement", ["loan", "repayment", "interest", "borrower"],
+        {
+            "lender_name": ["First Capital Bank", "Sterling Finance", "K. Raman"],
+            "borrower_name": ["Delta Logistics Pvt Ltd", "Mark Johnson", "Sunrise Bakery"],
+            "loan_amount": ["USD 50,000", "INR 25,00,000", "GBP 30,000"],
+            "interest_rate": ["8.5 percent per annum", "11 percent per annum", "6.25 percent per annum"],
+            "repayment_date": ["31 December 2026", "30 June 2027", "15 March 2028"],
+        },
+        [
+            "{lender_name} agrees to lend {loan_amount} to {borrower_name} on the terms of this agreement.",
+            "The loan bears interest at {interest_rate}, calculated on the outstanding principal.",
+            "{borrower_name} shall repay the loan in full on or before {repayment_date}.",
+        ],
+    ),
+    "notice": (
+        "Insurance Claim Notice", ["insurance", "claim", "insurer", "policy"],
+        {
+            "insurer_name": ["Liberty Mutual", "New India Assurance", "Aviva plc"],
+            "policy_number": ["POL-2231-9981", "NIA/44/102938", "AV-55-771203"],
+            "incident_date": ["14 August 2024", "2 February 2025", "28 November 2025"],
+            "claim_amount": ["USD 18,400", "INR 3,20,000", "GBP 7,950"],
+            "claimant_name": ["Rohan Gupta", "Emily Clarke", "Carlos Ruiz"],
+        },
+        [
+            "To {insurer_name}: this notice concerns policy number {policy_number} held by {claimant_name}.",
+            "On {incident_date} the insured property suffered damage covered by the policy.",
+            "{claimant_name} claims {claim_amount} under policy {policy_number}.",
+        ],
+    ),
+}
+BOILERPLATE = [
+    "Each party represents that it has full power and authority to enter into this agreement.",
+    "No failure or delay in exercising any right shall operate as a waiver of that right.",
+    "If any provision is held invalid, the remaining provisions continue in full force and effect.",
+    "This agreement constitutes the entire agreement between the parties on its subject matter.",
+    "Notices shall be in writing and delivered by hand, registered post or electronic mail.",
+    "Neither party may assign its rights under this agreement without prior written consent.",
+    "Amendments to this agreement are effective only if made in writing and signed by both parties.",
+    "Neither party is liable for delay caused by events beyond its reasonable control.",
+    "Headings are for convenience only and do not affect the interpretation of this agreement.",
+    "This agreement may be executed in counterparts, each of which is deemed an original.",
+    "The parties shall attempt in good faith to resolve any dispute through negotiation.",
+    "Each party shall bear its own costs in connection with the preparation of this agreement.",
+]
+SECTION_HEADINGS = ["DEFINITIONS", "OBLIGATIONS", "PAYMENT", "TERM AND TERMINATION", "LIABILITY",
+                    "CONFIDENTIALITY", "GENERAL PROVISIONS", "DISPUTE RESOLUTION", "NOTICES"]
+TAG_VOCABULARY = ["indemnity", "arbitration", "termination", "governing-law", "force-majeure", "assignment",
+                  "warranty", "payment", "renewal", "jurisdiction", "privacy", "intellectual-property", "residential",
+                  "commercial", "consumer", "corporate", "real-estate", "finance", "hr", "compliance"]
+JURISDICTIONS = ["India", "United States", "United Kingdom", "Singapore", "Germany", ""]
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "samples")
+# sample file name keyword -> doc_type of the family its clauses join
+SAMPLE_DOC_TYPES = {"lease": "lease", "offer": "employment"}
+# Sample placeholders are written [KEY] or {{key}}
+SAMPLE_PLACEHOLDER = re.compile(r"\[([A-Z0-9_]+)\]|\{\{\s*([a-z0-9_]+)\s*\}\}")
+SAMPLE_HEADING = re.compile(r"^\d+\.\s+([A-Z][A-Z &]+[A-Z])\b")
+FORMATS = ("docx", "pdf", "txt")
+UPLOAD_FORMATS = ("docx", "pdf")  # the upload endpoint accepts these
+
+
+def load_samples(directory: str) -> Tuple[Dict[str, Tuple[List[str], List[str]]], List[str]]:
+    """
+    Read the sample contracts (TXT only; the DOCX/PDF samples hold the same families).
+
+    Returns:
+        ({doc_type: (clauses with {key} slots, keys)}, section headings)
+    """
+    families: Dict[str, Tuple[List[str], List[str]]] = {}
+    headings: List[str] = []
+    if not directory or not os.path.isdir(directory):
+        return families, headings
+    for name in sorted(os.listdir(directory)):
+        doc_type = next((t for keyword, t in SAMPLE_DOC_TYPES.items() if keyword in name.lower()), None)
+        if doc_type is None or not name.endswith(".txt"):
+            continue
+        clauses, keys = families.setdefault(doc_type, ([], []))
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            for line in f:
+                line = line.strip().lstrip("- ").strip()
+                heading = SAMPLE_HEADING.match(line)
+                if heading and heading.group(1) not in headings:
+                    headings.append(heading.group(1))
+                found = [(upper or lower).lower() for upper, lower in SAMPLE_PLACEHOLDER.findall(line)]
+                clause = SAMPLE_PLACEHOLDER.sub(lambda m: "{" + (m.group(1) or m.group(2)).lower() + "}", line)
+                # Skip lines that are only placeholders, continuations of a wrapped line,
+                # or carry stray braces that would break str.format
+                rest = SAMPLE_PLACEHOLDER.sub("", line)
+                if (not found or len(re.findall(r"[A-Za-z]{2,}", rest)) < 2 or not clause[0].isupper()
+                        or "{" in rest or "}" in rest or clause in clauses):
+                    continue
+                clauses.append(clause)
+                keys.extend(key for key in found if key not in keys)
+    return families, headings
+
+
+def merge_samples(
+    families: Dict[str, Tuple[str, List[str], Dict[str, List[str]], List[str]]],
+    samples: Dict[str, Tuple[List[str], List[str]]]
+) -> Dict[str, Tuple[str, List[str], Dict[str, List[str]], List[str]]]:
+    """Families with the sample clauses added; sample-only keys get generated example values"""
+    merged = dict(families)
+    for doc_type, (clauses, keys) in samples.items():
+        title, tags, examples, own_clauses = merged[doc_type]
+        examples = dict(examples)
+        for key in keys:
+            examples.setdefault(key, [f"{key.replace('_', ' ').title()} {n}" for n in (1, 2, 3)])
+        merged[doc_type] = (title, tags, examples, own_clauses + [c for c in clauses if c not in own_clauses])
+    return merged
+
+
+@dataclass
+class Contract:
+    """One generated contract: a template body and the same text filled in"""
+    name: str
+    family: int
+    doc_type: str
+    title: str
+    jurisdiction: str
+    tags: List[str]
+    variables: Dict[str, str]
+    body_md: str
+    filled: str = field(repr=False, default="")
+
+    def template_payload(self) -> Dict[str, Any]:
+        return {
+            "title": self.title,
+            "file_description": f"Synthetic {self.doc_type} contract, family {self.family}",
+            "doc_type": self.doc_type,
+            "jurisdiction": self.jurisdiction,
+            "similarity_tags": self.tags,
+            "body_md": self.body_md,
+            "variables": [
+                {"key": key, "label": key.replace("_", " ").title(), "description": "", "example": example,
+                 "required": True, "dtype": "string"}
+                for key, example in self.variables.items()
+            ],
+        }
+
+
+class CorpusGenerator:
+    """
+    Contracts in near-duplicate families: each family shares a base contract and its
+    members differ by a fraction of clauses, title suffix and jurisdiction - UOIONHHC
+    """
+
+    def __init__(
+        self,
+        seed: int = 7,
+        min_kb: float = 2.0,
+        max_kb: float = 40.0,
+        placeholders_per_kb: float = 1.0,
+        family_size: int = 5,
+        mutation: float = 0.15,
+        tag_vocabulary: int = 200,
+        tags_per_template: int = 4,
+        samples_dir: Optional[str] = SAMPLES_DIR,
+    ):
+        self.rng = random.Random(seed)
+        samples, sample_headings = load_samples(samples_dir)
+        self.families = merge_samples(FAMILIES, samples)
+        self.section_headings = SECTION_HEADINGS + [h for h in sample_headings if h not in SECTION_HEADINGS]
+        # Sample headings double as tags, ahead of the generated topic-N filler
+        sample_tags = [h.lower().replace(" & ", "-").replace(" ", "-") for h in sample_headings]
+        base_vocabulary = list(dict.fromkeys(TAG_VOCABULARY + sample_tags))
+        self.min_kb = min_kb
+        self.max_kb = max_kb
+        self.placeholders_per_kb = placeholders_per_kb
+        self.family_size = family_size
+        self.mutation = mutation
+        self.tags_per_template = tags_per_template
+        self.vocabulary = (base_vocabulary + [f"topic-{n}" for n in range(max(tag_vocabulary - len(base_vocabulary), 0))])[:tag_vocabulary]
+        # Zipf-like weights: a few tags are everywhere, most are rare
+        self.tag_weights = [1 / (rank + 1) for rank in range(len(self.vocabulary))]
+        self._family: Optional[Tuple[str, List[List[str]], List[str]]] = None
+
+    def _clause(self, doc_type: str, with_placeholder: bool) -> str:
+        if with_placeholder:
+            return self.rng.choice(self.families[doc_type][3])
+        return self.rng.choice(BOILERPLATE)
+
+    def _base(self) -> Tuple[str, List[List[str]], List[str]]:
+        """A new family: doc type, sections of raw clauses ({key} slots) and tags"""
+        doc_type = self.rng.choice(list(self.families))
+        target = 1024 * math.exp(self.rng.uniform(math.log(self.min_kb), math.log(self.max_kb)))
+        sections: List[List[str]] = []
+        length = placeholders = 0
+        while length < target:
+            section = []
+            for _ in range(self.rng.randint(3, 6)):
+                # Keep the running placeholder count at the requested density
+                wanted = self.placeholders_per_kb * (length + 120) / 1024
+                clause = self._clause(doc_type, placeholders < wanted)
+                placeholders += clause.count("{")
+                length += len(clause) + 6
+                section.append(clause)
+            sections.append(section)
+        tags = self.families[doc_type][1] + self._tags()
+        return doc_type, sections, tags
+
+    def _tags(self) -> List[str]:
+        count = min(self.tags_per_template, len(self.vocabulary))
+        return list(dict.fromkeys(self.rng.choices(self.vocabulary, self.tag_weights, k=count)))
+
+    def contract(self, index: int) -> Contract:
+        if index % self.family_size == 0 or self._family is None:
+            self._family = self._base()
+        doc_type, sections, tags = self._family
+        member = index % self.family_size
+        title, _, examples, _ = self.families[doc_type]
+
+        # Near duplicate: swap a fraction of clauses for other clauses of the same kind
+        mutated = [
+            [
+                self._clause(doc_type, "{" in clause) if member and self.rng.random() < self.mutation else clause
+                for clause in section
+            ]
+            for section in sections
+        ]
+        if member and self.rng.random() < self.mutation:
+            tags = tags[:-1] + self._tags()[:1]
+
+        variables = {key: self.rng.choice(values) for key, values in examples.items()}
+        used = {key for section in mutated for clause in section for key in variables if f"{{{key}}}" in clause}
+        variables = {key: value for key, value in variables.items() if key in used}
+
+        parts = [f"# {title.upper()}"]
+        for number, section in enumerate(mutated, 1):
+            parts.append(f"SECTION {number}. {self.section_headings[(number - 1) % len(self.section_headings)]}")
+            parts.extend(f"({chr(97 + n % 26)}) {clause}" for n, clause in enumerate(section))
+        raw = "\n\n".join(parts) + "\n"
+
+        return Contract(
+            name=f"contract_{index:06d}",
+            family=index // self.family_size,
+            doc_type=doc_type,
+            title=f"{title} {index // self.family_size + 1}" + (f" (variant {member})" if member else ""),
+            jurisdiction=self.rng.choice(JURISDICTIONS),
+            tags=tags,
+            variables=variables,
+            body_md=raw.format_map({key: f"{{{{{key}}}}}" for key in examples}),
+            filled=raw.format_map({key: variables.get(key, "") for key in examples}),
+        )
+
+
+def write_file(contract: Contract, fmt: str, out_dir: str) -> str:
+    path = os.path.join(out_dir, f"{contract.name}.{fmt}")
+    if fmt == "docx":
+        write_docx(contract.filled, path)
+    elif fmt == "pdf":
+        write_pdf(contract.filled, path)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(contract.filled)
+    return path
+
+
+class Seeder:
+    """Sends templates and uploads through the API with bounded concurrency - UOIONHHC"""
+
+    def __init__(self, client: httpx.AsyncClient, concurrency: int):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.errors = 0
+
+    async def _post(self, url: str, **kwargs) -> Optional[Dict[str, Any]]:
+        async with self.semaphore:
+            response = await self.client.post(url, **kwargs)
+        if response.status_code != 200:
+            self.errors += 1
+            print(f"  {url} -> {response.status_code}: {response.text[:200]}")
+            return None
+        return response.json()
+
+    async def template(self, contract: Contract) -> None:
+        await self._post("/api/templates/", json=contract.template_payload())
+
+    async def upload(self, path: str) -> None:
+        mime = "application/pdf" if path.endswith(".pdf") else \
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        with open(path, "rb") as f:
+            content = f.read()
+        await self._post("/api/documents/upload", files={"file": (os.path.basename(path), content, mime)})
+
+
+async def timed_batch(label: str, coroutines: List[Any], batch_size: int = 500) -> None:
+    started = time.perf_counter()
+    for i in range(0, len(coroutines), batch_size):
+        await asyncio.gather(*coroutines[i:i + batch_size])
+        print(f"  {label}: {min(i + batch_size, len(coroutines))}/{len(coroutines)}")
+    elapsed = time.perf_counter() - started
+    if coroutines:
+        print(f"{label}: {len(coroutines)} in {elapsed:.1f}s ({len(coroutines) / elapsed:.1f}/s)")
+
+
+async def run(args) -> None:
+    generator = CorpusGenerator(
+        seed=args.seed,
+        min_kb=args.min_kb,
+        max_kb=args.max_kb,
+        placeholders_per_kb=args.placeholders_per_kb,
+        family_size=args.family_size,
+        mutation=args.mutation,
+        tag_vocabulary=args.tag_vocabulary,
+        tags_per_template=args.tags_per_template,
+        samples_dir=args.samples,
+    )
+    out_dir = args.out or tempfile.mkdtemp(prefix="corpus_")
+    os.makedirs(out_dir, exist_ok=True)
+
+    templates = [generator.contract(i) for i in range(args.templates)]
+    # Documents are filled-in members of the same families, so uploads resemble the catalog
+    documents = [generator.contract(args.templates + i) for i in range(args.documents)]
+    paths = [write_file(c, args.formats[i % len(args.formats)], out_dir) for i, c in enumerate(documents)]
+    with open(os.path.join(out_dir, "manifest.jsonl"), "w") as manifest:
+        for contract in templates:
+            manifest.write(json.dumps({**contract.template_payload(), "kind": "template", "family": contract.family}) + "\n")
+        for contract, path in zip(documents, paths):
+            manifest.write(json.dumps({"kind": "document", "path": os.path.basename(path), "family": contract.family,
+                                       "doc_type": contract.doc_type, "tags": contract.tags}) + "\n")
+
+    sizes = [len(c.body_md) for c in templates] or [0]
+    placeholders = sum(c.body_md.count("{{") for c in templates)
+    print(f"Generated {len(templates)} templates ({sum(sizes) / 1024 / 1024:.1f} MB, "
+          f"{placeholders / max(sum(sizes) / 1024, 1):.2f} placeholders/KB) and {len(paths)} documents in {out_dir}")
+    if args.files_only:
+        return
+
+    async with contextlib.AsyncExitStack() as stack:
+        if args.url is None:
+            from app.db.database import async_engine
+            from app.main import app
+
+            # aiosqlite connections run on non-daemon threads; close them so the process can exit
+            stack.push_async_callback(async_engine.dispose)
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://corpus", timeout=300)
+        else:
+            client = httpx.AsyncClient(base_url=args.url, timeout=300)
+        await stack.enter_async_context(client)
+
+        seeder = Seeder(client, args.concurrency)
+        await timed_batch("templates", [seeder.template(c) for c in templates])
+        uploads = [path for path in paths if path.rsplit(".", 1)[-1] in UPLOAD_FORMATS]
+        if len(uploads) < len(paths):
+            print(f"  {len(paths) - len(uploads)} TXT documents written to disk only (upload takes DOCX/PDF)")
+        await timed_batch("uploads", [seeder.upload(path) for path in uploads])
+        print(f"errors: {seeder.errors}")
+        if args.url is None:
+            print(f"DATABASE_URL={os.environ['DATABASE_URL']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic legal corpus generator and seeder")
+    parser.add_argument("--templates", type=int, default=1000)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS), help="Document formats, used in turn")
+    parser.add_argument("--min-kb", type=float, default=2.0, help="Smallest contract body")
+    parser.add_argument("--max-kb", type=float, default=40.0, help="Largest contract body (lengths are log-uniform)")
+    parser.add_argument("--placeholders-per-kb", type=float, default=1.0)
+    parser.add_argument("--family-size", type=int, default=5, help="Near-duplicate contracts per family")
+    parser.add_argument("--mutation", type=float, default=0.15, help="Fraction of clauses that differ within a family")
+    parser.add_argument("--tag-vocabulary", type=int, default=200, help="Distinct tags beyond each doc type's core tags")
+    parser.add_argument("--tags-per-template", type=int, default=4)
+    parser.add_argument("--samples", default=SAMPLES_DIR, help="Sample contracts extending the families; empty for built-in ones only")
+    parser.add_argument("--out", help="Directory for generated files and manifest.jsonl (default: temp dir)")
+    parser.add_argument("--files-only", action="store_true", help="Write files without seeding the database")
+    parser.add_argument("--url", help="Seed a running server; omit to seed in-process")
+    parser.add_argument("--database-url", help="In-process database (default: temp SQLite file)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight while seeding")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.url is None and not args.files_only:
+        # Settings are read on import, so configure the in-process app first
+        os.environ.setdefault("LLM_BACKEND", "fake")
+        os.environ.setdefault("FAKE_LLM_LATENCY_MS", "5")
+        os.environ.setdefault("GEMINI_RPM", "1000000")
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/corpus.db"
+
+    asyncio.run(run(args))
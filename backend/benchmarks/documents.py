@@ -0,0 +1,68 @@
+"""
+Synthetic DOCX and PDF files for benchmarks.
+PDFs are written directly (Helvetica text pages) so no PDF library is needed.
+"""
+
+import textwrap
+from typing import List
+
+import docx
+
+PDF_LINE_CHARS = 90
+PDF_LINES_PER_PAGE = 60
+
+
+def write_docx(text: str, path: str) -> None:
+    """One paragraph per blank-line separated block of text"""
+    document = docx.Document()
+    for block in text.split("\n\n"):
+        if block.strip():
+            document.add_paragraph(block.strip())
+    document.save(path)
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_pages(text: str) -> List[List[str]]:
+    lines = []
+    for paragraph in text.split("\n"):
+        lines.extend(textwrap.wrap(paragraph, PDF_LINE_CHARS) or [""])
+    return [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[""]]
+
+
+def write_pdf(text: str, path: str) -> None:
+    """Minimal PDF 1.4 with text wrapped onto Letter-sized pages"""
+    pages = _pdf_pages(text)
+    # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        page_id = len(objects) + 1
+        page_ids.append(page_id)
+        stream = "BT /F1 10 Tf 12 TL 50 760 Td\n" + "".join(f"({_pdf_escape(line)}) Tj T*\n" for line in lines) + "ET"
+        data = stream.encode("cp1252", errors="replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    with open(path, "wb") as out:
+        out.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(out.tell())
+            out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            out.write(b"%010d 00000 n \n" % offset)
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
@@ -0,0 +1,289 @@
+"""
+Load test of the chat drafting flow: match, questions, answers, draft.
+In-process (ASGI, fake LLM): python -m benchmarks.loadtest_chat --users 20 --duration 60
+Over HTTP (server started with LLM_BACKEND=fake): python -m benchmarks.loadtest_chat --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.core.stats import LatencyWindow
+
+# (title, tags, query words, variables) for the seeded template catalog
+TOPICS = [
+    ("Residential Lease Agreement", ["lease", "rent", "tenant"], "lease agreement for my flat rent",
+     ["landlord_name", "tenant_name", "monthly_rent", "start_date", "property_address"]),
+    ("Employment Termination Letter", ["employment", "termination", "notice"], "termination letter for an employee",
+     ["employer_name", "employee_name", "termination_date", "notice_period"]),
+    ("Mutual Non-Disclosure Agreement", ["nda", "confidentiality"], "nda confidentiality agreement with a vendor",
+     ["disclosing_party", "receiving_party", "effective_date", "term_years", "governing_law"]),
+    ("Insurance Claim Notice", ["insurance", "claim", "insurer"], "notice to insurer about a claim",
+     ["insurer_name", "policy_number", "incident_date", "claim_amount", "claimant_name", "claimant_address"]),
+    ("Loan Repayment Demand", ["loan", "repayment", "demand"], "loan repayment demand notice",
+     ["lender_name", "borrower_name", "loan_amount", "due_date"]),
+    ("Power of Attorney", ["attorney", "authority", "agent"], "power of attorney for property matters",
+     ["principal_name", "agent_name", "powers_granted", "execution_date"]),
+]
+ANSWERS = ["Acme Holdings Ltd", "Jane Doe", "2025-01-01", "USD 2,500", "12 Baker Street", "30 days", "New York"]
+
+# Server-side time of the request being handled (in-process mode only)
+request_timing: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "request_timing", default=None
+)
+
+
+def template_payload(index: int) -> Dict[str, Any]:
+    title, tags, _, keys = TOPICS[index % len(TOPICS)]
+    suffix = f" ({index // len(TOPICS) + 1})" if index >= len(TOPICS) else ""
+    clauses = "\n\n".join(
+        f"{n}. The parties agree that {{{{{key}}}}} applies to this {title.lower()}." for n, key in enumerate(keys, 1)
+    )
+    return {
+        "title": title + suffix,
+        "file_description": f"{title} template",
+        "doc_type": tags[0],
+        "jurisdiction": "",
+        "similarity_tags": tags,
+        "body_md": f"# {title}\n\n{clauses}\n",
+        "variables": [
+            {"key": key, "label": key.replace("_", " ").title(), "description": "", "example": "", "required": True,
+             "dtype": "string"}
+            for key in keys
+        ],
+    }
+
+
+def instrument() -> None:
+    """Attribute DB cursor time and LLM call time to the request in progress"""
+    from sqlalchemy import event
+
+    from app.db.database import async_engine
+    from app.services.gemini_service import get_gemini_service
+
+    def add(kind: str, seconds: float) -> None:
+        timing = request_timing.get()
+        if timing is not None:
+            timing[kind] += seconds
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        add("db", time.perf_counter() - conn.info["query_started"].pop())
+
+    # Chat handlers call these through run_in_threadpool, which carries the context along
+    gemini_service = get_gemini_service()
+    for name in ("match_template", "generate_questions", "pre_fill_variables", "generate_embedding"):
+        method = getattr(gemini_service, name)
+
+        def timed(*args, _method=method, **kwargs):
+            started = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                add("llm", time.perf_counter() - started)
+
+        setattr(gemini_service, name, timed)
+
+
+class LoadTest:
+    """Virtual users running drafting conversations back to back - UOIONHHC"""
+
+    def __init__(self, client: httpx.AsyncClient, in_process: bool, think_ms: float, seed: int):
+        self.client = client
+        self.in_process = in_process
+        self.think_ms = think_ms
+        self.rng = random.Random(seed)
+        self.transitions: Dict[str, LatencyWindow] = defaultdict(lambda: LatencyWindow(size=100_000))
+        self.server_time: Dict[str, Dict[str, float]] = defaultdict(lambda: {"db": 0.0, "llm": 0.0, "total": 0.0})
+        self.requests = 0
+        self.errors = 0
+        self.drafts = 0
+        self.unmatched = 0
+
+    async def send(self, step: str, message: str, conversation_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        timing = {"db": 0.0, "llm": 0.0}
+        token = request_timing.set(timing)
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(
+                "/api/chat/message", json={"message": message, "conversation_id": conversation_id}
+            )
+        except httpx.HTTPError:
+            self.errors += 1
+            return None
+        finally:
+            request_timing.reset(token)
+        elapsed = time.perf_counter() - started
+        self.requests += 1
+        if response.status_code != 200:
+            self.errors += 1
+            return None
+
+        body = response.json()
+        transition = f"{step} -> {body['message_type']}"
+        self.transitions[transition].observe(elapsed)
+        totals = self.server_time[transition]
+        totals["db"] += timing["db"]
+        totals["llm"] += timing["llm"]
+        totals["total"] += elapsed
+        return body
+
+    async def think(self) -> None:
+        if self.think_ms:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think_ms) / 1000)
+
+    async def conversation(self) -> None:
+        _, _, query, _ = self.rng.choice(TOPICS)
+        body = await self.send("draft_request", f"/draft {query}", None)
+        if body is None:
+            return
+        conversation_id = body["conversation_id"]
+
+        if body["message_type"] == "template_list":
+            await self.think()
+            body = await self.send("select", "1", conversation_id)
+        if body is None or body["message_type"] != "template_match":
+            self.unmatched += 1
+            return
+
+        await self.think()
+        body = await self.send("confirm", "yes", conversation_id)
+        while body is not None and body["message_type"] == "question":
+            await self.think()
+            step = "answer" if body["data"]["question_index"] + 1 < body["data"]["total_questions"] else "last_answer"
+            body = await self.send(step, self.rng.choice(ANSWERS), conversation_id)
+        if body is not None and body["message_type"] == "draft":
+            self.drafts += 1
+
+    async def user(self, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            await self.conversation()
+
+
+def chat_state_sample(started: float) -> Dict[str, Any]:
+    """Size of the in-memory chat state and process RSS"""
+    from app.api.chat import conversations
+    from app.services.draft_renderer import draft_renderer
+    from app.services.write_behind import answer_buffer
+
+    try:
+        with open("/proc/self/statm") as f:
+            rss_mb = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "elapsed": time.monotonic() - started,
+        "conversations": len(conversations),
+        "state_kb": len(json.dumps(conversations, default=str)) / 1024,
+        "rss_mb": rss_mb,
+        "pending_answers": answer_buffer.stats()["pending"],
+        "cached_drafts": draft_renderer.drafts.stats()["entries"],
+    }
+
+
+async def sample_memory(samples: List[Dict[str, Any]], started: float, deadline: float, interval: float) -> None:
+    while time.monotonic() < deadline:
+        samples.append(chat_state_sample(started))
+        await asyncio.sleep(interval)
+    samples.append(chat_state_sample(started))
+
+
+def report(test: LoadTest, duration: float, samples: List[Dict[str, Any]], in_process: bool) -> None:
+    print(f"\nrequests: {test.requests} ({test.requests / duration:.1f}/s)  drafts: {test.drafts} "
+          f"({test.drafts / duration:.2f}/s)  errors: {test.errors}  unmatched: {test.unmatched}\n")
+
+    print(f"{'transition':<34} {'count':>6} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'db_%':>6} {'llm_%':>6}")
+    for transition, window in sorted(test.transitions.items()):
+        summary = window.summary()
+        totals = test.server_time[transition]
+        db_share = f"{100 * totals['db'] / totals['total']:.0f}" if in_process else "-"
+        llm_share = f"{100 * totals['llm'] / totals['total']:.0f}" if in_process else "-"
+        print(
+            f"{transition:<34} {summary['count']:>6} {summary['p50_ms']:>8} {summary['p95_ms']:>8} "
+            f"{summary['p99_ms']:>8} {db_share:>6} {llm_share:>6}"
+        )
+
+    if samples:
+        print(f"\n{'elapsed_s':>9} {'convs':>7} {'state_KB':>9} {'rss_MB':>7} {'pending':>8} {'drafts_cached':>14}")
+        for s in samples:
+            print(
+                f"{s['elapsed']:>9.1f} {s['conversations']:>7} {s['state_kb']:>9.1f} {s['rss_mb']:>7.1f} "
+                f"{s['pending_answers']:>8} {s['cached_drafts']:>14}"
+            )
+        first, last = samples[0], samples[-1]
+        added = last["conversations"] - first["conversations"]
+        if added:
+            print(
+                f"\nchat state growth: {(last['state_kb'] - first['state_kb']) * 1024 / added:.0f} B/conversation, "
+                f"RSS {(last['rss_mb'] - first['rss_mb']) * 1024 / added:.1f} KB/conversation (never evicted)"
+            )
+
+
+async def run(args) -> None:
+    async with contextlib.AsyncExitStack() as stack:
+        in_process = args.url is None
+        if in_process:
+            from app.db.database import async_engine
+            from app.main import app
+
+            instrument()
+            # aiosqlite connections run on non-daemon threads; close them so the process can exit
+            stack.push_async_callback(async_engine.dispose)
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://loadtest", timeout=120)
+        else:
+            client = httpx.AsyncClient(base_url=args.url, timeout=120)
+        await stack.enter_async_context(client)
+
+        for index in range(args.templates):
+            response = await client.post("/api/templates/", json=template_payload(index))
+            response.raise_for_status()
+
+        test = LoadTest(client, in_process, args.think_ms, args.seed)
+        samples: List[Dict[str, Any]] = []
+        started = time.monotonic()
+        deadline = started + args.duration
+        tasks = [asyncio.create_task(test.user(deadline)) for _ in range(args.users)]
+        if in_process:
+            tasks.append(asyncio.create_task(sample_memory(samples, started, deadline, args.sample_interval)))
+        await asyncio.gather(*tasks)
+        report(test, time.monotonic() - started, samples, in_process)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat drafting flow load test")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent conversations")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    parser.add_argument("--url", help="Target server; omit to run the app in-process")
+    parser.add_argument("--templates", type=int, default=12, help="Templates seeded before the run")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean user think time between turns")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Fake LLM median latency (in-process)")
+    parser.add_argument("--llm-rpm", type=int, help="Override GEMINI_RPM to load the app rather than the quota")
+    parser.add_argument("--sample-interval", type=float, default=5.0, help="Seconds between memory samples")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    if args.url is None:
+        # Settings are read on import, so configure the in-process app first
+        os.environ.setdefault("LLM_BACKEND", "fake")
+        os.environ.setdefault("FAKE_LLM_LATENCY_MS", str(args.llm_latency_ms))
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/loadtest.db")
+        if args.llm_rpm:
+            os.environ["GEMINI_RPM"] = str(args.llm_rpm)
+
+    asyncio.run(run(args))
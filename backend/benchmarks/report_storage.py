@@ -0,0 +1,151 @@
+"""
+Storage and throughput report for compressed text columns and delta drafts.
+Run from backend/: python -m benchmarks.report_storage --templates 50 --drafts 40
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session, undefer
+
+from app.db.compression import persist_dictionary, with_dictionary
+from app.db.database import Base
+from app.db import models
+from app.services.draft_renderer import DraftRenderer, version_hash
+from benchmarks.bench_chunker import synthetic_contract
+
+MODES = ("plain", "zlib", "zlib+dict", "delta")
+PARTIES = ["Acme Corp", "Globex LLC", "Initech", "Umbrella Ltd", "Stark Industries", "Wayne Enterprises"]
+
+
+def build_corpus(templates: int, drafts: int, template_kb: int, seed: int = 3):
+    """Template bodies with {{placeholders}} and (answers, draft) pairs filled from them"""
+    rng = random.Random(seed)
+    corpus = []
+    for t in range(templates):
+        body = synthetic_contract(template_kb * 1024, seed=seed + t)
+        body = body.replace("tenant", "{{tenant_name}}", 5).replace("landlord", "{{landlord_name}}", 5)
+        filled = []
+        for _ in range(drafts):
+            answers = {"tenant_name": rng.choice(PARTIES), "landlord_name": rng.choice(PARTIES)}
+            draft = body
+            for key, value in answers.items():
+                draft = draft.replace(f"{{{{{key}}}}}", value)
+            filled.append((answers, draft))
+        corpus.append((body, filled))
+    return corpus
+
+
+def run_mode(mode: str, corpus) -> dict:
+    """Load the corpus in one storage mode and measure it"""
+    path = os.path.join(tempfile.mkdtemp(), f"storage_{mode.replace('+', '_')}.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    raw_bytes = 0
+    renderer = DraftRenderer()
+
+    started = time.perf_counter()
+    with Session(engine) as db:
+        for t, (body, filled) in enumerate(corpus):
+            template_id = f"tpl_{t}"
+            drafts = [draft for _, draft in filled]
+            raw_bytes += len(body.encode("utf-8")) * 2 + sum(len(d.encode("utf-8")) for d in drafts)
+            if mode == "plain":
+                # Uncompressed rows, exactly as stored before compression existed
+                db.execute(text(
+                    "INSERT INTO templates(id, title, body_md) VALUES (:id, :title, :body)"
+                ), {"id": template_id, "title": f"Template {t}", "body": body})
+                db.execute(text(
+                    "INSERT INTO documents(id, filename, mime_type, raw_text) VALUES (:id, :name, 'text/plain', :body)"
+                ), {"id": f"doc_{t}", "name": f"template_{t}.docx", "body": body})
+                db.execute(text(
+                    "INSERT INTO instances(id, template_id, user_query, draft_md) VALUES (:id, :tpl, 'draft', :draft)"
+                ), [{"id": uuid.uuid4().hex, "tpl": template_id, "draft": draft} for draft in drafts])
+            else:
+                db.execute(insert(models.Template), [{"id": template_id, "title": f"Template {t}", "body_md": body}])
+                db.execute(insert(models.Document), [{
+                    "id": f"doc_{t}", "filename": f"template_{t}.docx", "mime_type": "text/plain", "raw_text": body
+                }])
+                if mode == "delta":
+                    # Answers plus the template version; drafts are rendered on read
+                    version_id = version_hash(body)
+                    db.execute(insert(models.TemplateVersion), [
+                        {"id": version_id, "template_id": template_id, "body_md": body}
+                    ])
+                    db.execute(insert(models.Instance), [
+                        {"id": uuid.uuid4().hex, "template_id": template_id, "user_query": "draft",
+                         "answers_json": answers, "template_version": version_id}
+                        for answers, _ in filled
+                    ])
+                    continue
+                values = drafts
+                if mode == "zlib+dict":
+                    values = [with_dictionary(draft, body) for draft in drafts]
+                    # Bulk inserts bypass the ORM hook that stores the dictionary
+                    persist_dictionary(db.connection(), values[0].dictionary_key, values[0].dictionary)
+                db.execute(insert(models.Instance), [
+                    {"id": uuid.uuid4().hex, "template_id": template_id, "user_query": "draft", "draft_md": value}
+                    for value in values
+                ])
+        db.commit()
+    write_seconds = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+    engine.dispose()
+    size = os.path.getsize(path)
+
+    with Session(engine) as db:
+        started = time.perf_counter()
+        if mode == "delta":
+            conn = db.connection()
+            rows = db.execute(
+                select(models.Instance.template_version, models.Instance.answers_json).execution_options(yield_per=500)
+            )
+            drafts_read = sum(len(renderer.render_version(conn, version_id, answers)) for version_id, answers in rows)
+        else:
+            drafts_read = sum(len(row) for row in db.scalars(
+                select(models.Instance.draft_md).execution_options(yield_per=500)
+            ))
+        read_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        db.scalars(select(models.Template)).all()
+        list_deferred_ms = (time.perf_counter() - started) * 1000
+        db.expunge_all()
+
+        started = time.perf_counter()
+        db.scalars(select(models.Template).options(undefer(models.Template.body_md))).all()
+        list_full_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "mode": mode,
+        "size_mb": size / (1024 * 1024),
+        "ratio": raw_bytes / size,
+        "write_mb_s": raw_bytes / (1024 * 1024) / write_seconds,
+        "read_mb_s": drafts_read / (1024 * 1024) / read_seconds,
+        "list_deferred_ms": list_deferred_ms,
+        "list_full_ms": list_full_ms,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compressed storage report")
+    parser.add_argument("--templates", type=int, default=50)
+    parser.add_argument("--drafts", type=int, default=40, help="Drafts per template")
+    parser.add_argument("--template-kb", type=int, default=12)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.templates, args.drafts, args.template_kb)
+    print(f"{'mode':>10} {'size_MB':>8} {'ratio':>6} {'write_MB/s':>11} {'read_MB/s':>10} {'list_ms':>8} {'list+body_ms':>13}")
+    for mode in MODES:
+        r = run_mode(mode, corpus)
+        print(
+            f"{r['mode']:>10} {r['size_mb']:>8.2f} {r['ratio']:>6.1f} {r['write_mb_s']:>11.1f} "
+            f"{r['read_mb_s']:>10.1f} {r['list_deferred_ms']:>8.1f} {r['list_full_ms']:>13.1f}"
+        )
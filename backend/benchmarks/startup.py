@@ -0,0 +1,110 @@
+"""
+Import-time profile of the app with a startup-time budget.
+Run from backend/: python -m benchmarks.startup --budget-ms 1500 (exits 1 over budget or on eager heavy imports)
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Heavy dependencies that must load on first use, not when the app is imported
+LAZY_MODULES = ("google.generativeai", "exa_py", "numpy", "PyPDF2", "docx", "yaml", "httpx")
+
+# Median import time of app.main allowed by default (tests/test_startup.py uses it too)
+BUDGET_MS = 1500.0
+
+TIMED_IMPORT = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "eager": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def timed_import(module: str) -> Dict:
+    """Import module in a fresh interpreter; seconds spent and heavy modules loaded"""
+    result = subprocess.run(
+        [sys.executable, "-c", TIMED_IMPORT.format(module=module, lazy=LAZY_MODULES)],
+        capture_output=True, text=True, check=True
+    )
+    # The app may print while importing; the measurement is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(module: str) -> List[Tuple[str, int, int]]:
+    """
+    Per-module import times from python -X importtime.
+
+    Returns:
+        (module, self_us, cumulative_us) for each imported module
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="app.main", help="Module whose import is measured")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time (median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="Maximum median import time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    runs = [timed_import(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(run["seconds"] for run in runs) * 1000
+    eager = sorted({name for run in runs for name in run["eager"]})
+
+    # Slowest packages by cumulative time, counting only their top-level entry
+    profile = import_profile(args.module)
+    top_level: Dict[str, int] = {}
+    for name, _, cumulative_us in profile:
+        root = name if name.startswith("app.") else name.split(".")[0]
+        top_level[root] = max(top_level.get(root, 0), cumulative_us)
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    print(f"import {args.module}: median {median_ms:.0f} ms over {args.runs} runs "
+          f"(min {min(run['seconds'] for run in runs) * 1000:.0f} ms), budget {args.budget_ms:.0f} ms")
+    print(f"{'module':<40} {'cumulative ms':>14}")
+    for name, cumulative_us in slowest:
+        print(f"{name:<40} {cumulative_us / 1000:>14.1f}")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "module": args.module,
+                "median_ms": round(median_ms, 1),
+                "budget_ms": args.budget_ms,
+                "eager_imports": eager,
+                "slowest": [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in slowest],
+            }, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
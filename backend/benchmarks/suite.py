@@ -0,0 +1,238 @@
+"""
+Micro-benchmarks for document processing and template hot paths, with stored baselines.
+Run from backend/: python -m benchmarks.suite run --save-baseline default
+                   python -m benchmarks.suite compare default --threshold 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.services.document_processor import DocumentProcessor
+from app.services.draft_renderer import CompiledTemplate
+from app.services.template_service import TemplateService
+from benchmarks.bench_chunker import synthetic_contract
+from benchmarks.documents import write_docx, write_pdf
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+SIZE_UNITS = {"KB": 1024, "MB": 1024 * 1024}
+DEFAULT_SIZES = ["1KB", "64KB", "1MB"]
+DEFAULT_VARIABLES = [10, 100, 1000]
+# Seconds of repeated calls to aim for per measurement, and the repeat bounds
+TARGET_SECONDS = 0.3
+MIN_REPEATS = 3
+MAX_REPEATS = 200
+
+
+def parse_size(size: str) -> int:
+    """'64KB' / '50MB' to bytes"""
+    return int(float(size[:-2]) * SIZE_UNITS[size[-2:].upper()])
+
+
+def placeholder_document(size_bytes: int, variables: int, seed: int = 11) -> str:
+    """Contract text with a {{var_N}} placeholder roughly every 500 characters"""
+    text = synthetic_contract(size_bytes, seed=seed)
+    rng = random.Random(seed)
+    parts = text.split(" shall ")
+    return "".join(
+        part + (f" {{{{var_{rng.randrange(variables)}}}}} shall " if i % 8 == 7 else " shall ")
+        for i, part in enumerate(parts[:-1])
+    ) + parts[-1]
+
+
+def example_variables(text: str, count: int, seed: int = 13) -> List[Dict[str, str]]:
+    """Variables whose examples are phrases taken from the text, as the LLM returns them"""
+    rng = random.Random(seed)
+    words = text.split()
+    variables = []
+    for v in range(count):
+        start = rng.randrange(max(len(words) - 3, 1))
+        variables.append({"key": f"var_{v}", "example": " ".join(words[start:start + 3])})
+    return variables
+
+
+# Each case maps a parameter to (callable to time, bytes processed per call)
+def case_chunk_text(size: str, workdir: str) -> Tuple[Callable[[], object], int]:
+    text = synthetic_contract(parse_size(size))
+    return lambda: DocumentProcessor.chunk_text(text), len(text)
+
+
+def case_extract_docx(size: str, workdir: str) -> Tuple[Callable[[], object], int]:
+    text = synthetic_contract(parse_size(size))
+    path = os.path.join(workdir, f"doc_{size}.docx")
+    write_docx(text, path)
+    return lambda: DocumentProcessor.extract_text_from_docx(path), len(text)
+
+
+def case_extract_pdf(size: str, workdir: str) -> Tuple[Callable[[], object], int]:
+    text = synthetic_contract(parse_size(size))
+    path = os.path.join(workdir, f"doc_{size}.pdf")
+    write_pdf(text, path)
+    return lambda: DocumentProcessor.extract_text_from_pdf(path), len(text)
+
+
+def case_find_placeholders(size: str, workdir: str) -> Tuple[Callable[[], object], int]:
+    text = placeholder_document(parse_size(size), variables=100)
+    return lambda: TemplateService.find_placeholders(text), len(text)
+
+
+def case_replace_examples(variables: int, workdir: str, template_kb: int) -> Tuple[Callable[[], object], int]:
+    text = synthetic_contract(template_kb * 1024)
+    examples = example_variables(text, variables)
+    return lambda: TemplateService.replace_examples(text, examples), len(text)
+
+
+def case_render_draft(variables: int, workdir: str, template_kb: int) -> Tuple[Callable[[], object], int]:
+    """generate_draft on a compiled-template cache miss: compile the body, then render"""
+    body = placeholder_document(template_kb * 1024, variables)
+    answers = {f"var_{v}": f"Answer number {v}" for v in range(variables)}
+    return lambda: CompiledTemplate(body).render(answers), len(body)
+
+
+SIZE_CASES = {
+    "chunk_text": case_chunk_text,
+    "extract_docx": case_extract_docx,
+    "extract_pdf": case_extract_pdf,
+    "find_placeholders": case_find_placeholders,
+}
+VARIABLE_CASES = {
+    "replace_examples": case_replace_examples,
+    "render_draft": case_render_draft,
+}
+
+
+def measure(fn: Callable[[], object]) -> Tuple[float, int]:
+    """Median seconds per call and the number of timed calls"""
+    started = time.perf_counter()
+    fn()  # warm-up, also sizes the repeat count
+    first = time.perf_counter() - started
+    repeats = int(min(max(TARGET_SECONDS / max(first, 1e-9), MIN_REPEATS), MAX_REPEATS))
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), repeats
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(sizes: List[str], variables: List[int], template_kb: int, only: List[str]) -> dict:
+    """Run the selected cases and return a results document"""
+    jobs = [(name, size, case, ()) for name, case in SIZE_CASES.items() for size in sizes]
+    jobs += [(name, count, case, (template_kb,)) for name, case in VARIABLE_CASES.items() for count in variables]
+    results = {}
+
+    print(f"{'case':<32} {'median_ms':>10} {'MB/s':>9} {'repeats':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, param, case, extra in jobs:
+            if only and name not in only:
+                continue
+            fn, nbytes = case(param, workdir, *extra)
+            seconds, repeats = measure(fn)
+            key = f"{name}[{param}]"
+            results[key] = {"median_s": seconds, "bytes": nbytes, "repeats": repeats}
+            print(f"{key:<32} {seconds * 1000:>10.3f} {nbytes / (1024 * 1024) / seconds:>9.1f} {repeats:>8}")
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {"sizes": sizes, "variables": variables, "template_kb": template_kb},
+        "results": results,
+    }
+
+
+def load_results(name_or_path: str) -> dict:
+    """A results file, or the name of a stored baseline"""
+    path = name_or_path
+    if not os.path.exists(path):
+        path = os.path.join(BASELINE_DIR, f"{name_or_path}.json")
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results: dict, path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nSaved {len(results['results'])} results to {path}")
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    """
+    Print per-case ratios and flag slowdowns beyond the threshold.
+    
+    Returns:
+        Number of regressed cases
+    """
+    print(f"\nbaseline {baseline['commit']} -> current {current['commit']} (threshold +{threshold:.0%})")
+    print(f"{'case':<32} {'base_ms':>10} {'now_ms':>10} {'ratio':>7}")
+    regressions = 0
+    for key, now in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            print(f"{key:<32} {'-':>10} {now['median_s'] * 1000:>10.3f} {'new':>7}")
+            continue
+        ratio = now["median_s"] / base["median_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{key:<32} {base['median_s'] * 1000:>10.3f} {now['median_s'] * 1000:>10.3f} {ratio:>7.2f}{flag}")
+
+    print(f"\n{regressions} regression(s) in {len(current['results'])} cases")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Document and template micro-benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the suite")
+    compare_parser = commands.add_parser("compare", help="Compare against a baseline; exits 1 on regressions")
+    compare_parser.add_argument("baseline", help="Baseline name in benchmarks/baselines or a results file")
+    compare_parser.add_argument("current", nargs="?", help="Results file; runs the suite with the baseline's params if omitted")
+    compare_parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, 0.25 = 25%%")
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--sizes", nargs="+", help=f"Document sizes, e.g. 1KB 1MB 50MB (default {' '.join(DEFAULT_SIZES)})")
+        sub.add_argument("--variables", type=int, nargs="+", help=f"Variable counts (default {DEFAULT_VARIABLES})")
+        sub.add_argument("--template-kb", type=int, help="Template size for the variable cases (default 256)")
+        sub.add_argument("--only", nargs="+", default=[], help="Case names to run")
+        sub.add_argument("--output", help="Write results to this file")
+    run_parser.add_argument("--save-baseline", metavar="NAME", help="Store results as benchmarks/baselines/NAME.json")
+    args = parser.parse_args()
+
+    baseline = load_results(args.baseline) if args.command == "compare" else None
+    params = baseline["params"] if baseline else {}
+    if args.command == "compare" and args.current:
+        current = load_results(args.current)
+    else:
+        current = run_suite(
+            args.sizes or params.get("sizes", DEFAULT_SIZES),
+            args.variables or params.get("variables", DEFAULT_VARIABLES),
+            args.template_kb or params.get("template_kb", 256),
+            args.only,
+        )
+    if args.output:
+        save_results(current, args.output)
+    if args.command == "run" and args.save_baseline:
+        save_results(current, os.path.join(BASELINE_DIR, f"{args.save_baseline}.json"))
+    if baseline:
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
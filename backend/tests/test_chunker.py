@@ -0,0 +1,72 @@
+"""
+Property tests for the token-sized text chunker.
+Randomized documents check contiguity, coverage, chunk size and streaming offsets.
+"""
+
+import random
+
+import pytest
+
+from app.services.chunker import TextChunker
+
+WORDS = ["lease", "tenant", "landlord", "rent", "shall", "pay", "the", "premises", "notice", "term"]
+SEPARATORS = [" ", " ", " ", ". ", ";\n", "\n", "\n\n", "\n\nSECTION 4. TERMS\n", "\n(a) ", "\n12.3 Payment "]
+CONFIGS = [(1, 0), (5, 1), (20, 5), (50, 50), (200, 10)]
+
+
+def random_document(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(0, 600)):
+        word = rng.choice(WORDS)
+        if rng.random() < 0.02:
+            word = word * rng.randint(20, 200)  # tokens longer than a chunk
+        parts.append(word)
+        parts.append(rng.choice(SEPARATORS))
+    return "".join(parts)
+
+
+def cases():
+    rng = random.Random(27)
+    return [(seed, random_document(rng), *rng.choice(CONFIGS)) for seed in range(60)]
+
+
+@pytest.mark.parametrize("seed,text,max_tokens,overlap_tokens", cases())
+def test_spans_are_contiguous_and_cover_text(seed, text, max_tokens, overlap_tokens):
+    chunker = TextChunker(max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    spans = list(chunker.spans(text))
+
+    if not text:
+        assert spans == []
+        return
+    assert spans[0][0] == 0
+    assert spans[-1][1] == len(text)
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        # No gaps, and every chunk moves forward
+        assert start < next_start <= end
+        assert next_end > end
+
+
+@pytest.mark.parametrize("seed,text,max_tokens,overlap_tokens", cases())
+def test_spans_respect_max_size(seed, text, max_tokens, overlap_tokens):
+    chunker = TextChunker(max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    for start, end in chunker.spans(text):
+        assert 0 < end - start <= chunker.max_chars
+
+
+@pytest.mark.parametrize("seed,text,max_tokens,overlap_tokens", cases())
+def test_stream_offsets_match_joined_text(seed, text, max_tokens, overlap_tokens):
+    rng = random.Random(seed)
+    pages = [text[i:i + rng.randint(1, 500)] for i in range(0, len(text), 250)]
+    pages = [page for page in pages if page]
+    joined = "\n\n".join(pages)
+    chunker = TextChunker(max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+    chunks = list(chunker.iter_stream(iter(pages)))
+    for start, end, chunk in chunks:
+        assert joined[start:end] == chunk
+        assert 0 < end - start <= chunker.max_chars
+    if joined:
+        assert chunks[0][0] == 0
+        assert chunks[-1][1] == len(joined)
+        for (start, end, _), (next_start, _, _) in zip(chunks, chunks[1:]):
+            assert start < next_start <= end
@@ -0,0 +1,13 @@
+"""
+Tests for settings kept compatible with older .env files.
+"""
+
+from app.core.config import Settings
+
+
+def test_deprecated_chunk_size_maps_onto_chunk_tokens():
+    assert Settings(_env_file=None, CHUNK_SIZE=4000).CHUNK_TOKENS == 1000
+
+
+def test_explicit_chunk_tokens_wins_over_chunk_size():
+    assert Settings(_env_file=None, CHUNK_SIZE=4000, CHUNK_TOKENS=700).CHUNK_TOKENS == 700
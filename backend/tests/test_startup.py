@@ -0,0 +1,49 @@
+"""
+Startup tests: importing the app stays within the time budget.
+Heavy provider and parsing dependencies must load on first use, not at import.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.startup import BUDGET_MS, LAZY_MODULES
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+CHECK_IMPORT = f"""
+import json, sys
+import app.main
+print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))
+"""
+
+
+def import_app(tmp_path: Path) -> subprocess.CompletedProcess:
+    # A fresh interpreter, run elsewhere so the uploads directory is not created in backend/
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR), LLM_BACKEND="fake")
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHECK_IMPORT],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def cumulative_ms(importtime_log: str, module: str) -> float:
+    """Cumulative import time of module from python -X importtime output"""
+    for line in importtime_log.splitlines():
+        if line.startswith("import time:") and line.rsplit("|", 1)[-1].strip() == module:
+            return int(line.split("|")[1]) / 1000
+    raise AssertionError(f"{module} missing from the import-time log")
+
+
+def test_import_loads_no_heavy_dependencies(tmp_path):
+    result = import_app(tmp_path)
+    # The app may print while importing; the list is the last line
+    eager = json.loads(result.stdout.strip().splitlines()[-1])
+    assert eager == [], f"imported eagerly: {', '.join(eager)}"
+
+
+def test_import_time_within_budget(tmp_path):
+    elapsed_ms = cumulative_ms(import_app(tmp_path).stderr, "app.main")
+    assert elapsed_ms <= BUDGET_MS, f"import app.main took {elapsed_ms:.0f} ms, budget {BUDGET_MS:.0f} ms"
@@ -7,6 +7,21 @@ import { Send, Copy, Download, Loader2 } from 'lucide-react';
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
+interface DraftEdit {
+  start: number;
+  end: number;
+  text: string;
+}
+
+// Patch offsets count Unicode code points, not UTF-16 units
+const applyDraftPatch = (draft: string, edits: DraftEdit[]) => {
+  const chars = Array.from(draft);
+  for (const edit of [...edits].reverse()) {
+    chars.splice(edit.start, edit.end - edit.start, ...Array.from(edit.text));
+  }
+  return chars.join('');
+};
+
 interface Message {
   role: 'user' | 'assistant';
   content: string;
@@ -55,14 +70,24 @@ export default function ChatInterface() {
       const data = response.data;
       setConversationId(data.conversation_id);
 
-      const assistantMessage: Message = {
-        role: 'assistant',
-        content: data.message,
-        type: data.message_type,
-        data: data.data,
-      };
-
-      setMessages((prev) => [...prev, assistantMessage]);
+      setMessages((prev) => {
+        let messageData = data.data;
+        if (data.message_type === 'draft_patch') {
+          // Edits only send the changed spans; rebuild the draft from the latest one
+          const latest = [...prev].reverse().find((m) => m.data?.draft_md !== undefined);
+          if (latest) {
+            messageData = { ...data.data, draft_md: applyDraftPatch(latest.data.draft_md, data.data.patch) };
+          }
+        }
+
+        const assistantMessage: Message = {
+          role: 'assistant',
+          content: data.message,
+          type: data.message_type,
+          data: messageData,
+        };
+        return [...prev, assistantMessage];
+      });
     } catch (error) {
       console.error('Error sending message:', error);
       setMessages((prev) => [
@@ -119,7 +144,7 @@ export default function ChatInterface() {
               </div>
 
               {/* Draft Actions */}
-              {message.type === 'draft' && message.data && (
+              {(message.type === 'draft' || message.type === 'draft_patch') && message.data?.draft_md && (
                 <div className="mt-4 flex space-x-2 pt-4 border-t border-gray-200">
                   <button
                     onClick={() => copyToClipboard(message.data.draft_md)}
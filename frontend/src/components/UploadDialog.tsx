@@ -6,6 +6,7 @@ import axios from 'axios';
 import { X, Upload, Loader2, FileText, CheckCircle } from 'lucide-react';
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
+const JOB_POLL_INTERVAL_MS = 1000;
 
 interface UploadDialogProps {
   onClose: () => void;
@@ -23,6 +24,7 @@ export default function UploadDialog({ onClose }: UploadDialogProps) {
   const [file, setFile] = useState<File | null>(null);
   const [uploading, setUploading] = useState(false);
   const [extracting, setExtracting] = useState(false);
+  const [progress, setProgress] = useState<{ done: number; total: number | null } | null>(null);
   const [documentId, setDocumentId] = useState<string | null>(null);
   const [extractedData, setExtractedData] = useState<any>(null);
   const [saving, setSaving] = useState(false);
@@ -67,12 +69,24 @@ export default function UploadDialog({ onClose }: UploadDialogProps) {
       setUploading(false);
       setExtracting(true);
 
-      // Extract template
-      const extractResponse = await axios.post(
+      // Submit extraction job and poll until it finishes
+      const jobResponse = await axios.post(
         `${API_URL}/api/documents/extract-template/${docId}`
       );
 
-      setExtractedData(extractResponse.data);
+      let job = jobResponse.data;
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        const pollResponse = await axios.get(`${API_URL}/api/jobs/${job.id}`);
+        job = pollResponse.data;
+        setProgress({ done: job.chunks_done, total: job.total_chunks });
+      }
+
+      if (job.status !== 'completed') {
+        throw new Error(job.error || 'Template extraction failed');
+      }
+
+      setExtractedData(job.result);
       setExtracting(false);
     } catch (error) {
       console.error('Error uploading document:', error);
@@ -168,7 +182,10 @@ export default function UploadDialog({ onClose }: UploadDialogProps) {
               {extracting && (
                 <div className="flex items-center justify-center space-x-2 py-8">
                   <Loader2 className="w-6 h-6 animate-spin text-primary-500" />
-                  <span className="text-gray-600">Extracting variables with AI...</span>
+                  <span className="text-gray-600">
+                    Extracting variables with AI
+                    {progress && progress.total ? ` (${progress.done}/${progress.total} chunks)` : '...'}
+                  </span>
                 </div>
               )}
 